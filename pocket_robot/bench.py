@@ -0,0 +1,449 @@
+"""
+Benchmarks dos caminhos quentes: ingestão, estatísticas e broadcast
+Mede vazão, latência e alocações por ciclo em uma grade de quantidade de
+ativos x quantidade de clientes, salva o resultado como baseline JSON e
+compara com uma baseline anterior, apontando regressões acima do limite
+
+    python -m pocket_robot.bench                       # grade completa
+    python -m pocket_robot.bench --quick --save base.json
+    python -m pocket_robot.bench --compare base.json --threshold 0.15
+
+Métricas terminadas em '_per_s' são melhores quando maiores; as demais
+(tempos, alocações) são melhores quando menores. Cada caso roda
+``--repeat`` vezes e fica o melhor valor de cada métrica (o ruído da
+máquina só piora os números); casos que pioram são medidos de novo antes
+de a regressão ser reportada. O limite de cada métrica é o maior entre
+``--threshold`` e a variação observada entre as repetições (na baseline e
+na execução atual): em máquina ruidosa o limite cresce em vez de acusar
+ruído. Caudas (p99) e tempos de emit (microssegundos) oscilam demais e são
+apenas informativos. Sai com código 1 se houver regressão nas demais.
+
+O broadcast roda sem transporte: mede a montagem dos frames, o controle
+de fluxo, a latência por frame e a serialização JSON do payload (uma vez
+por frame, como no envio real)
+"""
+
+import argparse
+import asyncio
+import functools
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Permite rodar como pocket_robot.bench ou diretamente (módulos do robô são planos)
+ROOT = os.path.dirname(os.path.abspath(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from constants import ACTIVES
+from latency import LatencyHistogram
+
+BENCH_VERSION = 1
+# Grade padrão (o último valor de ativos é sempre len(ACTIVES))
+ASSET_COUNTS = (5, 25, 50, 100, len(ACTIVES))
+CLIENT_COUNTS = (1, 10, 100, 1000, 5000)
+QUICK_ASSET_COUNTS = (5, len(ACTIVES))
+QUICK_CLIENT_COUNTS = (1, 1000)
+# Tempo medido por caso (s) e ciclos na passada de alocações
+DEFAULT_DURATION = 1.0
+QUICK_DURATION = 0.3
+ALLOC_CYCLES = 20
+# Símbolos por cliente (uma "página" da interface) e fração de clientes binários
+CLIENT_PAGE_SIZE = 20
+BINARY_CLIENT_SHARE = 0.1
+DEFAULT_THRESHOLD = 0.10
+# Repetições de cada caso (o resultado é o melhor valor de cada métrica)
+DEFAULT_REPEAT = 3
+# Rodadas de nova medição dos casos que pioraram antes de reportar a regressão
+CONFIRM_ROUNDS = 2
+# Descrevem a carga ou oscilam demais entre execuções: aparecem mas não são comparadas
+INFORMATIONAL_METRICS = {'frames_per_cycle', 'bytes_per_cycle', 'retained_blocks', 'emit_p50_us', 'emit_p99_us'}
+
+
+def _quiet_logs():
+    """Benchmarks não devem escrever no log do robô"""
+    logging.getLogger().setLevel(logging.WARNING)
+    for handler in logging.getLogger().handlers:
+        handler.setLevel(logging.WARNING)
+
+
+async def _measure(cycle: Callable, duration: float, prepare: Optional[Callable] = None,
+                   min_cycles: int = 5) -> LatencyHistogram:
+    """Roda ``cycle`` por ``duration`` segundos; ``prepare`` roda antes de cada ciclo, fora da medição"""
+    histogram = LatencyHistogram()
+    deadline = time.perf_counter() + duration
+    while histogram.count < min_cycles or time.perf_counter() < deadline:
+        if prepare is not None:
+            await prepare()
+        start = time.perf_counter_ns()
+        result = cycle()
+        if asyncio.iscoroutine(result):
+            await result
+        histogram.record((time.perf_counter_ns() - start) / 1e9)
+    return histogram
+
+
+async def _allocations(cycle: Callable, prepare: Optional[Callable] = None, cycles: int = ALLOC_CYCLES) -> Dict[str, float]:
+    """Pico de memória alocada dentro de um ciclo (KiB, mediana dos ciclos: ignora
+    alocações esporádicas como a rotação das janelas de latência) e blocos
+    retidos por ciclo"""
+    gc.collect()
+    tracemalloc.start()
+    peaks = []
+    blocks_before = sys.getallocatedblocks()
+    try:
+        for _ in range(cycles):
+            if prepare is not None:
+                await prepare()
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = cycle()
+            if asyncio.iscoroutine(result):
+                await result
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_peak_kib': round(sorted(peaks)[len(peaks) // 2] / 1024, 2),
+        'retained_blocks': round((sys.getallocatedblocks() - blocks_before) / cycles, 1),
+    }
+
+
+def _timing(histogram: LatencyHistogram, prefix: str = 'cycle') -> Dict[str, float]:
+    snapshot = histogram.snapshot()
+    return {
+        f'{prefix}_p50_ms': round(snapshot['p50'] * 1000, 4),
+        f'{prefix}_p99_ms': round(snapshot['p99'] * 1000, 4),
+        f'{prefix}_mean_ms': round(snapshot['mean'] * 1000, 4),
+    }
+
+
+def _new_robot(n_assets: int):
+    from main import PocketOptionRobot
+
+    robot = PocketOptionRobot()
+    robot.selected_assets = list(ACTIVES)[:n_assets]
+    return robot
+
+
+async def bench_ingest(n_assets: int, duration: float) -> Dict[str, Dict[str, Any]]:
+    """Ciclo de busca (_update_market_data) e gravação em lote do stream (_store_ticks)"""
+    from tick_pipeline import Tick
+
+    robot = _new_robot(n_assets)
+    await robot._update_market_data()
+    histogram = await _measure(robot._update_market_data, duration)
+    fetch = {
+        'ticks_per_s': round(n_assets * histogram.count / histogram.total, 1),
+        **_timing(histogram),
+        **await _allocations(robot._update_market_data),
+    }
+
+    assets = robot.selected_assets
+    prices = {asset: robot.market_data[asset].current_price for asset in assets}
+
+    def make_batch() -> List[Tick]:
+        now = time.time()
+        received = time.monotonic()
+        return [Tick(asset=asset, price=prices[asset] * (1 + random.uniform(-1e-4, 1e-4)), timestamp=now,
+                     volume=1, received=received, server_time=now) for asset in assets]
+
+    batch: List[Tick] = []
+
+    async def prepare():
+        nonlocal batch
+        batch = make_batch()
+
+    histogram = await _measure(lambda: robot._store_ticks(batch), duration, prepare)
+    store = {
+        'ticks_per_s': round(n_assets * histogram.count / histogram.total, 1),
+        **_timing(histogram),
+        **await _allocations(lambda: robot._store_ticks(batch), prepare),
+    }
+    return {f'ingest.fetch/assets={n_assets}': fetch, f'ingest.store_ticks/assets={n_assets}': store}
+
+
+async def bench_stats(duration: float) -> Dict[str, Dict[str, Any]]:
+    """ConnectionMonitor.get_real_time_stats e o resumo de performance do robô"""
+    from connection_monitor import ConnectionMonitor
+
+    monitor = ConnectionMonitor('bench', True)
+    for i in range(5000):
+        monitor._count_message()
+        monitor.record_latency('health_check', random.uniform(0.005, 0.2))
+        monitor.record_latency('ping', random.uniform(0.01, 0.3))
+        if i % 100 == 0:
+            monitor._count_error()
+
+    results = {}
+    histogram = await _measure(monitor.get_real_time_stats, duration)
+    results['stats.monitor'] = {
+        'calls_per_s': round(histogram.count / histogram.total, 1),
+        **_timing(histogram, 'call'),
+        **await _allocations(monitor.get_real_time_stats),
+    }
+
+    robot = _new_robot(len(ACTIVES))
+    robot.monitor = monitor
+    await robot._update_market_data()
+    histogram = await _measure(robot.get_performance_summary, duration)
+    results['stats.robot_summary'] = {
+        'calls_per_s': round(histogram.count / histogram.total, 1),
+        **_timing(histogram, 'call'),
+        **await _allocations(robot.get_performance_summary),
+    }
+    return results
+
+
+async def bench_broadcast(n_assets: int, n_clients: int, duration: float, seed: int = 1) -> Dict[str, Dict[str, Any]]:
+    """Um ciclo do broadcaster_loop para ``n_clients`` sids falsos"""
+    from broadcast import ClientFlowControl, TickBroadcaster, TickLatencyTracker
+
+    rng = random.Random(seed)
+    robot = _new_robot(n_assets)
+    await robot._update_market_data()
+
+    broadcaster = TickBroadcaster()
+    flow_control = ClientFlowControl()
+    tick_latency = TickLatencyTracker()
+    assets = robot.selected_assets
+    page = min(CLIENT_PAGE_SIZE, n_assets)
+    n_pages = max(1, (n_assets + page - 1) // page)
+    for i in range(n_clients):
+        start = rng.randrange(n_pages) * page
+        encoding = 'binary' if rng.random() < BINARY_CLIENT_SHARE else None
+        broadcaster.subscribe(f'sid{i}', assets[start:start + page], encoding)
+
+    emit_histogram = LatencyHistogram()
+    totals = {'frames': 0, 'bytes': 0}
+
+    def cycle():
+        now = time.monotonic()
+        frames = broadcaster.build_frames(robot, lambda sid: flow_control.check(sid, 0, now) == 'send')
+        for frame in frames:
+            stamp = tick_latency.on_emit(frame, robot.ingest_times, now)
+            emit_start = time.perf_counter_ns()
+            # Socket.IO serializa o pacote uma vez por emit
+            payload = frame.payload if isinstance(frame.payload, bytes) else json.dumps([frame.payload, stamp])
+            emit_histogram.record((time.perf_counter_ns() - emit_start) / 1e9)
+            totals['bytes'] += len(payload)
+            for sid in frame.sids:
+                flow_control.mark_sent(sid, now)
+        totals['frames'] += len(frames)
+
+    # Cada ciclo recebe um passo completo do mercado (fora da medição)
+    histogram = await _measure(cycle, duration, robot._update_market_data)
+    cycles = histogram.count
+    emits = emit_histogram.snapshot()
+    return {f'broadcast/assets={n_assets},clients={n_clients}': {
+        'cycles_per_s': round(cycles / histogram.total, 1),
+        'client_frames_per_s': round(n_clients * cycles / histogram.total, 1),
+        **_timing(histogram),
+        'emit_p50_us': round(emits['p50'] * 1e6, 2),
+        'emit_p99_us': round(emits['p99'] * 1e6, 2),
+        'frames_per_cycle': round(totals['frames'] / cycles, 1),
+        'bytes_per_cycle': round(totals['bytes'] / cycles),
+        **await _allocations(cycle, robot._update_market_data),
+    }}
+
+
+def best_of(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Melhor valor de cada métrica entre as repetições de um caso"""
+    best = dict(runs[0])
+    for run in runs[1:]:
+        for metric, value in run.items():
+            if not isinstance(value, (int, float)) or not isinstance(best.get(metric), (int, float)):
+                continue
+            pick = max if higher_is_better(metric) else min
+            best[metric] = pick(best[metric], value)
+    return best
+
+
+def spread_of(runs: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Variação relativa entre a melhor e a pior repetição de cada métrica comparada"""
+    spread = {}
+    for metric in runs[0]:
+        values = [run[metric] for run in runs if isinstance(run.get(metric), (int, float))]
+        if len(values) < 2 or not is_gated(metric):
+            continue
+        low, high = min(values), max(values)
+        base = high if higher_is_better(metric) else low
+        if base > 0:
+            spread[metric] = round((high - low) / base, 4)
+    return spread
+
+
+def suite_cases(asset_counts, client_counts, duration: float, only: Optional[str] = None) -> List[Callable]:
+    """Casos da grade; cada um é uma corrotina sem argumentos que retorna {nome: métricas}"""
+    cases: List[Callable] = []
+    if only in (None, 'ingest'):
+        cases += [functools.partial(bench_ingest, n_assets, duration) for n_assets in asset_counts]
+    if only in (None, 'stats'):
+        cases.append(functools.partial(bench_stats, duration))
+    if only in (None, 'broadcast'):
+        cases += [functools.partial(bench_broadcast, n_assets, n_clients, duration)
+                  for n_assets in asset_counts for n_clients in client_counts]
+    return cases
+
+
+async def run_cases(cases: Iterable[Callable], repeat: int = DEFAULT_REPEAT,
+                    progress: Callable[[str], None] = print,
+                    samples: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Callable]]:
+    """Roda cada caso ``repeat`` vezes; retorna (nome -> métricas de cada repetição,
+    nome -> caso que o produz). Com ``samples``, acrescenta às repetições existentes"""
+    samples = samples if samples is not None else {}
+    owners: Dict[str, Callable] = {}
+    for case in cases:
+        names = []
+        for _ in range(max(1, repeat)):
+            for name, metrics in (await case()).items():
+                samples.setdefault(name, []).append(metrics)
+                if name not in names:
+                    names.append(name)
+        for name in names:
+            owners[name] = case
+            metrics = best_of(samples[name])
+            progress(f'{name:<45} ' + '  '.join(f'{k}={v}' for k, v in metrics.items()))
+    return samples, owners
+
+
+async def confirm_regressions(baseline: Dict[str, Any], samples: Dict[str, List[Dict[str, Any]]],
+                              owners: Dict[str, Callable], threshold: float = DEFAULT_THRESHOLD,
+                              repeat: int = DEFAULT_REPEAT, rounds: int = CONFIRM_ROUNDS,
+                              progress: Callable[[str], None] = print) -> List[Dict[str, Any]]:
+    """Compara e re-mede os casos que pioraram; só persiste a regressão que se repete.
+
+    Ruído da máquina (outro processo, frequência da CPU) costuma durar alguns
+    segundos e atinge casos ao acaso: uma regressão real aparece de novo.
+    As novas repetições entram em ``samples``.
+    """
+    regressions = compare(baseline, samples, threshold)
+    for _ in range(rounds):
+        if not regressions:
+            break
+        suspects = list(dict.fromkeys(owners[r['case']] for r in regressions if r['case'] in owners))
+        progress(f're-medindo {len(suspects)} caso(s) com possível regressão...')
+        await run_cases(suspects, repeat, progress=lambda line: None, samples=samples)
+        regressions = compare(baseline, samples, threshold)
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def make_baseline(samples: Dict[str, List[Dict[str, Any]]], repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    return {
+        'version': BENCH_VERSION,
+        'created_at': time.time(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'machine': platform.platform(),
+        'results': {name: best_of(runs) for name, runs in samples.items()},
+        # variação entre repetições: limite mínimo de cada métrica na comparação
+        'noise': {name: spread_of(runs) for name, runs in samples.items()},
+    }
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith('_per_s')
+
+
+def is_gated(metric: str) -> bool:
+    """Métrica estável o bastante para reprovar a comparação"""
+    return metric not in INFORMATIONAL_METRICS and '_p99_' not in metric
+
+
+def compare(baseline: Dict[str, Any], samples: Dict[str, List[Dict[str, Any]]],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """Métricas cujo melhor valor piorou mais que o limite em relação à baseline.
+
+    O limite de cada métrica é o maior entre ``threshold`` e a variação
+    entre repetições da métrica na baseline e nas amostras atuais.
+    """
+    regressions = []
+    for name, runs in samples.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not runs:
+            continue
+        metrics = best_of(runs)
+        noise = spread_of(runs)
+        baseline_noise = baseline.get('noise', {}).get(name, {})
+        for metric, value in metrics.items():
+            if not is_gated(metric):
+                continue
+            old = previous.get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or old <= 0:
+                continue
+            limit = max(threshold, noise.get(metric, 0.0), baseline_noise.get(metric, 0.0))
+            change = (value - old) / old
+            worse = -change if higher_is_better(metric) else change
+            if worse > limit:
+                regressions.append({'case': name, 'metric': metric, 'baseline': old, 'current': value,
+                                    'change_pct': round(change * 100, 1), 'limit_pct': round(limit * 100, 1)})
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m pocket_robot.bench', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='grade reduzida e casos curtos')
+    parser.add_argument('--only', choices=('ingest', 'stats', 'broadcast'), help='roda apenas um grupo')
+    parser.add_argument('--assets', type=int, nargs='+', help='quantidades de ativos')
+    parser.add_argument('--clients', type=int, nargs='+', help='quantidades de clientes')
+    parser.add_argument('--duration', type=float, help='segundos medidos por caso')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f'repetições de cada caso, fica a melhor (padrão {DEFAULT_REPEAT})')
+    parser.add_argument('--save', metavar='ARQUIVO', help='salva o resultado como baseline JSON')
+    parser.add_argument('--compare', metavar='ARQUIVO', help='compara com uma baseline JSON')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='piora relativa tolerada (padrão 0.10 = 10%%)')
+    parser.add_argument('--seed', type=int, default=1, help='semente do mercado sintético e dos sids')
+    args = parser.parse_args(argv)
+
+    _quiet_logs()
+    os.environ.setdefault('POCKET_SIM_SEED', str(args.seed))
+    random.seed(args.seed)
+    asset_counts = [min(n, len(ACTIVES)) for n in (args.assets or (QUICK_ASSET_COUNTS if args.quick else ASSET_COUNTS))]
+    client_counts = args.clients or (QUICK_CLIENT_COUNTS if args.quick else CLIENT_COUNTS)
+    duration = args.duration or (QUICK_DURATION if args.quick else DEFAULT_DURATION)
+
+    cases = suite_cases(asset_counts, client_counts, duration, args.only)
+    samples, owners = asyncio.run(run_cases(cases, args.repeat))
+
+    status = 0
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = asyncio.run(confirm_regressions(baseline, samples, owners, args.threshold, args.repeat))
+        if regressions:
+            print(f'{len(regressions)} regressões acima de {args.threshold:.0%} (baseline {baseline.get("commit")}):')
+            for r in regressions:
+                print(f"  {r['case']:<45} {r['metric']:<20} {r['baseline']} -> {r['current']} "
+                      f"({r['change_pct']:+.1f}%, limite {r['limit_pct']:.1f}%)")
+            status = 1
+        else:
+            print(f'sem regressões acima de {args.threshold:.0%} (baseline {baseline.get("commit")})')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(make_baseline(samples, args.repeat), f, indent=2, sort_keys=True)
+        print(f'baseline salva em {args.save}')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
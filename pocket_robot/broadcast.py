@@ -0,0 +1,588 @@
+"""
+Montagem dos frames de ticks enviados aos clientes Socket.IO
+Índice invertido ativo -> clientes, envio incremental por versão e
+frames compartilhados entre clientes com a mesma assinatura
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from latency import LatencyHistogram, LatencyRecorder, round_snapshot
+from tick_codec import ENCODING_JSON, encode_fragment, encode_frame, negotiate_encoding
+
+# Máximo de símbolos por cliente
+MAX_SYMBOLS_PER_CLIENT = 200
+# Intervalo mínimo entre dois snapshots completos para o mesmo cliente (s);
+# em tempo, e não em frames, para não depender da taxa de flush
+DEFAULT_SNAPSHOT_INTERVAL = 30.0
+
+# Controle de fluxo por cliente
+# Pacotes ainda na fila de saída do cliente a partir dos quais ele é considerado atrasado
+MAX_CLIENT_BACKLOG = 2
+# Tempo seguido atrasado até o cliente ser desconectado (s)
+SLOW_CLIENT_TIMEOUT = 10.0
+# Intervalo mínimo entre frames = RTT * fator, limitado a MAX_CLIENT_INTERVAL (s)
+RTT_INTERVAL_FACTOR = 2.0
+MAX_CLIENT_INTERVAL = 5.0
+# Peso da nova amostra na média exponencial do RTT
+RTT_EWMA_ALPHA = 0.2
+
+# Agendamento dos envios
+# Intervalo mínimo entre envios com atualizações pendentes (s)
+DEFAULT_FLUSH_INTERVAL = 0.1
+# Intervalo máximo sem envio, mesmo sem atualizações (heartbeat, s)
+DEFAULT_HEARTBEAT_INTERVAL = 1.0
+# Variação relativa de preço que antecipa o envio
+DEFAULT_URGENT_MOVE = 0.002
+# Intervalo mínimo entre envios antecipados (s)
+URGENT_FLUSH_FLOOR = 0.01
+
+# Latência ponta a ponta
+# Frames aguardando confirmação por cliente (os mais antigos são esquecidos)
+MAX_PENDING_ACKS = 16
+
+
+class SubscriptionIndex:
+    """Assinaturas dos clientes com índices atualizados incrementalmente.
+
+    - ``subscriptions``: sid -> conjunto de símbolos
+    - ``subscribers``: símbolo -> sids (índice invertido)
+    - ``groups``: conjunto de símbolos -> sids com exatamente essa assinatura
+    - ``symbol_groups``: símbolo -> assinaturas (chaves de ``groups``) que o contêm
+    """
+
+    def __init__(self, max_symbols: int = MAX_SYMBOLS_PER_CLIENT):
+        self.max_symbols = max_symbols
+        self.subscriptions: Dict[str, FrozenSet[str]] = {}
+        self.subscribers: Dict[str, Set[str]] = defaultdict(set)
+        self.groups: Dict[FrozenSet[str], Set[str]] = defaultdict(set)
+        self.symbol_groups: Dict[str, Set[FrozenSet[str]]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self.subscriptions
+
+    def subscribe(self, sid: str, symbols: Iterable[str]) -> List[str]:
+        """Substitui a assinatura do cliente; retorna os símbolos aceitos (limite aplicado)"""
+        accepted = list(dict.fromkeys(s for s in symbols if isinstance(s, str)))[:self.max_symbols]
+        if not accepted:
+            self.unsubscribe(sid)
+            return []
+
+        new = frozenset(accepted)
+        old = self.subscriptions.get(sid, frozenset())
+        if new == old:
+            return accepted
+
+        for symbol in old - new:
+            self._remove_subscriber(symbol, sid)
+        for symbol in new - old:
+            self.subscribers[symbol].add(sid)
+        if old:
+            self._remove_from_group(old, sid)
+        if new not in self.groups:
+            for symbol in new:
+                self.symbol_groups[symbol].add(new)
+        self.groups[new].add(sid)
+        self.subscriptions[sid] = new
+        return accepted
+
+    def unsubscribe(self, sid: str):
+        """Remove todas as assinaturas do cliente"""
+        old = self.subscriptions.pop(sid, None)
+        if not old:
+            return
+        for symbol in old:
+            self._remove_subscriber(symbol, sid)
+        self._remove_from_group(old, sid)
+
+    def client_ids(self) -> List[str]:
+        return list(self.subscriptions)
+
+    def _remove_subscriber(self, symbol: str, sid: str):
+        sids = self.subscribers.get(symbol)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self.subscribers[symbol]
+
+    def _remove_from_group(self, symbols: FrozenSet[str], sid: str):
+        sids = self.groups.get(symbols)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self.groups[symbols]
+                for symbol in symbols:
+                    groups = self.symbol_groups.get(symbol)
+                    if groups is not None:
+                        groups.discard(symbols)
+                        if not groups:
+                            del self.symbol_groups[symbol]
+
+
+class FlushScheduler:
+    """Decide quando o broadcaster envia o próximo ciclo.
+
+    Atualizações (``notify``) marcam o estado como pendente; o envio
+    acontece no máximo a cada ``flush_interval``, de modo que várias
+    atualizações do mesmo símbolo na janela viram um único envio. Uma
+    variação de preço acima de ``urgent_move`` antecipa o envio, e sem
+    atualizações o ciclo roda a cada ``heartbeat_interval``.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+        urgent_move: float = DEFAULT_URGENT_MOVE,
+    ):
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = max(heartbeat_interval, flush_interval)
+        self.urgent_move = urgent_move
+
+        self.dirty = False
+        self.urgent = False
+        self.last_flush = 0.0
+        self._wakeup = asyncio.Event()
+
+        self.stats = {'updates': 0, 'flushes': 0, 'urgent_flushes': 0, 'heartbeats': 0}
+
+    def notify(self, symbol: str, price: float, previous_price: Optional[float] = None):
+        """Registra uma atualização (compatível com PocketOptionRobot.add_update_listener)"""
+        self.stats['updates'] += 1
+        if not self.urgent and previous_price and self.urgent_move > 0:
+            if abs(price - previous_price) >= self.urgent_move * previous_price:
+                self.urgent = True
+                self._wakeup.set()
+        if not self.dirty:
+            self.dirty = True
+            self._wakeup.set()
+
+    async def wait(self) -> str:
+        """Aguarda o próximo envio; retorna 'urgent', 'flush' ou 'heartbeat'"""
+        while True:
+            since = time.monotonic() - self.last_flush
+            if self.urgent and since >= URGENT_FLUSH_FLOOR:
+                reason = 'urgent'
+                break
+            if self.dirty and since >= self.flush_interval:
+                reason = 'flush'
+                break
+            if since >= self.heartbeat_interval:
+                reason = 'heartbeat'
+                break
+
+            if self.urgent:
+                timeout = URGENT_FLUSH_FLOOR - since
+            elif self.dirty:
+                timeout = self.flush_interval - since
+            else:
+                timeout = self.heartbeat_interval - since
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        self.dirty = self.urgent = False
+        self.last_flush = time.monotonic()
+        self.stats['flushes'] += 1
+        if reason == 'urgent':
+            self.stats['urgent_flushes'] += 1
+        elif reason == 'heartbeat':
+            self.stats['heartbeats'] += 1
+        return reason
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        # Atualizações agregadas por envio (quanto maior, mais coalescência)
+        stats['updates_per_flush'] = round(stats['updates'] / max(stats['flushes'], 1), 2)
+        return stats
+
+
+class _ClientFlow:
+    __slots__ = ('rtt', 'next_due', 'behind_since')
+
+    def __init__(self):
+        self.rtt: Optional[float] = None
+        self.next_due = 0.0
+        self.behind_since: Optional[float] = None
+
+
+class ClientFlowControl:
+    """Decide, a cada ciclo, quais clientes recebem frame.
+
+    Um cliente fica de fora do ciclo (e suas atualizações são agregadas
+    no próximo frame, com o valor mais recente de cada símbolo) quando:
+    - ainda tem mais de ``max_backlog`` pacotes na fila de saída, ou
+    - não passou o seu intervalo mínimo, derivado do RTT informado.
+
+    Quem permanece atrasado por ``slow_timeout`` segundos deve ser
+    desconectado (``check`` retorna 'drop').
+    """
+
+    def __init__(
+        self,
+        max_backlog: int = MAX_CLIENT_BACKLOG,
+        slow_timeout: float = SLOW_CLIENT_TIMEOUT,
+        rtt_factor: float = RTT_INTERVAL_FACTOR,
+        max_interval: float = MAX_CLIENT_INTERVAL,
+    ):
+        self.max_backlog = max_backlog
+        self.slow_timeout = slow_timeout
+        self.rtt_factor = rtt_factor
+        self.max_interval = max_interval
+        self.clients: Dict[str, _ClientFlow] = {}
+        self.stats = {
+            'frames_sent': 0,
+            'frames_coalesced': 0,
+            'rate_limited': 0,
+            'clients_dropped': 0,
+        }
+
+    def _flow(self, sid: str) -> _ClientFlow:
+        flow = self.clients.get(sid)
+        if flow is None:
+            flow = self.clients[sid] = _ClientFlow()
+        return flow
+
+    def record_rtt(self, sid: str, rtt: float):
+        """Atualiza a média do RTT do cliente (segundos)"""
+        flow = self._flow(sid)
+        flow.rtt = rtt if flow.rtt is None else flow.rtt + RTT_EWMA_ALPHA * (rtt - flow.rtt)
+
+    def interval_for(self, sid: str) -> float:
+        flow = self.clients.get(sid)
+        if flow is None or flow.rtt is None:
+            return 0.0
+        return min(self.max_interval, flow.rtt * self.rtt_factor)
+
+    def check(self, sid: str, backlog: int, now: float) -> str:
+        """Retorna 'send', 'skip' (agrega no próximo frame) ou 'drop'"""
+        flow = self._flow(sid)
+        if backlog > self.max_backlog:
+            if flow.behind_since is None:
+                flow.behind_since = now
+            elif now - flow.behind_since >= self.slow_timeout:
+                self.stats['clients_dropped'] += 1
+                return 'drop'
+            self.stats['frames_coalesced'] += 1
+            return 'skip'
+
+        flow.behind_since = None
+        if now < flow.next_due:
+            self.stats['rate_limited'] += 1
+            self.stats['frames_coalesced'] += 1
+            return 'skip'
+        return 'send'
+
+    def mark_sent(self, sid: str, now: float):
+        self._flow(sid).next_due = now + self.interval_for(sid)
+        self.stats['frames_sent'] += 1
+
+    def remove_client(self, sid: str):
+        self.clients.pop(sid, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        rtts = [flow.rtt for flow in self.clients.values() if flow.rtt is not None]
+        stats = dict(self.stats)
+        stats['clients_behind'] = sum(1 for flow in self.clients.values() if flow.behind_since is not None)
+        stats['avg_client_rtt_ms'] = round(sum(rtts) / len(rtts) * 1000, 2) if rtts else None
+        return stats
+
+
+class Frame(NamedTuple):
+    """Frame de um ciclo: evento, payload, clientes e símbolos com valor novo"""
+    event: str
+    payload: Any
+    sids: List[str]
+    symbols: List[str]
+
+
+class TickBroadcaster:
+    """Calcula os frames de um ciclo de broadcast sem fazer I/O.
+
+    Cada cliente recebe apenas os símbolos alterados desde o último frame
+    (``market_seq`` do robô), com snapshot completo periódico. O ciclo
+    parte dos símbolos alterados desde o ciclo anterior e do índice
+    invertido para chegar aos clientes afetados; clientes sem nada novo nem
+    são visitados. Clientes com a mesma assinatura e a mesma versão recebem
+    o mesmo frame, e o fragmento de cada símbolo é montado uma única vez por
+    ciclo (por encoding). Clientes que negociaram um encoding binário
+    recebem o evento 'tick_bin' com o frame de tick_codec; os demais
+    recebem 'tick' em JSON.
+    """
+
+    def __init__(self, snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL, max_symbols: int = MAX_SYMBOLS_PER_CLIENT):
+        self.snapshot_interval = snapshot_interval
+        self.index = SubscriptionIndex(max_symbols)
+        # sid -> market_seq do robô no último frame enviado
+        self.client_versions: Dict[str, int] = {}
+        # sid -> time.monotonic() do último snapshot enviado
+        self.client_snapshot_at: Dict[str, float] = {}
+        # sid -> encoding negociado (ausente = JSON)
+        self.client_encoding: Dict[str, str] = {}
+        # market_seq do robô no ciclo anterior
+        self.cycle_seq = 0
+        # Clientes com frame devido independente dos símbolos alterados no ciclo:
+        # novos, em ressincronização ou que ficaram de fora de um ciclo
+        self.behind: Set[str] = set()
+
+    def subscribe(self, sid: str, symbols: Iterable[str], encoding: Optional[str] = None) -> List[str]:
+        accepted = self.index.subscribe(sid, symbols)
+        if encoding is not None:
+            self.client_encoding[sid] = negotiate_encoding(encoding)
+        # próximo frame é um snapshot completo dos novos símbolos
+        self.request_resync(sid)
+        return accepted
+
+    def unsubscribe(self, sid: str):
+        self.index.unsubscribe(sid)
+        self.client_versions.pop(sid, None)
+        self.behind.discard(sid)
+
+    def remove_client(self, sid: str):
+        self.unsubscribe(sid)
+        self.client_snapshot_at.pop(sid, None)
+        self.client_encoding.pop(sid, None)
+
+    def encoding_of(self, sid: str) -> str:
+        return self.client_encoding.get(sid, ENCODING_JSON)
+
+    def request_resync(self, sid: str):
+        self.client_versions.pop(sid, None)
+        if sid in self.index:
+            self.behind.add(sid)
+
+    def send_failed(self, sids: Iterable[str]):
+        """Frame não entregue: ``build_frames`` já avançou a versão desses
+        clientes, então o próximo frame deles volta a ser um snapshot"""
+        for sid in sids:
+            self.request_resync(sid)
+
+    def _changed_symbols(self, robot) -> List[str]:
+        """Símbolos com versão nova desde o ciclo anterior (e avança o ciclo)"""
+        seq = robot.market_seq
+        if seq < self.cycle_seq:
+            # robô reiniciado: versões antigas não valem, todos recebem snapshot
+            self.client_versions.clear()
+            self.behind.update(self.index.subscriptions)
+            self.cycle_seq = 0
+        if seq == self.cycle_seq:
+            return []
+        since, self.cycle_seq = self.cycle_seq, seq
+        return [symbol for symbol, version in robot.symbol_versions.items() if version > since]
+
+    def build_frames(self, robot, eligible: Optional[Callable[[str], bool]] = None,
+                     now: Optional[float] = None) -> List['Frame']:
+        """Retorna os Frame do ciclo atual e avança as versões dos clientes.
+
+        Clientes para os quais ``eligible(sid)`` é falso ficam fora do ciclo e
+        mantêm a versão anterior: o próximo frame deles já traz o valor mais
+        recente de tudo o que mudou no intervalo. Se o envio de um frame
+        falhar, chame ``send_failed`` com os sids dele.
+        """
+        now = now if now is not None else time.monotonic()
+        seq = robot.market_seq
+        versions = robot.symbol_versions
+        market_data = robot.market_data
+        previous_seq = self.cycle_seq
+        changed = self._changed_symbols(robot)
+        changed_set = set(changed)
+
+        # Assinaturas afetadas (índice invertido) e clientes atrasados
+        symbol_groups = self.index.symbol_groups
+        affected: Set[FrozenSet[str]] = set()
+        for symbol in changed:
+            groups = symbol_groups.get(symbol)
+            if groups:
+                affected.update(groups)
+        behind, self.behind = self.behind, set()
+
+        # Agrupa clientes por (assinatura, versão do último frame, encoding); None = snapshot
+        pending: Dict[Tuple[FrozenSet[str], Any, str], List[str]] = defaultdict(list)
+        client_versions = self.client_versions
+        client_snapshot_at = self.client_snapshot_at
+        snapshot_due = now - self.snapshot_interval
+
+        def visit(sid: str, symbols: FrozenSet[str]):
+            if eligible is not None and not eligible(sid):
+                self.behind.add(sid)
+                return
+            last_seq = client_versions.get(sid, 0)
+            if last_seq and sid not in behind:
+                # quem não está atrasado recebeu tudo até o ciclo anterior (mesmo
+                # sem frame, se nada do que assina mudou): agrupa com os demais
+                last_seq = previous_seq
+            # snapshot no primeiro frame ou a cada snapshot_interval segundos
+            full = last_seq == 0 or client_snapshot_at.get(sid, 0.0) <= snapshot_due
+            pending[(symbols, None if full else last_seq, self.encoding_of(sid))].append(sid)
+            client_versions[sid] = seq
+            if full:
+                client_snapshot_at[sid] = now
+            if not seq:
+                # robô ainda sem dados: o snapshot de verdade fica para o próximo ciclo
+                self.behind.add(sid)
+
+        groups = self.index.groups
+        for symbols in affected:
+            for sid in groups.get(symbols, ()):
+                visit(sid, symbols)
+        subscriptions = self.index.subscriptions
+        for sid in behind:
+            symbols = subscriptions.get(sid)
+            if symbols is not None and symbols not in affected:
+                visit(sid, symbols)
+
+        # encoding -> símbolo -> fragmento (montado uma vez por ciclo)
+        fragments: Dict[str, Dict[str, Any]] = defaultdict(dict)
+
+        def fragment(symbol: str, encoding: str):
+            cache = fragments[encoding]
+            try:
+                return cache[symbol]
+            except KeyError:
+                md = market_data.get(symbol)
+                if md is None:
+                    frag = None
+                elif encoding == ENCODING_JSON:
+                    frag = {'symbol': symbol, 'price': md.current_price}
+                else:
+                    frag = encode_fragment(symbol, md.current_price, encoding)
+                cache[symbol] = frag
+                return frag
+
+        frames = []
+        for (symbols, last_seq, encoding), sids in pending.items():
+            snapshot = last_seq is None
+            if snapshot:
+                delta = symbols
+            elif last_seq == previous_seq:
+                # em dia até o ciclo anterior: só os alterados neste ciclo
+                delta = [symbol for symbol in changed if symbol in symbols] \
+                    if len(changed_set) < len(symbols) else [symbol for symbol in symbols if symbol in changed_set]
+            else:
+                delta = [symbol for symbol in symbols if versions.get(symbol, 0) > last_seq]
+            payload = [frag for frag in (fragment(symbol, encoding) for symbol in delta) if frag is not None]
+            if not payload and not snapshot:
+                continue
+            # Snapshots reenviam valores antigos: só os deltas entram na latência
+            fresh = [] if snapshot else delta
+            if encoding == ENCODING_JSON:
+                frames.append(Frame('tick', payload, sids, fresh))
+            else:
+                frames.append(Frame('tick_bin', encode_frame(payload, encoding, seq, snapshot), sids, fresh))
+        return frames
+
+
+def frame_stamp(emit_time: float) -> int:
+    """Carimbo compacto do envio: time.monotonic() em ms, 32 bits"""
+    return int(emit_time * 1000) & 0xFFFFFFFF
+
+
+class TickLatencyTracker:
+    """Latência ingestão -> envio e ingestão -> cliente dos ticks.
+
+    No envio, a idade de cada símbolo do frame é ``envio - ingestão``
+    (``robot.ingest_times``). Clientes que ecoam o carimbo do frame
+    ('tick_ack') fecham a medição: a entrega é estimada como metade do
+    tempo entre o envio e o eco, e ingestão -> cliente = idade + entrega.
+    Agrega no total, por símbolo e por cliente.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_ACKS):
+        self.max_pending = max_pending
+        self.ingest_to_emit = LatencyRecorder()
+        self.ingest_to_client = LatencyRecorder()
+        self.delivery = LatencyRecorder()
+        self.symbol_emit: Dict[str, LatencyHistogram] = {}
+        self.symbol_client: Dict[str, LatencyHistogram] = {}
+        # sid -> histograma da atualização mais antiga de cada frame confirmado
+        self.client_latency: Dict[str, LatencyHistogram] = {}
+        # sid -> carimbo -> (envio, [(símbolo, idade)])
+        self.pending: Dict[str, 'OrderedDict[int, Tuple[float, List[Tuple[str, float]]]]'] = {}
+        self.stats = {'acks': 0, 'unmatched_acks': 0}
+
+    def on_emit(self, frame: Frame, ingest_times: Dict[str, float], emit_time: float) -> int:
+        """Registra o envio de um frame e retorna o carimbo enviado junto"""
+        stamp = frame_stamp(emit_time)
+        ages = []
+        for symbol in frame.symbols:
+            ingested = ingest_times.get(symbol)
+            if ingested is None:
+                continue
+            age = max(0.0, emit_time - ingested)
+            ages.append((symbol, age))
+            self.ingest_to_emit.record(age)
+            histogram = self.symbol_emit.get(symbol)
+            if histogram is None:
+                histogram = self.symbol_emit[symbol] = LatencyHistogram()
+            histogram.record(age)
+
+        entry = (emit_time, ages)
+        for sid in frame.sids:
+            pending = self.pending.get(sid)
+            if pending is None:
+                pending = self.pending[sid] = OrderedDict()
+            pending[stamp] = entry
+            while len(pending) > self.max_pending:
+                pending.popitem(last=False)
+        return stamp
+
+    def on_ack(self, sid: str, stamp: int, now: float) -> bool:
+        """Eco do carimbo pelo cliente; frames anteriores sem eco são descartados"""
+        pending = self.pending.get(sid)
+        if not pending or stamp not in pending:
+            self.stats['unmatched_acks'] += 1
+            return False
+        while True:
+            key, (emit_time, ages) = pending.popitem(last=False)
+            if key == stamp:
+                break
+        self.stats['acks'] += 1
+
+        delivery = max(0.0, now - emit_time) / 2.0
+        self.delivery.record(delivery)
+        if not ages:
+            return True
+        for symbol, age in ages:
+            self.ingest_to_client.record(age + delivery)
+            histogram = self.symbol_client.get(symbol)
+            if histogram is None:
+                histogram = self.symbol_client[symbol] = LatencyHistogram()
+            histogram.record(age + delivery)
+        histogram = self.client_latency.get(sid)
+        if histogram is None:
+            histogram = self.client_latency[sid] = LatencyHistogram()
+        histogram.record(max(age for _, age in ages) + delivery)
+        return True
+
+    def remove_client(self, sid: str):
+        self.pending.pop(sid, None)
+        self.client_latency.pop(sid, None)
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Totais (ms, por janela) e contadores de confirmação"""
+        return {
+            'ingest_to_emit': round_snapshot(self.ingest_to_emit.snapshot()),
+            'ingest_to_client': round_snapshot(self.ingest_to_client.snapshot()),
+            'delivery': round_snapshot(self.delivery.snapshot()),
+            **self.stats,
+        }
+
+    def get_breakdown(self) -> Dict[str, Any]:
+        """Percentis (ms, desde o início) por símbolo e por cliente"""
+        symbols = {}
+        for symbol in sorted(set(self.symbol_emit) | set(self.symbol_client)):
+            entry = {}
+            if symbol in self.symbol_emit:
+                entry['ingest_to_emit'] = round_snapshot(self.symbol_emit[symbol].snapshot())
+            if symbol in self.symbol_client:
+                entry['ingest_to_client'] = round_snapshot(self.symbol_client[symbol].snapshot())
+            symbols[symbol] = entry
+        clients = {sid: round_snapshot(histogram.snapshot()) for sid, histogram in list(self.client_latency.items())}
+        return {'symbols': symbols, 'clients': clients}
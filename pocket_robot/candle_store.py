@@ -0,0 +1,149 @@
+"""
+Armazenamento indexado por tempo dos candles fechados
+Consultas por intervalo usam busca binária sobre os inícios dos candles
+"""
+
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models import Candle
+
+# Candles mantidos por série (ativo, timeframe)
+DEFAULT_MAX_CANDLES = 5000
+# Linhas serializadas por bloco na resposta em streaming
+STREAM_CHUNK_SIZE = 500
+
+
+class _CandleSeries:
+    """Série de candles em colunas, ordenada pelo início do candle"""
+    __slots__ = ('times', 'rows', 'offset')
+
+    def __init__(self):
+        self.times: List[float] = []
+        self.rows: List[tuple] = []
+        # Quantidade de candles já descartados do início (mantém índices absolutos estáveis)
+        self.offset = 0
+
+
+class CandleStore:
+    """Guarda os candles fechados de cada (ativo, timeframe) para consultas históricas"""
+
+    def __init__(self, max_candles: int = DEFAULT_MAX_CANDLES):
+        self.max_candles = max_candles
+        self._series: Dict[Tuple[str, str], _CandleSeries] = {}
+
+    def add(self, asset: str, timeframe: str, candle: Candle):
+        """Adiciona um candle fechado (compatível com o evento 'candle_closed')"""
+        series = self._series.get((asset, timeframe))
+        if series is None:
+            series = self._series[(asset, timeframe)] = _CandleSeries()
+
+        start = candle.time.timestamp()
+        row = (start, candle.open, candle.high, candle.low, candle.close, candle.volume)
+        if not series.times or start > series.times[-1]:
+            series.times.append(start)
+            series.rows.append(row)
+        else:
+            # Fora de ordem: substitui o existente ou insere na posição correta
+            pos = bisect_left(series.times, start)
+            if pos < len(series.times) and series.times[pos] == start:
+                series.rows[pos] = row
+            else:
+                series.times.insert(pos, start)
+                series.rows.insert(pos, row)
+
+        # Descarta em blocos para não pagar O(n) a cada candle
+        excess = len(series.times) - self.max_candles
+        if excess > self.max_candles // 4:
+            del series.times[:excess]
+            del series.rows[:excess]
+            series.offset += excess
+
+    def count(self, asset: str, timeframe: str) -> int:
+        series = self._series.get((asset, timeframe))
+        return len(series.times) if series else 0
+
+    def query_range(
+        self,
+        asset: str,
+        timeframe: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[int, int]:
+        """Retorna o intervalo absoluto [início, fim) dos candles em [start, end].
+
+        Com ``limit`` ficam apenas os ``limit`` candles mais recentes do intervalo.
+        """
+        series = self._series.get((asset, timeframe))
+        if series is None:
+            return 0, 0
+
+        lo = bisect_left(series.times, start) if start is not None else 0
+        hi = bisect_right(series.times, end) if end is not None else len(series.times)
+        if limit is not None and hi - lo > limit:
+            lo = hi - limit
+        return series.offset + lo, series.offset + max(lo, hi)
+
+    def iter_rows(self, asset: str, timeframe: str, first: int, last: int,
+                  chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[List[tuple]]:
+        """Itera o intervalo absoluto [first, last) em blocos de linhas"""
+        series = self._series.get((asset, timeframe))
+        if series is None:
+            return
+        position = first
+        while position < last:
+            # Índices relativos recalculados a cada bloco (a série pode ter sido podada)
+            lo = max(position, series.offset) - series.offset
+            hi = min(last, position + chunk_size) - series.offset
+            if hi > lo:
+                yield series.rows[lo:hi]
+            position += chunk_size
+
+    def query(self, asset: str, timeframe: str, start: Optional[float] = None,
+              end: Optional[float] = None, limit: Optional[int] = None) -> List[Candle]:
+        """Consulta em memória (para uso interno; a API usa ``stream_json``)"""
+        first, last = self.query_range(asset, timeframe, start, end, limit)
+        candles = []
+        for rows in self.iter_rows(asset, timeframe, first, last):
+            candles.extend(_row_to_candle(row) for row in rows)
+        return candles
+
+    def stream_json(self, asset: str, timeframe: str, start: Optional[float] = None,
+                    end: Optional[float] = None, limit: Optional[int] = None,
+                    tail: Optional[Candle] = None) -> Iterator[str]:
+        """Gera a resposta JSON em blocos, sem montar a lista completa em memória.
+
+        ``tail`` (ex.: o candle ainda aberto) é anexado ao final, se informado,
+        e conta no ``limit``; substitui um candle gravado com o mesmo início.
+        """
+        first, last = self.query_range(asset, timeframe, start, end, limit)
+        if tail is not None:
+            series = self._series[(asset, timeframe)] if last > first else None
+            if series is not None and series.times[last - 1 - series.offset] >= tail.time.timestamp():
+                last -= 1
+            if limit is not None and last - first >= limit:
+                first = last - (limit - 1)
+        yield '['
+        separator = ''
+        for rows in self.iter_rows(asset, timeframe, first, last):
+            yield separator + ','.join(_row_to_json(row) for row in rows)
+            separator = ','
+        if tail is not None:
+            row = (tail.time.timestamp(), tail.open, tail.high, tail.low, tail.close, tail.volume)
+            yield separator + _row_to_json(row)
+        yield ']'
+
+
+def _row_to_json(row: tuple) -> str:
+    return json.dumps(
+        {'time': row[0], 'open': row[1], 'high': row[2], 'low': row[3], 'close': row[4], 'volume': row[5]},
+        separators=(',', ':'),
+    )
+
+
+def _row_to_candle(row: tuple) -> Candle:
+    return Candle(time=datetime.fromtimestamp(row[0]), open=row[1], high=row[2], low=row[3],
+                  close=row[4], volume=row[5])
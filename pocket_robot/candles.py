@@ -0,0 +1,173 @@
+"""
+Agregador incremental de candles OHLCV
+Mantém o candle aberto de cada ativo em todos os timeframes de
+constants.TIMEFRAMES e emite os candles fechados como eventos
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from constants import TIMEFRAMES
+from models import Candle
+
+logger = logging.getLogger(__name__)
+
+
+class _CandleState:
+    """Candle em construção (mutável, sem alocação por tick)"""
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, start: float, open_: float, high: float, low: float, close: float, volume: int):
+        self.start = start
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def merge(self, other: '_CandleState'):
+        """Incorpora um candle posterior a este"""
+        if other.high > self.high:
+            self.high = other.high
+        if other.low < self.low:
+            self.low = other.low
+        self.close = other.close
+        self.volume += other.volume
+
+    def to_candle(self, start: Optional[float] = None) -> Candle:
+        return Candle(
+            time=datetime.fromtimestamp(self.start if start is None else start),
+            open=self.open,
+            close=self.close,
+            high=self.high,
+            low=self.low,
+            volume=self.volume,
+        )
+
+
+class CandleAggregator:
+    """Constrói candles de todos os timeframes a partir dos ticks.
+
+    Apenas o menor timeframe é atualizado por tick. Quando um candle
+    fecha ele é incorporado ao timeframe imediatamente superior, que por
+    sua vez fecha e sobe para o próximo, sem nunca reler ticks. O custo
+    por tick é O(número de timeframes) no pior caso.
+
+    Handlers de ``candle_closed`` recebem ``(ativo, timeframe, Candle)`` e
+    são chamados de forma síncrona no caminho do tick.
+    """
+
+    def __init__(self, timeframes: Optional[Dict[str, int]] = None):
+        timeframes = timeframes or TIMEFRAMES
+        ordered = sorted(timeframes.items(), key=lambda item: item[1])
+        for (_, smaller), (name, larger) in zip(ordered, ordered[1:]):
+            if larger % smaller:
+                raise ValueError(f"Timeframe {name} ({larger}s) não é múltiplo de {smaller}s")
+
+        self.timeframe_names: List[str] = [name for name, _ in ordered]
+        self.timeframe_seconds: List[int] = [seconds for _, seconds in ordered]
+        self._levels = {name: level for level, name in enumerate(self.timeframe_names)}
+
+        # ativo -> candle aberto por nível (None = sem dados no período)
+        self._states: Dict[str, List[Optional[_CandleState]]] = {}
+        self.event_handlers: Dict[str, List[Callable]] = defaultdict(list)
+
+        self.stats = {'ticks': 0, 'late_ticks': 0, 'candles_closed': 0}
+
+    def add_event_handler(self, event_type: str, handler: Callable):
+        """Registra handler para eventos do agregador ('candle_closed')"""
+        self.event_handlers[event_type].append(handler)
+
+    def on_tick(self, asset: str, price: float, volume: int, timestamp: float):
+        """Atualiza os candles do ativo com um novo tick"""
+        states = self._states.get(asset)
+        if states is None:
+            states = self._states[asset] = [None] * len(self.timeframe_seconds)
+
+        base = states[0]
+        if base is not None and timestamp < base.start:
+            # Tick fora de ordem para um candle já fechado
+            self.stats['late_ticks'] += 1
+            return
+
+        self._advance(asset, states, timestamp)
+        self.stats['ticks'] += 1
+
+        base = states[0]
+        if base is None:
+            tf = self.timeframe_seconds[0]
+            states[0] = _CandleState(timestamp - timestamp % tf, price, price, price, price, volume)
+            return
+
+        if price > base.high:
+            base.high = price
+        if price < base.low:
+            base.low = price
+        base.close = price
+        base.volume += volume
+
+    def close_stale(self, now: float):
+        """Fecha candles cujo período terminou mesmo sem novos ticks"""
+        for asset, states in self._states.items():
+            self._advance(asset, states, now)
+
+    def current(self, asset: str, timeframe: str) -> Optional[Candle]:
+        """Candle em formação do ativo no timeframe (inclui os níveis inferiores)"""
+        states = self._states.get(asset)
+        if states is None:
+            return None
+
+        level = self._levels[timeframe]
+        merged: Optional[_CandleState] = None
+        # Do nível pedido (mais antigo) até o nível base (mais recente)
+        for state in reversed(states[:level + 1]):
+            if state is None:
+                continue
+            if merged is None:
+                merged = _CandleState(state.start, state.open, state.high, state.low, state.close, state.volume)
+            else:
+                merged.merge(state)
+
+        if merged is None:
+            return None
+        tf = self.timeframe_seconds[level]
+        return merged.to_candle(merged.start - merged.start % tf)
+
+    def _advance(self, asset: str, states: List[Optional[_CandleState]], timestamp: float):
+        for level, tf in enumerate(self.timeframe_seconds):
+            state = states[level]
+            if state is not None and state.start != timestamp - timestamp % tf:
+                states[level] = None
+                self._close(asset, level, state, states)
+
+    def _close(self, asset: str, level: int, state: _CandleState, states: List[Optional[_CandleState]]):
+        self.stats['candles_closed'] += 1
+        self._emit('candle_closed', asset, self.timeframe_names[level], state.to_candle())
+
+        parent_level = level + 1
+        if parent_level >= len(self.timeframe_seconds):
+            return
+
+        tf = self.timeframe_seconds[parent_level]
+        parent_start = state.start - state.start % tf
+        parent = states[parent_level]
+        if parent is not None and parent.start != parent_start:
+            states[parent_level] = None
+            self._close(asset, parent_level, parent, states)
+            parent = None
+
+        if parent is None:
+            states[parent_level] = _CandleState(
+                parent_start, state.open, state.high, state.low, state.close, state.volume
+            )
+        else:
+            parent.merge(state)
+
+    def _emit(self, event_type: str, *args):
+        for handler in self.event_handlers.get(event_type, ()):
+            try:
+                handler(*args)
+            except Exception as e:
+                logger.error(f"Erro no handler de evento para {event_type}: {e}")
@@ -10,9 +10,13 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Callable
 from dataclasses import dataclass, asdict
 from collections import deque, defaultdict
-import statistics
 import logging
 
+from latency import LatencyRecorder, round_snapshot
+from region_ranking import RegionRanking, probe_all, region_of
+from rates import RateCounters
+from tracing import tracer
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -39,6 +43,9 @@ class PerformanceSnapshot:
 
 class MockPocketOptionClient:
     """Cliente mock para simulação"""
+    # Não envia eventos 'tick': o robô consulta os preços periodicamente
+    supports_tick_stream = False
+
     def __init__(self, ssid, is_demo=True, **kwargs):
         self.ssid = ssid
         self.is_demo = is_demo
@@ -74,43 +81,69 @@ class MockPocketOptionClient:
 
 class RealPocketOptionClient:
     """Cliente Socket.IO real para conectar à Pocket Option (apenas leitura/monitoramento)."""
+    # Ticks chegam via evento 'tick' do Socket.IO
+    supports_tick_stream = True
+
     def __init__(self, ssid, is_demo=True, region_urls=None, **kwargs):
         import socketio
+        self._socketio = socketio
         self.ssid = ssid
         self.is_demo = is_demo
         self.is_connected = False
         self.event_callbacks = defaultdict(list)
-        self.sio = socketio.AsyncClient(reconnection=True, logger=False)
+        # cliente da região que venceu a corrida do connect
+        self.sio = None
+        self.url = None
         self._task = None
 
         # escolher endpoints
         self.region_urls = region_urls
 
-        # registrar handlers
-        @self.sio.event
-        async def connect():
-            self.is_connected = True
-            await self._emit_event('connected', {'ssid': self.ssid})
+    def _new_sio(self):
+        """Cria um AsyncClient; só o cliente ativo (self.sio) repassa eventos"""
+        sio = self._socketio.AsyncClient(reconnection=True, logger=False)
 
-        @self.sio.event
+        @sio.event
+        async def connect():
+            # Só reconexões automáticas chegam aqui com sio ativo: o connect inicial
+            # e a troca de região definem self.sio depois do handshake
+            if sio is self.sio:
+                self.is_connected = True
+                await self._emit_event('connected', {'ssid': self.ssid})
+                await self._emit_event('reconnected', {'ssid': self.ssid, 'url': self.url})
+
+        @sio.event
         async def disconnect():
-            self.is_connected = False
-            await self._emit_event('disconnected', {})
+            if sio is self.sio:
+                self.is_connected = False
+                await self._emit_event('disconnected', {})
 
-        @self.sio.on('tick')
+        @sio.on('tick')
         async def on_tick(data):
-            await self._emit_event('tick', data)
+            if sio is self.sio:
+                await self._emit_event('tick', data)
 
-        @self.sio.on('balance')
+        @sio.on('balance')
         async def on_balance(data):
-            await self._emit_event('balance', data)
+            if sio is self.sio:
+                await self._emit_event('balance', data)
 
-        @self.sio.on('error')
+        @sio.on('error')
         async def on_error(data):
-            await self._emit_event('error', data)
+            if sio is self.sio:
+                await self._emit_event('error', data)
+
+        return sio
 
     async def connect(self):
-        """Conecta ao primeiro endpoint disponível."""
+        """Conecta à primeira região que completar o handshake (happy eyeballs).
+
+        As tentativas começam escalonadas por ``race_stagger`` segundos, ou
+        logo após a falha da anterior; a primeira que conectar fica e as
+        demais são canceladas. No pior caso o connect leva cerca de um
+        ``connect_timeout`` em vez de um por região. Cada tentativa emite
+        'connect_attempt' com url, região, duração e resultado.
+        """
         try:
             urls = list(self.region_urls) if self.region_urls else []
             if not urls:
@@ -118,22 +151,125 @@ class RealPocketOptionClient:
                 from constants import REGION
                 urls = REGION.get_demo_regions()
 
-            # tenta conectar nas urls até conseguir
-            for url in urls:
-                try:
-                    await self.sio.connect(url, transports=['websocket'], auth={'token': self.ssid})
-                    self.is_connected = True
-                    return True
-                except Exception:
-                    continue
+            winner = await self._race(urls)
+            if winner is None:
+                return False
+            self.sio, self.url = winner
+            self.is_connected = True
+            await self._emit_event('connected', {'ssid': self.ssid, 'url': self.url})
+            return True
+        except Exception as e:
+            return False
+
+    async def subscribe_assets(self, assets):
+        """Pede ao servidor o stream de ticks dos ativos"""
+        from constants import CONNECTION_SETTINGS
+
+        event = CONNECTION_SETTINGS.get('subscribe_event', 'changeSymbol')
+        for asset in assets:
+            await self.sio.emit(event, {'asset': asset, 'period': 1})
+
+    async def unsubscribe_assets(self, assets):
+        from constants import CONNECTION_SETTINGS
 
+        event = CONNECTION_SETTINGS.get('unsubscribe_event', 'unsubscribeSymbol')
+        for asset in assets:
+            await self.sio.emit(event, {'asset': asset})
+
+    async def switch_region(self, urls):
+        """Conecta a outra região antes de largar a atual (make-before-break)"""
+        winner = await self._race([url for url in urls if url != self.url])
+        if winner is None:
             return False
+        previous = self.sio
+        self.sio, self.url = winner
+        self.is_connected = True
+        if previous is not None:
+            await self._discard(previous)
+        await self._emit_event('region_switched', {'url': self.url})
+        return True
+
+    async def _attempt(self, sio, url, timeout):
+        """Uma tentativa de conexão: (conectou, erro); nunca levanta exceção além do cancelamento"""
+        try:
+            await asyncio.wait_for(sio.connect(url, transports=['websocket'], auth={'token': self.ssid}), timeout)
+            return True, None
+        except asyncio.TimeoutError:
+            return False, 'timeout'
         except Exception as e:
-            return False
+            return False, str(e) or type(e).__name__
+
+    async def _race(self, urls):
+        """Disputa as urls e retorna (sio, url) da primeira que conectar, ou None"""
+        from constants import CONNECTION_SETTINGS
+
+        timeout = CONNECTION_SETTINGS.get('connect_timeout', 10)
+        stagger = CONNECTION_SETTINGS.get('race_stagger', 0.25)
+        attempts = {}  # task -> (sio, url, início)
+        next_url = 0
+        winner = None
+        try:
+            while winner is None and (attempts or next_url < len(urls)):
+                if next_url < len(urls):
+                    url = urls[next_url]
+                    next_url += 1
+                    sio = self._new_sio()
+                    task = asyncio.create_task(self._attempt(sio, url, timeout))
+                    attempts[task] = (sio, url, time.monotonic())
+                # Próxima tentativa após o intervalo, ou assim que alguma terminar
+                done, _ = await asyncio.wait(
+                    attempts, timeout=stagger if next_url < len(urls) else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    sio, url, started = attempts.pop(task)
+                    ok, error = task.result()
+                    duration = time.monotonic() - started
+                    if ok and winner is None:
+                        winner = (sio, url)
+                        await self._report_attempt(url, duration, 'connected')
+                    elif ok:
+                        # Outra região terminou no mesmo instante
+                        await self._discard(sio)
+                        await self._report_attempt(url, duration, 'lost')
+                    else:
+                        await self._discard(sio)
+                        await self._report_attempt(url, duration, 'failed', error)
+        finally:
+            # Cancela as tentativas restantes (também se o próprio connect for cancelado)
+            for task in attempts:
+                task.cancel()
+            for task, (sio, url, started) in attempts.items():
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+                await self._discard(sio)
+                await self._report_attempt(url, time.monotonic() - started, 'cancelled')
+        return winner
+
+    async def _discard(self, sio):
+        try:
+            await sio.disconnect()
+        except Exception:
+            pass
+
+    async def _report_attempt(self, url, duration, outcome, error=None):
+        from constants import REGION
+
+        region = next((name for name, region_url in REGION.REGIONS.items() if region_url == url), url)
+        await self._emit_event('connect_attempt', {
+            'url': url,
+            'region': region,
+            'duration': duration,
+            'outcome': outcome,
+            'error': error,
+        })
 
     async def disconnect(self):
         try:
-            await self.sio.disconnect()
+            if self.sio:
+                await self.sio.disconnect()
         finally:
             self.is_connected = False
 
@@ -185,36 +321,41 @@ class ConnectionMonitor:
         self.total_messages = 0
         self.total_errors = 0
         self.last_ping_time = None
-        self.ping_times: deque = deque(maxlen=100)
 
         # Event handlers
         self.event_handlers: Dict[str, List[Callable]] = defaultdict(list)
 
-        # Performance tracking
-        self.response_times: deque = deque(maxlen=100)
+        # Performance tracking: streaming histograms (lifetime + 1m/5m windows)
+        # of connect time, health-check RTT and ping RTT, in seconds
+        self.latency: Dict[str, LatencyRecorder] = {
+            "connect": LatencyRecorder(),
+            "health_check": LatencyRecorder(),
+            "ping": LatencyRecorder(),
+        }
         self.connection_attempts = 0
         self.successful_connections = 0
+        # Per-region attempts of the connect race (RealPocketOptionClient)
+        self.connect_attempts: deque = deque(maxlen=100)
+        self.connect_attempt_outcomes: Dict[str, int] = defaultdict(int)
+
+        # EWMA latency ranking of the regions, persisted between runs
+        self.region_ranking = RegionRanking.load()
+        self.region_probe_task: Optional[asyncio.Task] = None
+        self.region_switches = 0
+
+        # Per-shard health when the upstream feed is sharded (POCKET_FEED_SHARDS)
+        self.shards: Dict[int, Dict[str, Any]] = {}
+        self.shard_disconnects: Dict[int, int] = defaultdict(int)
+
+        # Sliding-window (1s/10s/1m/5m) and EWMA rates
+        self.rates = RateCounters(("messages", "connection_errors", "reconnects"))
 
     async def start_monitoring(self, persistent_connection: bool = True) -> bool:
         """Start real-time monitoring"""
         logger.info("Iniciando monitoramento de conexão...")
 
         try:
-            # Initialize client: use real client if POCKET_USE_REAL env set
-            use_real = False
-            try:
-                import os
-                use_real = os.environ.get('POCKET_USE_REAL', '1') == '1'
-            except Exception:
-                use_real = False
-
-            if use_real:
-                try:
-                    self.client = RealPocketOptionClient(self.ssid, is_demo=self.is_demo, region_urls=None)
-                except Exception:
-                    self.client = MockPocketOptionClient(self.ssid, is_demo=self.is_demo)
-            else:
-                self.client = MockPocketOptionClient(self.ssid, is_demo=self.is_demo)
+            self.client = self._create_client()
 
             # Setup event handlers
             self._setup_event_handlers()
@@ -228,6 +369,7 @@ class ConnectionMonitor:
             if success:
                 connection_time = time.time() - start_time
                 self.successful_connections += 1
+                self.latency["connect"].record(connection_time)
 
                 # Record connection metrics
                 self._record_connection_metrics(connection_time, "CONNECTED")
@@ -235,6 +377,8 @@ class ConnectionMonitor:
                 # Start monitoring tasks
                 self.is_monitoring = True
                 self.monitor_task = asyncio.create_task(self._monitoring_loop())
+                if hasattr(self.client, "switch_region"):
+                    self.region_probe_task = asyncio.create_task(self._region_probe_loop())
 
                 logger.info(f"Monitoramento iniciado (tempo de conexão: {connection_time:.3f}s)")
                 return True
@@ -244,23 +388,71 @@ class ConnectionMonitor:
                 return False
 
         except Exception as e:
-            self.total_errors += 1
+            self._count_error()
             self._record_error("monitoring_start", str(e))
             logger.error(f"Falha ao iniciar monitoramento: {e}")
             return False
 
+    def _create_client(self):
+        """Pick the upstream client from the environment.
+
+        POCKET_REPLAY_PATH replays recorded ticks (speed from POCKET_REPLAY_SPEED:
+        1, 10 or max); otherwise the real client is used when POCKET_USE_REAL=1
+        (default), sharded over POCKET_FEED_SHARDS connections when > 1,
+        falling back to the mock client.
+        """
+        import os
+
+        replay_path = os.environ.get('POCKET_REPLAY_PATH')
+        if replay_path:
+            from replay import ReplayPocketOptionClient, parse_speed
+            return ReplayPocketOptionClient(
+                self.ssid,
+                is_demo=self.is_demo,
+                path=replay_path,
+                speed=parse_speed(os.environ.get('POCKET_REPLAY_SPEED')),
+                loop_replay=os.environ.get('POCKET_REPLAY_LOOP', '0') == '1',
+            )
+
+        use_real = os.environ.get('POCKET_USE_REAL', '1') == '1'
+        shards = int(os.environ.get('POCKET_FEED_SHARDS', '1') or 1)
+        if use_real and shards > 1:
+            try:
+                from feed_shards import ShardedPocketOptionClient
+                return ShardedPocketOptionClient(self.ssid, is_demo=self.is_demo, shards=shards,
+                                                 region_urls=self.region_ranking.ranked(self._candidate_regions()))
+            except Exception:
+                pass
+        if use_real:
+            try:
+                # fastest healthy region from the cached ranking is tried first
+                return RealPocketOptionClient(self.ssid, is_demo=self.is_demo,
+                                              region_urls=self.region_ranking.ranked(self._candidate_regions()))
+            except Exception:
+                pass
+        return MockPocketOptionClient(self.ssid, is_demo=self.is_demo)
+
+    def _candidate_regions(self) -> List[str]:
+        """Regions the client may connect to (demo endpoints in demo mode)"""
+        from constants import REGION
+
+        return REGION.get_demo_regions() if self.is_demo else REGION.get_all(randomize=False)
+
     async def stop_monitoring(self):
         """Stop monitoring"""
         logger.info("Parando monitoramento de conexão...")
 
         self.is_monitoring = False
 
-        if self.monitor_task and not self.monitor_task.done():
-            self.monitor_task.cancel()
-            try:
-                await self.monitor_task
-            except asyncio.CancelledError:
-                pass
+        for task in (self.monitor_task, self.region_probe_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if self.region_ranking.dirty:
+            self.region_ranking.save()
 
         if self.client:
             await self.client.disconnect()
@@ -277,6 +469,9 @@ class ConnectionMonitor:
         self.client.add_event_callback("disconnected", self._on_disconnected)
         self.client.add_event_callback("reconnected", self._on_reconnected)
         self.client.add_event_callback("auth_error", self._on_auth_error)
+        self.client.add_event_callback("connect_attempt", self._on_connect_attempt)
+        self.client.add_event_callback("region_switched", self._on_region_switched)
+        self.client.add_event_callback("shard_status", self._on_shard_status)
 
     async def _monitoring_loop(self):
         """Main monitoring loop"""
@@ -285,21 +480,25 @@ class ConnectionMonitor:
         while self.is_monitoring:
             try:
                 # Collect performance snapshot
-                await self._collect_performance_snapshot()
+                with tracer.span("collect_snapshot", "monitor"):
+                    await self._collect_performance_snapshot()
 
                 # Check connection health
-                await self._check_connection_health()
+                with tracer.span("health_check", "monitor"):
+                    await self._check_connection_health()
 
                 # Send ping and measure response
-                await self._measure_ping_response()
+                with tracer.span("ping", "monitor"):
+                    await self._measure_ping_response()
 
                 # Emit monitoring events
-                await self._emit_monitoring_events()
+                with tracer.span("emit_events", "monitor"):
+                    await self._emit_monitoring_events()
 
                 await asyncio.sleep(5)  # Monitor every 5 seconds
 
             except Exception as e:
-                self.total_errors += 1
+                self._count_error()
                 self._record_error("monitoring_loop", str(e))
                 logger.error(f"Erro no loop de monitoramento: {e}")
 
@@ -319,17 +518,14 @@ class ConnectionMonitor:
             except ImportError:
                 pass
 
-            # Calculate messages per second
-            uptime = (datetime.now() - self.start_time).total_seconds()
-            messages_per_second = self.total_messages / uptime if uptime > 0 else 0
+            # Messages per second over the last 10 seconds
+            messages_per_second = self.rates.rate("messages", "10s")
 
             # Calculate error rate
             error_rate = self.total_errors / max(self.total_messages, 1)
 
-            # Calculate average response time
-            avg_response_time = (
-                statistics.mean(self.response_times) if self.response_times else 0
-            )
+            # Average health-check response time over the last minute
+            avg_response_time = self.latency["health_check"].window("1m")["mean"]
 
             snapshot = PerformanceSnapshot(
                 timestamp=datetime.now(),
@@ -362,7 +558,7 @@ class ConnectionMonitor:
             balance = await self.client.get_balance()
             response_time = time.time() - start_time
 
-            self.response_times.append(response_time)
+            self.latency["health_check"].record(response_time)
 
             if balance:
                 self._record_connection_metrics(response_time, "HEALTHY")
@@ -370,7 +566,7 @@ class ConnectionMonitor:
                 self._record_connection_metrics(response_time, "UNHEALTHY")
 
         except Exception as e:
-            self.total_errors += 1
+            self._count_error()
             self._record_error("health_check", str(e))
             self._record_connection_metrics(0, "ERROR")
 
@@ -385,14 +581,14 @@ class ConnectionMonitor:
 
             ping_time = time.time() - start_time
 
-            self.ping_times.append(ping_time)
+            self.latency["ping"].record(ping_time)
             self.last_ping_time = datetime.now()
 
-            self.total_messages += 1
+            self._count_message()
             self.message_stats["ping"] += 1
 
         except Exception as e:
-            self.total_errors += 1
+            self._count_error()
             self._record_error("ping_measure", str(e))
 
     async def _emit_monitoring_events(self):
@@ -448,7 +644,7 @@ class ConnectionMonitor:
         metrics = ConnectionMetrics(
             timestamp=datetime.now(),
             connection_time=connection_time,
-            ping_time=self.ping_times[-1] if self.ping_times else None,
+            ping_time=self.latency["ping"].last,
             message_count=self.total_messages,
             error_count=self.total_errors,
             region=region,
@@ -480,19 +676,81 @@ class ConnectionMonitor:
 
     # Event handler methods
     async def _on_connected(self, data):
-        self.total_messages += 1
+        self._count_message()
         self.message_stats["connected"] += 1
 
     async def _on_disconnected(self, data):
-        self.total_messages += 1
+        self._count_message()
         self.message_stats["disconnected"] += 1
 
     async def _on_reconnected(self, data):
-        self.total_messages += 1
+        self._count_message()
+        self.rates.add("reconnects")
         self.message_stats["reconnected"] += 1
 
+    async def _on_connect_attempt(self, data):
+        """One region attempt of the connect race: url, region, duration, outcome, error"""
+        outcome = data.get("outcome", "unknown")
+        self.connect_attempt_outcomes[outcome] += 1
+        self.connect_attempts.append({**data, "timestamp": datetime.now().isoformat()})
+        # cancelled attempts were cut short by the winner; their duration says nothing
+        if outcome in ("connected", "failed", "lost"):
+            self.record_latency("connect_attempt", data.get("duration", 0.0))
+        if outcome == "failed":
+            self._record_error("connect_attempt", f"{data.get('region')}: {data.get('error')}")
+        # health only: a full Socket.IO handshake is not comparable with the probe timings
+        if outcome in ("connected", "failed") and data.get("url"):
+            self.region_ranking.record(data["url"], ok=outcome == "connected")
+
+    async def _on_shard_status(self, data):
+        """Health of one upstream shard: connected, stalled, assets, tick rate"""
+        shard = data.get("shard")
+        previous = self.shards.get(shard)
+        if previous and previous.get("connected") and not data.get("connected"):
+            self.shard_disconnects[shard] += 1
+            self._record_error("shard_disconnected", f"shard {shard}")
+        if data.get("stalled") and not (previous and previous.get("stalled")):
+            self._record_error("shard_stalled", f"shard {shard}: {data.get('assets')} ativos")
+        self.shards[shard] = {**data, "disconnects": self.shard_disconnects[shard]}
+
+    async def _on_region_switched(self, data):
+        self.region_switches += 1
+        self.message_stats["region_switched"] += 1
+        logger.info(f"Conexão migrada para a região {region_of(data.get('url'))}")
+
+    async def _region_probe_loop(self):
+        """Probe every region, persist the ranking and fail over to a much faster region"""
+        from constants import CONNECTION_SETTINGS, REGION
+
+        interval = CONNECTION_SETTINGS.get("region_probe_interval", 60)
+        timeout = CONNECTION_SETTINGS.get("region_probe_timeout", 5)
+        while self.is_monitoring:
+            try:
+                with tracer.span("region_probe", "monitor"):
+                    await probe_all(self.region_ranking, REGION.REGIONS.values(), timeout)
+                self.region_ranking.save()
+                await self._maybe_switch_region(CONNECTION_SETTINGS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._record_error("region_probe", str(e))
+            await asyncio.sleep(interval)
+
+    async def _maybe_switch_region(self, settings: Dict[str, Any]):
+        current = getattr(self.client, "url", None)
+        if not current or not self.client.is_connected:
+            return
+        candidates = self._candidate_regions()
+        target = self.region_ranking.should_switch(
+            current, candidates, settings.get("failover_ratio", 1.5), settings.get("failover_min_gain", 0.03)
+        )
+        if target is None:
+            return
+        logger.info(f"Região {region_of(current)} mais lenta que {region_of(target)}: migrando")
+        await self.client.switch_region(self.region_ranking.ranked(candidates))
+
     async def _on_auth_error(self, data):
-        self.total_errors += 1
+        self._count_error()
         self.message_stats["auth_error"] += 1
         self._record_error("auth_error", str(data))
 
@@ -500,6 +758,25 @@ class ConnectionMonitor:
         """Add event handler for monitoring events"""
         self.event_handlers[event_type].append(handler)
 
+    def _count_message(self):
+        self.total_messages += 1
+        self.rates.add("messages")
+
+    def _count_error(self):
+        self.total_errors += 1
+        self.rates.add("connection_errors")
+
+    def record_latency(self, name: str, seconds: float):
+        """Record a sample in a named histogram (created on first use)"""
+        recorder = self.latency.get(name)
+        if recorder is None:
+            recorder = self.latency[name] = LatencyRecorder()
+        recorder.record(seconds)
+
+    def get_latency_summary(self) -> Dict[str, Any]:
+        """p50/p90/p99/p999 (ms) per histogram, lifetime and rolling windows"""
+        return {name: round_snapshot(recorder.snapshot()) for name, recorder in self.latency.items()}
+
     def get_real_time_stats(self) -> Dict[str, Any]:
         """Get current real-time statistics"""
         uptime = datetime.now() - self.start_time
@@ -510,9 +787,7 @@ class ConnectionMonitor:
             "total_messages": self.total_messages,
             "total_errors": self.total_errors,
             "error_rate": self.total_errors / max(self.total_messages, 1),
-            "messages_per_second": self.total_messages / uptime.total_seconds()
-            if uptime.total_seconds() > 0
-            else 0,
+            "messages_per_second": self.rates.rate("messages", "10s"),
             "connection_attempts": self.connection_attempts,
             "successful_connections": self.successful_connections,
             "connection_success_rate": self.successful_connections
@@ -522,29 +797,40 @@ class ConnectionMonitor:
             if self.last_ping_time
             else None,
             "message_types": dict(self.message_stats),
+            "connect_attempt_outcomes": dict(self.connect_attempt_outcomes),
+            "region": region_of(getattr(self.client, "url", None) or "") or None,
+            "region_switches": self.region_switches,
+            "region_ranking": self.region_ranking.summary(),
+            "shards": [self.shards[index] for index in sorted(self.shards)],
+            "last_connect_attempts": list(self.connect_attempts)[-10:],
+            "rates": self.rates.snapshot(),
         }
 
-        # Add response time stats
-        if self.response_times:
-            stats.update(
-                {
-                    "avg_response_time": statistics.mean(self.response_times),
-                    "min_response_time": min(self.response_times),
-                    "max_response_time": max(self.response_times),
-                    "median_response_time": statistics.median(self.response_times),
-                }
-            )
+        # Add response time stats (last minute)
+        response = self.latency["health_check"].window("1m")
+        stats.update(
+            {
+                "avg_response_time": response["mean"],
+                "min_response_time": response["min"],
+                "max_response_time": response["max"],
+                "median_response_time": response["p50"],
+            }
+        )
 
-        # Add ping stats
-        if self.ping_times:
+        # Add ping stats (last minute)
+        ping = self.latency["ping"].window("1m")
+        if ping["count"]:
             stats.update(
                 {
-                    "avg_ping_time": statistics.mean(self.ping_times),
-                    "min_ping_time": min(self.ping_times),
-                    "max_ping_time": max(self.ping_times),
+                    "avg_ping_time": ping["mean"],
+                    "min_ping_time": ping["min"],
+                    "max_ping_time": ping["max"],
                 }
             )
 
+        # Percentiles (ms) over the process lifetime and rolling windows
+        stats["latency_ms"] = self.get_latency_summary()
+
         # Add latest performance snapshot data
         if self.performance_snapshots:
             latest = self.performance_snapshots[-1]
@@ -258,6 +258,32 @@ CONNECTION_SETTINGS = {
     "max_reconnect_attempts": 5,
     "reconnect_delay": 5,
     "message_timeout": 30,
+    # Corrida entre regiões no connect: prazo de cada tentativa e intervalo
+    # entre o início de uma tentativa e o da seguinte (s)
+    "connect_timeout": 10,
+    "race_stagger": 0.25,
+    # Sonda de latência das regiões (region_ranking): intervalo e prazo de
+    # cada medição (s); migra de região quando a melhor alternativa é
+    # failover_ratio vezes mais rápida e ganha ao menos failover_min_gain s
+    "region_probe_interval": 60,
+    "region_probe_timeout": 5,
+    "failover_ratio": 1.5,
+    "failover_min_gain": 0.03,
+    # Feed em várias conexões (feed_shards): eventos de assinatura de ativos
+    # no servidor, intervalo de balanceamento, prazo sem ticks para um shard
+    # ser considerado parado (s) e desbalanceamento tolerado entre shards
+    "subscribe_event": "changeSymbol",
+    "unsubscribe_event": "unsubscribeSymbol",
+    "shard_rebalance_interval": 10,
+    "shard_stall_timeout": 15,
+    "shard_imbalance_ratio": 1.5,
+}
+
+# Batch fetch settings (busca de dados de mercado por ciclo)
+FETCH_SETTINGS = {
+    "concurrency": 32,
+    "asset_timeout": 0.5,
+    "cycle_timeout": 0.9,
 }
 
 # API Limits
@@ -0,0 +1,395 @@
+"""
+Feed upstream em várias conexões (shards)
+Divide os ativos entre K conexões RealPocketOptionClient, cada uma com sua
+própria corrida de regiões e seu próprio estado de saúde, e entrega ao
+resto do robô um único stream de ticks, com a mesma interface de cliente
+
+A divisão é balanceada pela taxa de ticks observada por ativo (atribuição
+gulosa: ativos mais ativos primeiro, sempre no shard menos carregado).
+Periodicamente os shards desconectados ou parados (sem ticks por
+``shard_stall_timeout`` s quando a taxa dos seus ativos previa ticks) perdem
+seus ativos para os saudáveis, e a carga é redistribuída quando o shard mais carregado
+passa de ``shard_imbalance_ratio`` vezes o menos carregado. Um shard que
+reconecta (ou troca de região) assina de novo os ativos que possui; sem
+nenhum shard saudável, os parados reassinam os seus a cada ciclo
+
+Habilitado com POCKET_FEED_SHARDS=K (K > 1)
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from constants import ACTIVES, CONNECTION_SETTINGS
+from rates import RateCounter
+from tick_pipeline import decode_tick_payload
+
+logger = logging.getLogger(__name__)
+
+# Peso da janela mais recente na taxa por ativo usada no balanceamento
+RATE_EWMA_ALPHA = 0.5
+# Taxa atribuída a ativos ainda sem ticks (mantém a divisão por quantidade no início)
+DEFAULT_ASSET_RATE = 1.0
+# Ticks esperados no prazo de parada para que a falta deles conte como parada
+MIN_EXPECTED_TICKS = 3
+
+# Eventos de um shard repassados tal como chegam (com o índice do shard)
+FORWARDED_EVENTS = ('connect_attempt', 'region_switched', 'reconnected', 'error', 'auth_error')
+
+
+def balance(rates: Dict[str, float], shards: Iterable[int]) -> Dict[int, List[str]]:
+    """Atribuição gulosa (LPT) dos ativos aos shards pela taxa de ticks"""
+    shards = list(shards)
+    assignment: Dict[int, List[str]] = {shard: [] for shard in shards}
+    if not shards:
+        return assignment
+    load = {shard: 0.0 for shard in shards}
+    for asset in sorted(rates, key=lambda a: (-rates[a], a)):
+        shard = min(shards, key=lambda s: (load[s], len(assignment[s]), s))
+        assignment[shard].append(asset)
+        load[shard] += rates[asset]
+    return assignment
+
+
+class _Shard:
+    __slots__ = ('index', 'client', 'assets', 'ticks', 'last_tick', 'connected_since', 'stalled', 'excluded_until')
+
+    def __init__(self, index: int, client):
+        self.index = index
+        self.client = client
+        self.assets: List[str] = []
+        self.ticks = RateCounter()
+        self.last_tick: Optional[float] = None
+        self.connected_since: Optional[float] = None
+        self.stalled = False
+        # shard parado não recebe ativos de volta antes disso (time.monotonic())
+        self.excluded_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return bool(self.client.is_connected) and not self.stalled and now >= self.excluded_until
+
+
+class ShardedPocketOptionClient:
+    """K conexões upstream vistas pelo robô como um único cliente"""
+    supports_tick_stream = True
+
+    def __init__(self, ssid, is_demo=True, region_urls=None, shards: int = 2,
+                 assets: Optional[Iterable[str]] = None, client_factory: Optional[Callable] = None, **kwargs):
+        if client_factory is None:
+            from connection_monitor import RealPocketOptionClient
+            client_factory = RealPocketOptionClient
+        self.ssid = ssid
+        self.is_demo = is_demo
+        self.region_urls = region_urls
+        self.event_callbacks = defaultdict(list)
+        # sem url única: a failover de região do monitor não se aplica ao conjunto
+        self.url = None
+        self.assets = list(assets) if assets is not None else list(ACTIVES)
+        self.asset_rates: Dict[str, float] = {asset: DEFAULT_ASSET_RATE for asset in self.assets}
+        self._window_counts: Dict[str, int] = defaultdict(int)
+        self._window_start = time.monotonic()
+        self.shards: List[_Shard] = [
+            _Shard(i, client_factory(ssid, is_demo=is_demo, region_urls=region_urls)) for i in range(shards)
+        ]
+        for shard in self.shards:
+            self._wire(shard)
+        self._task: Optional[asyncio.Task] = None
+        self.rebalances = 0
+        self.moves = 0
+
+    # Interface de cliente
+
+    @property
+    def is_connected(self) -> bool:
+        return any(shard.client.is_connected for shard in self.shards)
+
+    async def connect(self):
+        """Conecta todos os shards em paralelo; basta um para o feed começar"""
+        results = await asyncio.gather(*(self._connect_shard(shard) for shard in self.shards))
+        if not any(results):
+            return False
+        await self._assign(balance(self.asset_rates, [s.index for s in self.shards if s.client.is_connected]), initial=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._rebalance_loop())
+        await self._emit_event('connected', {'ssid': self.ssid, 'shards': sum(results)})
+        return True
+
+    async def disconnect(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(*(shard.client.disconnect() for shard in self.shards), return_exceptions=True)
+
+    async def get_balance(self):
+        client = self._any_connected()
+        return await client.get_balance() if client else None
+
+    async def send_message(self, message):
+        client = self._any_connected()
+        return await client.send_message(message) if client else False
+
+    async def switch_region(self, urls):
+        """Migra cada shard para a melhor região das ``urls`` (além da atual)"""
+        results = await asyncio.gather(*(shard.client.switch_region(urls) for shard in self.shards
+                                         if shard.client.is_connected))
+        return any(results)
+
+    def add_event_callback(self, event_type, callback):
+        self.event_callbacks[event_type].append(callback)
+
+    async def _emit_event(self, event_type, data):
+        for handler in self.event_callbacks.get(event_type, ()):
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    await handler(data)
+                else:
+                    handler(data)
+            except Exception:
+                pass
+
+    def _any_connected(self):
+        for shard in self.shards:
+            if shard.client.is_connected:
+                return shard.client
+        return None
+
+    # Shards
+
+    def _wire(self, shard: _Shard):
+        """Encaminha os eventos do cliente do shard para o stream único"""
+        def on_tick(data):
+            self._on_shard_tick(shard, data)
+
+        async def on_connected(data):
+            shard.connected_since = time.monotonic()
+            shard.stalled = False
+            # reconexão automática do AsyncClient: a nova sessão não herda as assinaturas
+            await self._resubscribe(shard)
+            await self._report(shard)
+
+        async def on_region_switched(data):
+            shard.connected_since = time.monotonic()
+            await self._resubscribe(shard)
+
+        async def on_disconnected(data):
+            shard.connected_since = None
+            await self._report(shard)
+
+        shard.client.add_event_callback('tick', on_tick)
+        shard.client.add_event_callback('connected', on_connected)
+        shard.client.add_event_callback('disconnected', on_disconnected)
+        shard.client.add_event_callback('region_switched', on_region_switched)
+        for event in FORWARDED_EVENTS:
+            shard.client.add_event_callback(event, self._forwarder(event, shard))
+
+    def _forwarder(self, event: str, shard: _Shard):
+        async def forward(data):
+            payload = dict(data) if isinstance(data, dict) else {'data': data}
+            payload['shard'] = shard.index
+            await self._emit_event(event, payload)
+        return forward
+
+    async def _connect_shard(self, shard: _Shard) -> bool:
+        ok = await shard.client.connect()
+        if ok:
+            shard.connected_since = time.monotonic()
+        await self._report(shard)
+        return ok
+
+    def _on_shard_tick(self, shard: _Shard, data):
+        """Decodifica uma vez, conta por ativo e repassa as tuplas já decodificadas"""
+        try:
+            ticks = decode_tick_payload(data)
+        except Exception:
+            # o pipeline conta o payload inválido
+            ticks = None
+        now = time.monotonic()
+        shard.last_tick = now
+        if ticks is None:
+            self._dispatch(data)
+            return
+        shard.ticks.add(len(ticks))
+        counts = self._window_counts
+        for tick in ticks:
+            counts[tick[0]] += 1
+        # [ativo, timestamp, preço, volume] é um formato aceito pelo pipeline
+        self._dispatch(ticks)
+
+    def _dispatch(self, payload):
+        for handler in self.event_callbacks.get('tick', ()):
+            try:
+                result = handler(payload)
+                if asyncio.iscoroutine(result):
+                    asyncio.ensure_future(result)
+            except Exception:
+                pass
+
+    async def _report(self, shard: _Shard):
+        await self._emit_event('shard_status', self.shard_status(shard))
+
+    def shard_status(self, shard: _Shard) -> Dict[str, Any]:
+        rates = shard.ticks.snapshot()
+        return {
+            'shard': shard.index,
+            'connected': bool(shard.client.is_connected),
+            'stalled': shard.stalled,
+            'url': getattr(shard.client, 'url', None),
+            'assets': len(shard.assets),
+            'expected_rate': round(sum(self.asset_rates.get(a, 0.0) for a in shard.assets), 3),
+            'ticks': rates['total'],
+            'ticks_per_second': rates['rate_10s'],
+            'last_tick_age': round(time.monotonic() - shard.last_tick, 3) if shard.last_tick else None,
+        }
+
+    def get_shard_stats(self) -> List[Dict[str, Any]]:
+        return [self.shard_status(shard) for shard in self.shards]
+
+    # Balanceamento
+
+    async def _assign(self, assignment: Dict[int, List[str]], initial: bool = False):
+        """Aplica uma atribuição: cancela no shard antigo e assina no novo só o que mudou"""
+        owner = {asset: shard.index for shard in self.shards for asset in shard.assets}
+        removals: Dict[int, List[str]] = defaultdict(list)
+        additions: Dict[int, List[str]] = defaultdict(list)
+        for index, assets in assignment.items():
+            for asset in assets:
+                previous = owner.get(asset)
+                if previous != index:
+                    additions[index].append(asset)
+                    if previous is not None:
+                        removals[previous].append(asset)
+        for index, assets in removals.items():
+            shard = self.shards[index]
+            shard.assets = [a for a in shard.assets if a not in set(assets)]
+            if shard.client.is_connected:
+                await self._call(shard, 'unsubscribe_assets', assets)
+        for index, assets in additions.items():
+            shard = self.shards[index]
+            shard.assets.extend(assets)
+            await self._call(shard, 'subscribe_assets', assets)
+            if not initial:
+                self.moves += len(assets)
+        if (removals or additions) and not initial:
+            self.rebalances += 1
+            for shard in self.shards:
+                await self._report(shard)
+
+    async def _resubscribe(self, shard: _Shard):
+        """Assina de novo, na conexão atual do shard, os ativos que ele já possui"""
+        if shard.assets and shard.client.is_connected:
+            await self._call(shard, 'subscribe_assets', list(shard.assets))
+
+    async def _call(self, shard: _Shard, method: str, assets: List[str]):
+        try:
+            await getattr(shard.client, method)(assets)
+        except Exception as e:
+            logger.warning(f"Shard {shard.index}: falha em {method} ({len(assets)} ativos): {e}")
+
+    def _update_rates(self, now: float):
+        """Fecha a janela de contagem e atualiza a EWMA de ticks/s por ativo.
+
+        Ativos de shards que não receberam nada na janela mantêm a taxa: o
+        silêncio de uma conexão não diz nada sobre o mercado e a taxa
+        esperada é o que permite detectar a parada.
+        """
+        elapsed = now - self._window_start
+        if elapsed <= 0:
+            return
+        silent = {asset for shard in self.shards
+                  if not shard.last_tick or shard.last_tick < self._window_start
+                  for asset in shard.assets}
+        counts, self._window_counts = self._window_counts, defaultdict(int)
+        self._window_start = now
+        for asset in self.assets:
+            if asset in silent:
+                continue
+            rate = counts.get(asset, 0) / elapsed
+            self.asset_rates[asset] += RATE_EWMA_ALPHA * (rate - self.asset_rates[asset])
+
+    def _check_stalls(self, now: float, stall_timeout: float):
+        """Shard conectado sem ticks há stall_timeout s quando a taxa esperada
+        dos seus ativos previa pelo menos MIN_EXPECTED_TICKS fica parado
+        (também quando todos os shards estão em silêncio)"""
+        for shard in self.shards:
+            expected = sum(self.asset_rates.get(a, 0.0) for a in shard.assets) * stall_timeout
+            if not shard.client.is_connected or expected < MIN_EXPECTED_TICKS:
+                shard.stalled = False
+                continue
+            since = max(shard.last_tick or 0.0, shard.connected_since or 0.0) or now
+            shard.stalled = now - since >= stall_timeout
+            if shard.stalled:
+                shard.excluded_until = now + 2 * stall_timeout
+
+    def plan(self, now: Optional[float] = None) -> Optional[Dict[int, List[str]]]:
+        """Nova atribuição se algum shard está degradado ou a carga desbalanceada.
+
+        Só move o necessário: ativos de shards degradados (ou sem dono) vão
+        para os saudáveis menos carregados; depois, enquanto o mais carregado
+        passar de ``shard_imbalance_ratio`` vezes o menos carregado, move o
+        ativo cuja taxa mais se aproxima de metade da diferença.
+        """
+        now = now if now is not None else time.monotonic()
+        self._check_stalls(now, CONNECTION_SETTINGS.get('shard_stall_timeout', 15))
+        healthy = [shard for shard in self.shards if shard.healthy(now)]
+        if not healthy:
+            return None
+        rates = self.asset_rates
+        assignment = {shard.index: list(shard.assets) for shard in healthy}
+        load = {index: sum(rates.get(a, 0.0) for a in assets) for index, assets in assignment.items()}
+
+        owned = {asset for assets in assignment.values() for asset in assets}
+        orphans = [asset for asset in self.assets if asset not in owned]
+        for shard in self.shards:
+            if shard.assets and shard.index not in assignment:
+                logger.warning(f"Shard {shard.index} degradado: {len(shard.assets)} ativos redistribuídos")
+        changed = bool(orphans)
+        for asset in sorted(orphans, key=lambda a: (-rates.get(a, 0.0), a)):
+            index = min(load, key=lambda i: (load[i], len(assignment[i]), i))
+            assignment[index].append(asset)
+            load[index] += rates.get(asset, 0.0)
+
+        ratio = CONNECTION_SETTINGS.get('shard_imbalance_ratio', 1.5)
+        for _ in range(len(self.assets)):
+            heavy = max(load, key=load.get)
+            light = min(load, key=load.get)
+            if heavy == light or load[heavy] <= ratio * max(load[light], 1e-9):
+                break
+            gap = load[heavy] - load[light]
+            candidates = [asset for asset in assignment[heavy] if rates.get(asset, 0.0) < gap]
+            if not candidates:
+                break
+            asset = min(candidates, key=lambda a: abs(rates.get(a, 0.0) - gap / 2))
+            assignment[heavy].remove(asset)
+            assignment[light].append(asset)
+            load[heavy] -= rates.get(asset, 0.0)
+            load[light] += rates.get(asset, 0.0)
+            changed = True
+        return assignment if changed else None
+
+    async def _rebalance_loop(self):
+        interval = CONNECTION_SETTINGS.get('shard_rebalance_interval', 10)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                now = time.monotonic()
+                self._update_rates(now)
+                assignment = self.plan(now)
+                if assignment is not None:
+                    await self._assign(assignment)
+                else:
+                    for shard in self.shards:
+                        await self._report(shard)
+                # sem shard saudável para recebê-los, os ativos ficam no parado: assina de novo
+                for shard in self.shards:
+                    if shard.stalled:
+                        await self._resubscribe(shard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no balanceamento dos shards: {e}")
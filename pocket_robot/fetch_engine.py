@@ -0,0 +1,98 @@
+"""
+Motor de busca em lote com concorrência limitada
+Busca os dados de vários ativos em paralelo respeitando um prazo por
+ativo e um prazo por ciclo
+"""
+
+import asyncio
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from constants import FETCH_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FetchCycleResult:
+    """Resultado de um ciclo de busca (pode ser parcial)"""
+    results: Dict[str, Any] = field(default_factory=dict)
+    timed_out: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    duration: float = 0.0
+    cycle_deadline_hit: bool = False
+
+    @property
+    def complete(self) -> bool:
+        return not self.timed_out and not self.failed
+
+
+class BatchFetchEngine:
+    """Executa ``fetch(asset)`` para muitos ativos com concorrência limitada.
+
+    Um ativo lento só consome o seu próprio prazo (``asset_timeout``); o
+    ciclo inteiro termina no máximo em ``cycle_timeout`` e devolve o que
+    já foi obtido. ``on_result`` é chamado assim que cada ativo termina,
+    para que os dados não esperem pelo ativo mais lento do ciclo.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Any]],
+        concurrency: int = FETCH_SETTINGS["concurrency"],
+        asset_timeout: float = FETCH_SETTINGS["asset_timeout"],
+        cycle_timeout: float = FETCH_SETTINGS["cycle_timeout"],
+        on_result: Optional[Callable[[str, Any], None]] = None,
+    ):
+        if concurrency <= 0:
+            raise ValueError("concurrency deve ser positivo")
+        self.fetch = fetch
+        self.concurrency = concurrency
+        self.asset_timeout = asset_timeout
+        self.cycle_timeout = cycle_timeout
+        self.on_result = on_result
+        self.last_result: Optional[FetchCycleResult] = None
+
+    async def fetch_all(self, assets: Iterable[str]) -> FetchCycleResult:
+        """Busca todos os ativos e retorna o resultado parcial do ciclo"""
+        start_time = time.perf_counter()
+        result = FetchCycleResult()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_one(asset: str):
+            async with semaphore:
+                try:
+                    value = await asyncio.wait_for(self.fetch(asset), self.asset_timeout)
+                except asyncio.TimeoutError:
+                    result.timed_out.append(asset)
+                    return
+                except Exception as e:
+                    logger.debug(f"Falha ao buscar {asset}: {e}")
+                    result.failed.append(asset)
+                    return
+
+            if value is None:
+                result.failed.append(asset)
+                return
+            result.results[asset] = value
+            if self.on_result:
+                try:
+                    self.on_result(asset, value)
+                except Exception as e:
+                    logger.error(f"Erro processando resultado de {asset}: {e}")
+
+        tasks = {asyncio.create_task(fetch_one(asset)): asset for asset in assets}
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.cycle_timeout)
+            if pending:
+                result.cycle_deadline_hit = True
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                result.timed_out.extend(tasks[task] for task in pending)
+
+        result.duration = time.perf_counter() - start_time
+        self.last_result = result
+        return result
@@ -0,0 +1,254 @@
+"""
+Histogramas de latência em streaming
+Buckets log-lineares (estilo HDR): cada potência de 2 é dividida em
+SUB_BUCKETS faixas lineares, o que limita o erro relativo dos percentis a
+~1/SUB_BUCKETS. Registro O(1), histogramas mescláveis e janelas móveis
+formadas por fatias que giram com o tempo
+"""
+
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+# Faixa representável (segundos); valores fora dela vão para o primeiro/último bucket
+MIN_VALUE = 1e-6
+MAX_VALUE = 120.0
+SUB_BUCKETS = 32
+
+_OCTAVES = int(math.ceil(math.log2(MAX_VALUE / MIN_VALUE))) + 1
+N_BUCKETS = _OCTAVES * SUB_BUCKETS
+
+PERCENTILES = (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('p999', 0.999))
+
+# Janelas móveis padrão (rótulo, duração em s) e fatias por janela
+DEFAULT_WINDOWS = (('1m', 60.0), ('5m', 300.0))
+WINDOW_SLICES = 6
+
+
+def bucket_index(value: float) -> int:
+    if value <= MIN_VALUE:
+        return 0
+    mantissa, exponent = math.frexp(value / MIN_VALUE)  # mantissa em [0.5, 1)
+    index = (exponent - 1) * SUB_BUCKETS + int((mantissa * 2.0 - 1.0) * SUB_BUCKETS)
+    return min(index, N_BUCKETS - 1)
+
+
+def bucket_value(index: int) -> float:
+    """Ponto médio do bucket (valor reportado pelos percentis)"""
+    octave, sub = divmod(index, SUB_BUCKETS)
+    low = MIN_VALUE * 2.0 ** octave * (1.0 + sub / SUB_BUCKETS)
+    return low * (1.0 + 0.5 / SUB_BUCKETS)
+
+
+class LatencyHistogram:
+    """Histograma log-linear mesclável"""
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max', 'version', '_snapshot')
+
+    def __init__(self):
+        self.counts: List[int] = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        # Incrementado a cada alteração; invalida o snapshot em cache
+        self.version = 0
+        self._snapshot: Optional[tuple] = None
+
+    def record(self, value: float):
+        self.counts[bucket_index(value)] += 1
+        self.version += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram'):
+        if not other.count:
+            return
+        self.version += 1
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        self.counts = [0] * N_BUCKETS
+        self.version += 1
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def percentiles(self, quantiles: Iterable[float]) -> List[float]:
+        """Valores dos quantis pedidos (em ordem crescente) em uma única passada"""
+        quantiles = list(quantiles)
+        if not self.count:
+            return [0.0] * len(quantiles)
+        results: List[float] = []
+        targets = [max(1, math.ceil(q * self.count)) for q in quantiles]
+        n_targets = len(targets)
+        target = targets[0]
+        counts = self.counts
+        seen = 0
+        # Só os buckets entre o mínimo e o máximo observados podem ter contagem
+        for i in range(bucket_index(self.min), bucket_index(self.max) + 1):
+            c = counts[i]
+            if not c:
+                continue
+            seen += c
+            while seen >= target:
+                # O bucket é aproximado; nunca reporta fora do intervalo observado
+                results.append(min(max(bucket_value(i), self.min), self.max))
+                if len(results) == n_targets:
+                    return results
+                target = targets[len(results)]
+        results.extend([self.max] * (n_targets - len(results)))
+        return results
+
+    def percentile(self, quantile: float) -> float:
+        return self.percentiles([quantile])[0]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """count, mean, min, max e p50/p90/p99/p999 (segundos); calculado de
+        novo só quando o histograma mudou desde o último snapshot"""
+        cached = self._snapshot
+        if cached is not None and cached[0] == self.version:
+            return dict(cached[1])
+        values = self.percentiles(q for _, q in PERCENTILES)
+        summary = {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+        }
+        summary.update({name: value for (name, _), value in zip(PERCENTILES, values)})
+        self._snapshot = (self.version, summary)
+        return dict(summary)
+
+
+class RollingHistogram:
+    """Janela móvel de ``window`` segundos formada por ``slices`` histogramas.
+
+    O registro vai para a fatia corrente e para a soma da janela; fatias
+    mais antigas que a janela são subtraídas da soma e zeradas quando o
+    tempo avança. O snapshot lê só a soma (sem mesclar as fatias), e a
+    janela efetiva fica entre window - window/slices e window.
+    """
+
+    def __init__(self, window: float = 60.0, slices: int = WINDOW_SLICES):
+        self.window = window
+        self.slice_duration = window / slices
+        self.slices = [LatencyHistogram() for _ in range(slices)]
+        # Soma das fatias, mantida no registro e na rotação
+        self.totals = LatencyHistogram()
+        self._current = 0
+        self._slice_start = time.monotonic()
+
+    def _rotate(self, now: float):
+        elapsed = now - self._slice_start
+        if elapsed < self.slice_duration:
+            return
+        steps = int(elapsed // self.slice_duration)
+        if steps >= len(self.slices):
+            for histogram in self.slices:
+                histogram.reset()
+            self.totals.reset()
+        else:
+            for _ in range(steps):
+                self._current = (self._current + 1) % len(self.slices)
+                self._expire(self.slices[self._current])
+        self._slice_start += steps * self.slice_duration
+
+    def _expire(self, histogram: LatencyHistogram):
+        """Tira a fatia da soma e a zera para reuso"""
+        if not histogram.count:
+            return
+        totals = self.totals
+        totals.version += 1
+        totals.count -= histogram.count
+        if not totals.count:
+            totals.reset()
+        else:
+            counts = totals.counts
+            for i, c in enumerate(histogram.counts):
+                if c:
+                    counts[i] -= c
+            totals.total -= histogram.total
+        histogram.reset()
+        if totals.count:
+            # min/max não são subtraíveis: recalculados das fatias restantes
+            totals.min = min(h.min for h in self.slices)
+            totals.max = max(h.max for h in self.slices)
+
+    def record(self, value: float, now: Optional[float] = None):
+        self._rotate(now if now is not None else time.monotonic())
+        self.slices[self._current].record(value)
+        self.totals.record(value)
+
+    def merged(self, now: Optional[float] = None) -> LatencyHistogram:
+        """Histograma da janela (a soma mantida; não modificar).
+
+        Não gira as fatias: a API lê de outra thread enquanto ``record`` roda
+        no loop, e só ``record`` altera o estado. Com rotação pendente monta
+        um histograma novo sem as fatias que a rotação descartaria.
+        """
+        now = now if now is not None else time.monotonic()
+        steps = int((now - self._slice_start) // self.slice_duration)
+        if steps <= 0:
+            return self.totals
+        n_slices = len(self.slices)
+        expiring = {(self._current + k) % n_slices for k in range(1, min(steps, n_slices) + 1)}
+        merged = LatencyHistogram()
+        for i, histogram in enumerate(self.slices):
+            if i not in expiring:
+                merged.merge(histogram)
+        return merged
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        return self.merged(now).snapshot()
+
+
+class LatencyRecorder:
+    """Histograma de toda a vida do processo mais janelas móveis"""
+
+    def __init__(self, windows=DEFAULT_WINDOWS):
+        self.lifetime = LatencyHistogram()
+        self.windows = {label: RollingHistogram(duration) for label, duration in windows}
+        self.last: Optional[float] = None
+
+    def record(self, value: float):
+        now = time.monotonic()
+        self.last = value
+        self.lifetime.record(value)
+        for window in self.windows.values():
+            window.record(value, now)
+
+    def window(self, label: str) -> Dict[str, Any]:
+        return self.windows[label].snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        summary = {'lifetime': self.lifetime.snapshot()}
+        for label, window in self.windows.items():
+            summary[label] = window.snapshot(now)
+        return summary
+
+
+def round_snapshot(snapshot: Dict[str, Any], scale: float = 1000.0, digits: int = 3) -> Dict[str, Any]:
+    """Converte um snapshot (ou snapshot de LatencyRecorder) para ms arredondados"""
+    result = {}
+    for key, value in snapshot.items():
+        if isinstance(value, dict):
+            result[key] = round_snapshot(value, scale, digits)
+        elif key == 'count':
+            result[key] = value
+        else:
+            result[key] = round(value * scale, digits)
+    return result
@@ -6,11 +6,12 @@ Monitoramento em tempo real de preços e movimentos dos ativos
 """
 
 import asyncio
+import os
 import time
 import json
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 import tkinter as tk
 from tkinter import ttk, scrolledtext
@@ -24,6 +25,17 @@ SSID = "APvcNJhG01jDxHsBI"
 from connection_monitor import ConnectionMonitor, RealTimeDisplay
 from models import Asset, Balance, Candle, Order, OrderResult, ConnectionStatus
 from constants import ACTIVES, REGION
+from tick_store import TickHistoryStore
+from tick_pipeline import TickIngestPipeline
+from fetch_engine import BatchFetchEngine
+from candles import CandleAggregator
+from candle_store import CandleStore
+from tick_journal import TickJournal
+from market_sim import SyntheticMarket
+from quote_table import QuoteTableWriter
+from rates import RateCounters
+from latency import LatencyRecorder, round_snapshot
+from tracing import tracer
 
 # Configuração de logging
 logging.basicConfig(
@@ -59,11 +71,53 @@ class PocketOptionRobot:
         # Componentes principais
         self.monitor = None
         self.market_data: Dict[str, MarketData] = {}
+
+        # Versionamento das atualizações: market_seq cresce a cada tick gravado e
+        # symbol_versions guarda o market_seq da última atualização de cada ativo
+        self.market_seq = 0
+        self.symbol_versions: Dict[str, int] = {}
+        # time.monotonic() da ingestão da última atualização de cada ativo
+        self.ingest_times: Dict[str, float] = {}
+        # Atraso servidor -> ingestão dos ticks do stream (relógio de parede do servidor)
+        self.feed_latency = LatencyRecorder()
+        self.record_feed_latency = True
+        # Replay: o relógio dos candles é o timestamp do último tick, não o de parede
+        self.replay_mode = False
+        self.feed_time: Optional[float] = None
+        # Chamados a cada atualização com (ativo, preço, preço anterior)
+        self.update_listeners: List[Callable[[str, float, Optional[float]], None]] = []
         # Monitorar todos os ativos listados em constants.ACTIVES por padrão
         try:
             self.selected_assets = list(ACTIVES.keys())
         except Exception:
             self.selected_assets = ["EURUSD", "GBPUSD", "AUDUSD", "USDCAD", "BTCUSD"]
+
+        # Histórico colunar de ticks para todos os ativos
+        self.tick_history = TickHistoryStore(ACTIVES.keys())
+
+        # Candles OHLCV de todos os timeframes, atualizados a cada tick
+        self.candles = CandleAggregator()
+        self.candle_store = CandleStore()
+        self.candles.add_event_handler('candle_closed', self.candle_store.add)
+
+        # Mercado sintético usado enquanto não há feed real (semente em POCKET_SIM_SEED)
+        seed = os.environ.get('POCKET_SIM_SEED')
+        self.synthetic_market = SyntheticMarket(ACTIVES.keys(), seed=int(seed) if seed else None, start_time=time.time())
+
+        # Journal em disco dos ticks (POCKET_JOURNAL_DIR); criado em start_monitoring:
+        # abrir o journal recupera (trunca) o segmento corrente, o que um espelho
+        # do robô não pode fazer com o journal do processo de ingestão
+        self.tick_journal: Optional[TickJournal] = None
+
+        # Cotações em memória compartilhada para outros processos (POCKET_QUOTES_SHM);
+        # criada em start_monitoring para que espelhos do robô não a recriem
+        self.quote_table: Optional[QuoteTableWriter] = None
+
+        # Ingestão push dos ticks recebidos do cliente Socket.IO
+        self.tick_pipeline = TickIngestPipeline(self._store_ticks)
+
+        # Busca em lote (concorrência e prazos em constants.FETCH_SETTINGS)
+        self.fetch_engine = BatchFetchEngine(self._fetch_asset_data, on_result=self._store_market_data)
         
         # GUI components
         self.root = None
@@ -75,8 +129,13 @@ class PocketOptionRobot:
             'total_updates': 0,
             'successful_connections': 0,
             'errors': 0,
-            'last_update': None
+            'last_update': None,
+            'last_cycle_duration': 0.0,
+            'last_cycle_timeouts': 0,
+            'last_cycle_failures': 0
         }
+        # Taxas em janelas deslizantes (1s/10s/1m/5m) e EWMA
+        self.rates = RateCounters(('ticks', 'errors'))
 
     async def initialize(self):
         """Inicializa o robô e suas conexões"""
@@ -99,12 +158,12 @@ class PocketOptionRobot:
                 return True
             else:
                 logger.error("❌ Falha ao inicializar o robô")
-                self.performance_stats['errors'] += 1
+                self._count_error()
                 return False
                 
         except Exception as e:
             logger.error(f"❌ Erro na inicialização: {e}")
-            self.performance_stats['errors'] += 1
+            self._count_error()
             return False
 
     async def start_monitoring(self):
@@ -114,6 +173,20 @@ class PocketOptionRobot:
         
         self.is_running = True
         logger.info("📊 Iniciando monitoramento em tempo real...")
+
+        journal_dir = os.environ.get('POCKET_JOURNAL_DIR')
+        if journal_dir and self.tick_journal is None:
+            self.tick_journal = TickJournal(journal_dir)
+            await self.tick_journal.start()
+
+        quotes_name = os.environ.get('POCKET_QUOTES_SHM')
+        if quotes_name and self.quote_table is None:
+            try:
+                self.quote_table = QuoteTableWriter(quotes_name)
+            except FileExistsError as e:
+                logger.error(f"Tabela de cotações desativada: {e}")
+            else:
+                logger.info(f"Tabela de cotações publicada em memória compartilhada: {quotes_name}")
         
         # Inicia loops de monitoramento
         await asyncio.gather(
@@ -124,6 +197,13 @@ class PocketOptionRobot:
 
     async def _price_monitoring_loop(self):
         """Loop principal de monitoramento de preços"""
+        client = self.monitor.client if self.monitor else None
+        # Só usa o stream se a conexão subiu; sem servidor cai na consulta periódica
+        if client and getattr(client, 'supports_tick_stream', False) and client.is_connected:
+            await self._tick_stream_loop(client)
+            return
+
+        # Cliente sem stream de ticks: consulta periódica
         while self.is_running:
             try:
                 await self._update_market_data()
@@ -131,9 +211,72 @@ class PocketOptionRobot:
                 
             except Exception as e:
                 logger.error(f"Erro no loop de monitoramento: {e}")
-                self.performance_stats['errors'] += 1
+                self._count_error()
                 await asyncio.sleep(5)
 
+    async def _tick_stream_loop(self, client):
+        """Consome os ticks enviados pelo servidor através do pipeline de ingestão"""
+        logger.info("📡 Usando stream de ticks do servidor")
+        # No replay os timestamps são os da gravação: o atraso do servidor não faz sentido
+        self.replay_mode = hasattr(client, 'get_replay_stats')
+        self.record_feed_latency = not self.replay_mode
+        if self.replay_mode:
+            # No replay o produtor espera o pipeline em vez de perder ticks:
+            # a vazão reportada passa a ser a que de fato foi gravada
+            self.tick_pipeline.lossless = True
+            client.add_event_callback('tick', self.tick_pipeline.submit_wait)
+        else:
+            client.add_event_callback('tick', self.tick_pipeline.submit)
+        if hasattr(client, 'subscribe_assets'):
+            # Cliente único precisa assinar os ativos (o sharded assina por conta própria)
+            # e repetir a assinatura quando o Socket.IO reconecta sozinho
+            async def resubscribe(_data=None):
+                await client.subscribe_assets(self.selected_assets)
+
+            client.add_event_callback('reconnected', resubscribe)
+            await resubscribe()
+        await self.tick_pipeline.start()
+        try:
+            while self.is_running:
+                await asyncio.sleep(1)
+        finally:
+            await self.tick_pipeline.stop()
+
+    async def _store_ticks(self, ticks):
+        """Estágio final do pipeline: grava um lote de ticks normalizados"""
+        with tracer.span('store_ticks', 'robot', {'ticks': len(ticks)} if tracer.enabled else None):
+            wall_now = time.time()
+            mono_now = time.monotonic()
+            for tick in ticks:
+                if tick.server_time is not None and tick.received and self.record_feed_latency:
+                    # Relógio de parede na chegada menos o horário do servidor
+                    received_wall = wall_now - (mono_now - tick.received)
+                    self.feed_latency.record(max(0.0, received_wall - tick.server_time))
+                previous = self.market_data.get(tick.asset)
+                change = tick.price - previous.current_price if previous else 0.0
+                change_percent = (change / previous.current_price) * 100 if previous else 0.0
+                trend = 'UP' if change > 0 else 'DOWN' if change < 0 else 'STABLE'
+
+                self.market_data[tick.asset] = MarketData(
+                    asset=tick.asset,
+                    current_price=tick.price,
+                    change=change,
+                    change_percent=change_percent,
+                    volume=tick.volume,
+                    timestamp=datetime.fromtimestamp(tick.timestamp),
+                    trend=trend
+                )
+                self.tick_history.append(tick.asset, tick.price, tick.volume, tick.timestamp)
+                self.candles.on_tick(tick.asset, tick.price, tick.volume, tick.timestamp)
+                if self.feed_time is None or tick.timestamp > self.feed_time:
+                    self.feed_time = tick.timestamp
+                if self.tick_journal:
+                    self.tick_journal.append(tick.asset, tick.price, tick.volume, tick.timestamp)
+                if self.quote_table:
+                    self.quote_table.update_market_data(self.market_data[tick.asset])
+                self._mark_updated(tick.asset, tick.price, previous.current_price if previous else None,
+                                   tick.received or None)
+
     async def _performance_tracking_loop(self):
         """Loop de tracking de performance"""
         start_time = time.time()
@@ -142,6 +285,12 @@ class PocketOptionRobot:
             try:
                 self.performance_stats['uptime'] = time.time() - start_time
                 self.performance_stats['last_update'] = datetime.now()
+
+                # Fecha candles de ativos que pararam de receber ticks (no replay,
+                # pelo relógio da gravação: o de parede fecharia todos a cada segundo)
+                candle_now = self.feed_time if self.replay_mode else time.time()
+                if candle_now is not None:
+                    self.candles.close_stale(candle_now)
                 
                 # Log de performance a cada minuto
                 if int(self.performance_stats['uptime']) % 60 == 0:
@@ -174,54 +323,98 @@ class PocketOptionRobot:
     async def _update_market_data(self):
         """Atualiza dados de mercado para os ativos selecionados"""
         try:
-            for asset in self.selected_assets:
-                if asset in ACTIVES:
-                    # Simula dados de mercado (em produção, viria da API real)
-                    market_data = await self._fetch_asset_data(asset)
-                    if market_data:
-                        self.market_data[asset] = market_data
-                        self.performance_stats['total_updates'] += 1
+            assets = [asset for asset in self.selected_assets if asset in ACTIVES]
+            with tracer.span('update_market_data', 'robot', {'assets': len(assets)} if tracer.enabled else None):
+                # Avança todos os ativos simulados de uma vez
+                with tracer.span('market_step', 'robot'):
+                    now = time.time()
+                    self.synthetic_market.step(dt=max(now - self.synthetic_market.time, 1e-3), timestamp=now)
+                # Resultados são gravados à medida que chegam (on_result)
+                cycle = await self.fetch_engine.fetch_all(assets)
+
+            self.performance_stats['last_cycle_duration'] = cycle.duration
+            self.performance_stats['last_cycle_timeouts'] = len(cycle.timed_out)
+            self.performance_stats['last_cycle_failures'] = len(cycle.failed)
+            if cycle.cycle_deadline_hit:
+                logger.warning(
+                    f"Ciclo de busca excedeu o prazo: {len(cycle.results)}/{len(assets)} ativos em {cycle.duration:.3f}s"
+                )
                         
         except Exception as e:
             logger.error(f"Erro ao atualizar dados de mercado: {e}")
-            self.performance_stats['errors'] += 1
+            self._count_error()
+
+    def _store_market_data(self, asset: str, market_data: MarketData, ingest_time: Optional[float] = None):
+        """Grava o resultado de uma busca no estado atual e no histórico"""
+        with tracer.span('store', 'robot'):
+            timestamp = market_data.timestamp.timestamp()
+            previous = self.market_data.get(asset)
+            self.market_data[asset] = market_data
+            self.tick_history.append(asset, market_data.current_price, market_data.volume, timestamp)
+            self.candles.on_tick(asset, market_data.current_price, market_data.volume, timestamp)
+            if self.tick_journal:
+                self.tick_journal.append(asset, market_data.current_price, market_data.volume, timestamp)
+            if self.quote_table:
+                self.quote_table.update_market_data(market_data)
+            self._mark_updated(asset, market_data.current_price, previous.current_price if previous else None,
+                               ingest_time)
+
+    def ingest_market_data(self, market_data: MarketData, ingest_time: Optional[float] = None):
+        """Grava um MarketData recebido de outra fonte (ex.: market_bus).
+
+        ``ingest_time`` é o time.monotonic() da ingestão original, quando a
+        fonte é outro processo na mesma máquina (relógio compartilhado).
+        """
+        self._store_market_data(market_data.asset, market_data, ingest_time)
+
+    def _count_error(self):
+        self.performance_stats['errors'] += 1
+        self.rates.add('errors')
+
+    def add_update_listener(self, listener: Callable[[str, float, Optional[float]], None]):
+        """Registra callback síncrono chamado a cada atualização de preço"""
+        self.update_listeners.append(listener)
+
+    def _mark_updated(self, asset: str, price: float, previous_price: Optional[float],
+                      ingest_time: Optional[float] = None):
+        """Registra a nova versão do ativo para o envio incremental"""
+        self.market_seq += 1
+        self.symbol_versions[asset] = self.market_seq
+        self.ingest_times[asset] = ingest_time or time.monotonic()
+        self.performance_stats['total_updates'] += 1
+        self.rates.add('ticks')
+        for listener in self.update_listeners:
+            try:
+                listener(asset, price, previous_price)
+            except Exception as e:
+                logger.error(f"Erro no listener de atualização: {e}")
 
     async def _fetch_asset_data(self, asset: str) -> Optional[MarketData]:
         """Busca dados de um ativo específico"""
-        try:
-            # Aqui seria integrado com a API real da Pocket Option
-            # Por enquanto, simula dados realísticos
-            import random
-            
-            base_price = {
-                'EURUSD': 1.0950,
-                'GBPUSD': 1.2650,
-                'AUDUSD': 0.6750,
-                'USDCAD': 1.3450,
-                'BTCUSD': 43500.0
-            }.get(asset, 1.0000)
-            
-            # Simula variação de preço
-            change = random.uniform(-0.01, 0.01)
-            current_price = base_price + change
-            change_percent = (change / base_price) * 100
-            
-            # Determina tendência
-            trend = 'UP' if change > 0.005 else 'DOWN' if change < -0.005 else 'STABLE'
+        with tracer.span('fetch_asset', 'robot', {'asset': asset} if tracer.enabled else None):
+            try:
+                # Aqui seria integrado com a API real da Pocket Option
+                # Por enquanto, lê o último passo do mercado sintético
+                current_price, change, last_return, volume = self.synthetic_market.quote(asset)
+                change_percent = (change / (current_price - change)) * 100
+
+                # Tendência pelo último movimento (STABLE se menor que 1/4 do desvio esperado)
+                threshold = 0.25 * self.synthetic_market.step_sigma(asset)
+                trend = 'UP' if last_return > threshold else 'DOWN' if last_return < -threshold else 'STABLE'
             
-            return MarketData(
-                asset=asset,
-                current_price=current_price,
-                change=change,
-                change_percent=change_percent,
-                volume=random.randint(1000, 10000),
-                timestamp=datetime.now(),
-                trend=trend
-            )
+                return MarketData(
+                    asset=asset,
+                    current_price=current_price,
+                    change=change,
+                    change_percent=change_percent,
+                    volume=volume,
+                    timestamp=datetime.fromtimestamp(self.synthetic_market.time),
+                    trend=trend
+                )
             
-        except Exception as e:
-            logger.error(f"Erro ao buscar dados do ativo {asset}: {e}")
-            return None
+            except Exception as e:
+                logger.error(f"Erro ao buscar dados do ativo {asset}: {e}")
+                return None
 
     async def _log_performance(self):
         """Registra estatísticas de performance"""
@@ -254,10 +447,36 @@ class PocketOptionRobot:
         return {
             'uptime_minutes': round(uptime_minutes, 2),
             'total_updates': self.performance_stats['total_updates'],
-            'updates_per_minute': round(self.performance_stats['total_updates'] / max(uptime_minutes, 1), 2),
+            'updates_per_minute': round(self.rates.rate('ticks', '1m') * 60, 2),
             'successful_connections': self.performance_stats['successful_connections'],
             'errors': self.performance_stats['errors'],
-            'error_rate': round(self.performance_stats['errors'] / max(self.performance_stats['total_updates'], 1) * 100, 2)
+            'last_cycle_duration_ms': round(self.performance_stats['last_cycle_duration'] * 1000, 2),
+            'last_cycle_timeouts': self.performance_stats['last_cycle_timeouts'],
+            'last_cycle_failures': self.performance_stats['last_cycle_failures'],
+            'error_rate': round(self.performance_stats['errors'] / max(self.performance_stats['total_updates'], 1) * 100, 2),
+            'ingest_queue_depths': self.tick_pipeline.queue_depths(),
+            'latency_ms': {
+                **(self.monitor.get_latency_summary() if self.monitor else {}),
+                'upstream_to_ingest': round_snapshot(self.feed_latency.snapshot()),
+            },
+            'rates': {**self.rates.snapshot(), **(self.monitor.rates.snapshot() if self.monitor else {})},
+            **self._replay_summary()
+        }
+
+    def _replay_summary(self) -> Dict[str, Any]:
+        """Vazão do replay quando o cliente reproduz ticks gravados"""
+        client = self.monitor.client if self.monitor else None
+        if not client or not hasattr(client, 'get_replay_stats'):
+            return {}
+        stats = client.get_replay_stats()
+        pipeline = self.tick_pipeline.stats
+        return {
+            'replay_ticks': stats['ticks'],
+            'replay_stored': pipeline['stored'],
+            'replay_dropped': pipeline['dropped'],
+            'replay_ticks_per_second': round(stats['ticks_per_second'], 1),
+            'replay_max_lag_ms': round(stats['max_lag'] * 1000, 2),
+            'replay_finished': stats['finished']
         }
 
     async def stop_monitoring(self):
@@ -267,6 +486,14 @@ class PocketOptionRobot:
         
         if self.monitor:
             await self.monitor.stop_monitoring()
+
+        if self.tick_journal:
+            await self.tick_journal.close()
+            self.tick_journal = None
+
+        if self.quote_table:
+            self.quote_table.close()
+            self.quote_table = None
         
         logger.info("✅ Monitoramento parado com sucesso")
 
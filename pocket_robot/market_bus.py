@@ -0,0 +1,302 @@
+"""
+Barramento local de mercado (pub/sub sobre Unix socket)
+Um processo de ingestão publica as atualizações do robô e N workers da
+webapi as recebem e reconstroem o estado de mercado localmente, cada um
+atendendo os seus próprios clientes Socket.IO
+
+Protocolo: frames <I> (tamanho do corpo) + corpo JSON
+
+    {"t": "ticks", "d": [[ativo, preço, variação, variação %, volume, timestamp, tendência, ingestão], ...]}
+    {"t": "perf",  "d": {...}}   resumo de performance do robô (1x por segundo)
+
+Ao conectar, o assinante recebe um frame 'ticks' com o estado atual de
+todos os ativos. Atualizações de um mesmo ativo dentro de um lote são
+coalescidas (só o último valor é enviado). 'ingestão' é o time.monotonic()
+em que o tick chegou ao processo de ingestão; como o relógio monotônico é
+do sistema, os workers medem a latência ingestão -> cliente a partir dele.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+FRAME_LENGTH = struct.Struct('<I')
+
+DEFAULT_BUS_PATH = '/tmp/pocket_robot_bus.sock'
+# Intervalo mínimo entre lotes publicados (s)
+DEFAULT_BATCH_INTERVAL = 0.01
+# Intervalo do resumo de performance (s)
+PERF_INTERVAL = 1.0
+# Bytes pendentes no socket de um assinante antes de desconectá-lo
+# (ele reconecta e recebe o estado completo)
+MAX_SUBSCRIBER_BUFFER = 8 * 1024 * 1024
+# Maior frame aceito pelo assinante
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def bus_path() -> str:
+    """Caminho do socket do barramento (POCKET_BUS_PATH)"""
+    return os.environ.get('POCKET_BUS_PATH') or DEFAULT_BUS_PATH
+
+
+def encode_message(kind: str, data: Any) -> bytes:
+    body = json.dumps({'t': kind, 'd': data}, separators=(',', ':')).encode('utf-8')
+    return FRAME_LENGTH.pack(len(body)) + body
+
+
+def market_data_row(market_data, ingest_time: float = 0.0) -> list:
+    """MarketData -> linha do frame 'ticks'"""
+    return [
+        market_data.asset, market_data.current_price, market_data.change,
+        market_data.change_percent, market_data.volume,
+        market_data.timestamp.timestamp(), market_data.trend, ingest_time,
+    ]
+
+
+class MarketBusPublisher:
+    """Publica as atualizações de um PocketOptionRobot para os workers.
+
+    O listener registrado no robô apenas marca o ativo como pendente; a
+    serialização acontece uma vez por lote e os mesmos bytes são escritos
+    em todos os assinantes.
+    """
+
+    def __init__(self, robot, path: Optional[str] = None, batch_interval: float = DEFAULT_BATCH_INTERVAL):
+        self.robot = robot
+        self.path = path or bus_path()
+        self.batch_interval = batch_interval
+
+        self._subscribers: Set[asyncio.StreamWriter] = set()
+        self._pending: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {'batches': 0, 'ticks': 0, 'bytes': 0, 'subscribers': 0, 'dropped_subscribers': 0}
+
+        robot.add_update_listener(self._on_update)
+
+    def _on_update(self, asset: str, price: float, previous_price: Optional[float]):
+        self._pending.add(asset)
+        if self._wakeup is not None and len(self._pending) == 1:
+            self._wakeup.set()
+
+    async def start(self):
+        """Abre o socket do barramento e inicia a publicação"""
+        if self._server is not None:
+            return
+        # Remove o socket deixado por uma execução anterior
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._wakeup = asyncio.Event()
+        self._server = await asyncio.start_unix_server(self._on_subscriber, path=self.path)
+        self._task = asyncio.create_task(self._publish_loop())
+        logger.info(f"Barramento de mercado publicando em {self.path}")
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in list(self._subscribers):
+            writer.close()
+        self._subscribers.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _on_subscriber(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        ingest_times = self.robot.ingest_times
+        rows = [market_data_row(md, ingest_times.get(md.asset, 0.0)) for md in list(self.robot.market_data.values())]
+        writer.write(encode_message('ticks', rows))
+        self._subscribers.add(writer)
+        self.stats['subscribers'] = len(self._subscribers)
+        logger.info(f"Worker conectado ao barramento ({len(self._subscribers)} assinantes)")
+        try:
+            # Assinantes não enviam dados; a leitura só detecta o fechamento
+            while await reader.read(1024):
+                pass
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._remove(writer)
+
+    def _remove(self, writer: asyncio.StreamWriter):
+        if writer in self._subscribers:
+            self._subscribers.discard(writer)
+            writer.close()
+            self.stats['subscribers'] = len(self._subscribers)
+
+    def _broadcast(self, message: bytes):
+        for writer in list(self._subscribers):
+            if writer.is_closing():
+                self._remove(writer)
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                logger.warning("Worker não acompanha o barramento; desconectando")
+                self.stats['dropped_subscribers'] += 1
+                self._remove(writer)
+                continue
+            writer.write(message)
+        self.stats['bytes'] += len(message)
+
+    async def _publish_loop(self):
+        last_perf = 0.0
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), PERF_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if self._pending:
+                pending, self._pending = self._pending, set()
+                market_data = self.robot.market_data
+                ingest_times = self.robot.ingest_times
+                rows = [market_data_row(market_data[asset], ingest_times.get(asset, 0.0))
+                        for asset in pending if asset in market_data]
+                if rows and self._subscribers:
+                    self._broadcast(encode_message('ticks', rows))
+                self.stats['batches'] += 1
+                self.stats['ticks'] += len(rows)
+
+            now = time.monotonic()
+            if now - last_perf >= PERF_INTERVAL and self._subscribers:
+                last_perf = now
+                try:
+                    self._broadcast(encode_message('perf', self.robot.get_performance_summary()))
+                except Exception as e:
+                    logger.debug(f"Falha ao publicar resumo de performance: {e}")
+
+            # Agrupa as atualizações que chegarem no intervalo
+            await asyncio.sleep(self.batch_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+class MarketBusSubscriber:
+    """Recebe as atualizações do barramento e as grava em um robô local.
+
+    O robô local não se conecta à corretora; ele só mantém market_data,
+    versões, histórico e candles para o broadcaster e a API do worker.
+    Reconecta automaticamente se o processo de ingestão reiniciar.
+    """
+
+    def __init__(self, robot, path: Optional[str] = None, reconnect_delay: float = 1.0):
+        self.robot = robot
+        self.path = path or bus_path()
+        self.reconnect_delay = reconnect_delay
+
+        self.connected = False
+        self.remote_summary: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {'frames': 0, 'ticks': 0, 'connects': 0, 'errors': 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.connected = False
+
+    async def _run(self):
+        from main import MarketData
+
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self.connected = True
+                self.stats['connects'] += 1
+                logger.info(f"Conectado ao barramento de mercado em {self.path}")
+                while True:
+                    header = await reader.readexactly(FRAME_LENGTH.size)
+                    (length,) = FRAME_LENGTH.unpack(header)
+                    if length > MAX_FRAME_SIZE:
+                        raise ValueError(f"frame de {length} bytes excede o limite")
+                    message = json.loads(await reader.readexactly(length))
+                    self.stats['frames'] += 1
+                    self._apply(message, MarketData)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError):
+                if self.connected:
+                    logger.warning("Conexão com o barramento de mercado perdida")
+            except Exception as e:
+                logger.error(f"Erro no barramento de mercado: {e}")
+                self.stats['errors'] += 1
+            finally:
+                self.connected = False
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _apply(self, message: Dict[str, Any], market_data_cls):
+        kind = message.get('t')
+        if kind == 'ticks':
+            rows: List[list] = message['d']
+            for row in rows:
+                asset, price, change, change_percent, volume, timestamp, trend = row[:7]
+                self.robot.ingest_market_data(market_data_cls(
+                    asset=asset,
+                    current_price=price,
+                    change=change,
+                    change_percent=change_percent,
+                    volume=volume,
+                    timestamp=datetime.fromtimestamp(timestamp),
+                    trend=trend,
+                ), row[7] if len(row) > 7 else None)
+            self.stats['ticks'] += len(rows)
+        elif kind == 'perf':
+            self.remote_summary = message['d']
+            # O worker não roda o loop de performance do robô
+            self.robot.candles.close_stale(time.time())
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['connected'] = self.connected
+        return stats
+
+
+async def run_ingest():
+    """Processo de ingestão sem webapi: robô + publicação no barramento"""
+    from main import PocketOptionRobot
+
+    robot = PocketOptionRobot()
+    ssid = os.environ.get('POCKET_SSID')
+    if ssid:
+        robot.ssid = ssid
+    publisher = MarketBusPublisher(robot)
+    await publisher.start()
+    try:
+        await robot.start_monitoring()
+    finally:
+        await robot.stop_monitoring()
+        await publisher.close()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(run_ingest())
+    except KeyboardInterrupt:
+        pass
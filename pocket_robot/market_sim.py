@@ -0,0 +1,207 @@
+"""
+Gerador sintético de mercado (vetorizado)
+Movimento browniano geométrico por ativo para todos os ativos de
+constants.ACTIVES, com semente para reprodutibilidade
+"""
+
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from constants import ACTIVES
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+# Valor aproximado de 1 unidade de cada moeda/cripto em USD
+USD_RATES = {
+    'USD': 1.0, 'EUR': 1.095, 'GBP': 1.265, 'AUD': 0.675, 'NZD': 0.61,
+    'CAD': 1 / 1.345, 'CHF': 1 / 0.88, 'JPY': 1 / 149.5, 'CNY': 1 / 7.2, 'CNH': 1 / 7.22,
+    'HKD': 1 / 7.82, 'SGD': 1 / 1.34, 'NOK': 1 / 10.6, 'HUF': 1 / 355.0, 'TRY': 1 / 30.5,
+    'RUB': 1 / 92.0, 'ZAR': 1 / 18.6, 'MXN': 1 / 17.1, 'BRL': 1 / 4.95, 'ARS': 1 / 810.0,
+    'CLP': 1 / 880.0, 'COP': 1 / 3950.0, 'INR': 1 / 83.2, 'IDR': 1 / 15600.0, 'MYR': 1 / 4.7,
+    'PHP': 1 / 55.8, 'PKR': 1 / 280.0, 'THB': 1 / 35.5, 'VND': 1 / 24300.0, 'BDT': 1 / 110.0,
+    'EGP': 1 / 30.9, 'DZD': 1 / 134.5, 'MAD': 1 / 10.1, 'TND': 1 / 3.1, 'NGN': 1 / 900.0,
+    'KES': 1 / 156.0, 'UAH': 1 / 37.5, 'AED': 1 / 3.6725, 'SAR': 1 / 3.75, 'QAR': 1 / 3.64,
+    'OMR': 1 / 0.385, 'BHD': 1 / 0.376, 'JOD': 1 / 0.709, 'LBP': 1 / 15000.0, 'SYP': 1 / 13000.0,
+    'YER': 1 / 250.0, 'IRR': 1 / 42000.0,
+    # Criptomoedas
+    'BTC': 43500.0, 'ETH': 2300.0, 'BCH': 230.0, 'LTC': 70.0, 'DOT': 7.0, 'LNK': 14.5,
+    'DASH': 30.0, 'ADA': 0.55, 'BNB': 310.0, 'SOL': 95.0, 'TON': 2.3, 'TRX': 0.105,
+}
+
+# Preços de referência dos ativos que não são pares de moedas
+REFERENCE_PRICES = {
+    # Commodities
+    'UKBrent': 78.0, 'USCrude': 73.0, 'XAGEUR': 21.0, 'XAGUSD': 23.0, 'XAUEUR': 1870.0,
+    'XAUUSD': 2050.0, 'XNGUSD': 2.6, 'XPDUSD': 1000.0, 'XPTUSD': 930.0,
+    # Cripto (sem par explícito)
+    'AVAX': 35.0, 'BITB': 25.0, 'DOGE': 0.085, 'LINK': 14.5, 'MATIC': 0.8,
+    # Índices
+    '100GBP': 7600.0, 'AEX25': 790.0, 'AUS200': 7500.0, 'CAC40': 7500.0, 'D30EUR': 16700.0,
+    'DJI30': 37500.0, 'E35EUR': 10100.0, 'E50EUR': 4500.0, 'F40EUR': 7500.0, 'H33HKD': 16500.0,
+    'JPN225': 33500.0, 'NASUSD': 16800.0, 'SMI20': 11200.0, 'SP500': 4750.0, 'VIX': 13.5,
+    # Ações
+    'AAPL': 190.0, 'AXP': 185.0, 'BA': 250.0, 'CSCO': 50.0, 'FB': 350.0, 'INTC': 46.0,
+    'JNJ': 158.0, 'JPM': 170.0, 'MCD': 295.0, 'MSFT': 375.0, 'PFE': 29.0, 'TSLA': 245.0,
+    'XOM': 100.0, 'AMD': 140.0, 'AMZN': 150.0, 'BABA': 75.0, 'CITI': 51.0, 'COIN': 150.0,
+    'FDX': 250.0, 'GME': 17.0, 'MARA': 18.0, 'NFLX': 485.0, 'PLTR': 17.0, 'VISA': 260.0,
+}
+
+# Volatilidade anualizada por categoria
+VOLATILITY = {
+    'fx_major': 0.08,
+    'fx_exotic': 0.15,
+    'crypto': 0.65,
+    'commodity': 0.28,
+    'index': 0.18,
+    'stock': 0.32,
+}
+
+FX_MAJORS = {'USD', 'EUR', 'GBP', 'AUD', 'NZD', 'CAD', 'CHF', 'JPY'}
+CRYPTO_CODES = {'BTC', 'ETH', 'BCH', 'LTC', 'DOT', 'LNK', 'DASH', 'ADA', 'BNB', 'SOL', 'TON', 'TRX',
+                'AVAX', 'BITB', 'DOGE', 'LINK', 'MATIC'}
+COMMODITIES = {'UKBrent', 'USCrude', 'XAGEUR', 'XAGUSD', 'XAUEUR', 'XAUUSD', 'XNGUSD', 'XPDUSD', 'XPTUSD'}
+INDICES = {'100GBP', 'AEX25', 'AUS200', 'CAC40', 'D30EUR', 'DJI30', 'E35EUR', 'E50EUR', 'F40EUR',
+           'H33HKD', 'JPN225', 'NASUSD', 'SMI20', 'SP500', 'VIX'}
+
+# Preço e volatilidade para ativos desconhecidos
+DEFAULT_PRICE = 1.0
+DEFAULT_VOLATILITY = 0.2
+
+
+def _root_symbol(symbol: str) -> str:
+    """Remove prefixo '#' e sufixo '_otc' do símbolo"""
+    root = symbol.lstrip('#')
+    if root.endswith('_otc'):
+        root = root[:-4]
+    return root
+
+
+def _split_pair(root: str) -> Optional[Tuple[str, str]]:
+    """Separa 'EURUSD', 'ADA-USD' ou 'DASH_USD' em (base, cotação) se forem moedas conhecidas"""
+    for separator in ('-', '_'):
+        if separator in root:
+            base, quote = root.split(separator, 1)
+            if base in USD_RATES and quote in USD_RATES:
+                return base, quote
+            return None
+    if len(root) == 6 and root[:3] in USD_RATES and root[3:] in USD_RATES:
+        return root[:3], root[3:]
+    return None
+
+
+def reference_quote(symbol: str) -> Tuple[float, float]:
+    """Retorna (preço de referência, volatilidade anual) de um ativo"""
+    root = _root_symbol(symbol)
+    pair = _split_pair(root)
+    if pair:
+        base, quote = pair
+        price = USD_RATES[base] / USD_RATES[quote]
+        if base in CRYPTO_CODES or quote in CRYPTO_CODES:
+            return price, VOLATILITY['crypto']
+        if base in FX_MAJORS and quote in FX_MAJORS:
+            return price, VOLATILITY['fx_major']
+        return price, VOLATILITY['fx_exotic']
+
+    if root in REFERENCE_PRICES:
+        if root in CRYPTO_CODES:
+            category = 'crypto'
+        elif root in COMMODITIES:
+            category = 'commodity'
+        elif root in INDICES:
+            category = 'index'
+        else:
+            category = 'stock'
+        return REFERENCE_PRICES[root], VOLATILITY[category]
+
+    return DEFAULT_PRICE, DEFAULT_VOLATILITY
+
+
+class MarketStep(NamedTuple):
+    """Resultado de um passo da simulação (arrays indexados como ``symbols``)"""
+    prices: np.ndarray
+    changes: np.ndarray
+    returns: np.ndarray
+    volumes: np.ndarray
+    timestamp: float
+
+
+class SyntheticMarket:
+    """Simula todos os ativos de uma vez com GBM: S *= exp((mu - σ²/2)dt + σ√dt Z).
+
+    Todos os ativos avançam juntos em uma única operação NumPy; ``simulate``
+    gera vários passos de uma vez para benchmarks e testes de carga.
+    """
+
+    def __init__(
+        self,
+        symbols: Optional[Iterable[str]] = None,
+        seed: Optional[int] = None,
+        drift: float = 0.0,
+        start_time: float = 0.0,
+    ):
+        self.symbols = list(symbols) if symbols is not None else list(ACTIVES.keys())
+        self.asset_index: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.rng = np.random.default_rng(seed)
+        self.drift = drift
+
+        reference = [reference_quote(symbol) for symbol in self.symbols]
+        self.open_prices = np.array([price for price, _ in reference], dtype=np.float64)
+        self.volatility = np.array([vol for _, vol in reference], dtype=np.float64)
+
+        self.prices = self.open_prices.copy()
+        self.time = start_time
+        self.last_step: Optional[MarketStep] = None
+
+    def _log_returns(self, dt: float, size) -> np.ndarray:
+        dt_years = dt / SECONDS_PER_YEAR
+        drift = (self.drift - 0.5 * self.volatility ** 2) * dt_years
+        shock = self.volatility * np.sqrt(dt_years) * self.rng.standard_normal(size)
+        return drift + shock
+
+    def _volumes(self, size) -> np.ndarray:
+        return self.rng.integers(1000, 10000, size=size)
+
+    def step(self, dt: float = 1.0, timestamp: Optional[float] = None) -> MarketStep:
+        """Avança todos os ativos em ``dt`` segundos"""
+        returns = self._log_returns(dt, len(self.symbols))
+        previous = self.prices
+        self.prices = previous * np.exp(returns)
+        self.time = timestamp if timestamp is not None else self.time + dt
+
+        self.last_step = MarketStep(
+            prices=self.prices,
+            changes=self.prices - previous,
+            returns=returns,
+            volumes=self._volumes(len(self.symbols)),
+            timestamp=self.time,
+        )
+        return self.last_step
+
+    def simulate(self, n_steps: int, dt: float = 1.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Gera ``n_steps`` passos de uma vez.
+
+        Retorna (timestamps[n], preços[n, ativos], volumes[n, ativos]) e deixa
+        o estado no último passo.
+        """
+        returns = self._log_returns(dt, (n_steps, len(self.symbols)))
+        prices = self.prices * np.exp(np.cumsum(returns, axis=0))
+        timestamps = self.time + dt * np.arange(1, n_steps + 1)
+        volumes = self._volumes((n_steps, len(self.symbols)))
+
+        self.prices = prices[-1].copy()
+        self.time = float(timestamps[-1])
+        return timestamps, prices, volumes
+
+    def quote(self, symbol: str) -> Tuple[float, float, float, int]:
+        """Retorna (preço, variação desde a abertura, retorno do último passo, volume)"""
+        idx = self.asset_index[symbol]
+        step = self.last_step
+        last_return = float(step.returns[idx]) if step is not None else 0.0
+        volume = int(step.volumes[idx]) if step is not None else 0
+        price = float(self.prices[idx])
+        return price, price - float(self.open_prices[idx]), last_return, volume
+
+    def step_sigma(self, symbol: str, dt: float = 1.0) -> float:
+        """Desvio padrão do retorno de um passo de ``dt`` segundos"""
+        return float(self.volatility[self.asset_index[symbol]] * np.sqrt(dt / SECONDS_PER_YEAR))
@@ -0,0 +1,207 @@
+"""
+Exportação de métricas no formato texto do Prometheus (versão 0.0.4)
+Só lê contadores e histogramas já mantidos pelos componentes; nada aqui
+roda no caminho dos ticks
+"""
+
+import math
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from latency import LatencyHistogram, bucket_value
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites 'le' dos histogramas exportados (segundos)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+class MetricsWriter:
+    """Agrupa as amostras por família e gera o texto de exposição"""
+
+    def __init__(self, prefix: str = 'pocket_'):
+        self.prefix = prefix
+        self._families: 'OrderedDict[str, Tuple[str, str, List[str]]]' = OrderedDict()
+
+    def _family(self, name: str, kind: str, help_text: str) -> List[str]:
+        name = self.prefix + name
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, [])
+        return family[2]
+
+    def counter(self, name: str, help_text: str, value, labels: Optional[Dict[str, str]] = None):
+        full = name if name.endswith('_total') else name + '_total'
+        self._family(full, 'counter', help_text).append(
+            f'{self.prefix}{full}{_format_labels(labels)} {_format_value(value)}'
+        )
+
+    def gauge(self, name: str, help_text: str, value, labels: Optional[Dict[str, str]] = None):
+        self._family(name, 'gauge', help_text).append(
+            f'{self.prefix}{name}{_format_labels(labels)} {_format_value(value)}'
+        )
+
+    def histogram(self, name: str, help_text: str, histogram: LatencyHistogram,
+                  labels: Optional[Dict[str, str]] = None, bounds: Iterable[float] = LATENCY_BUCKETS):
+        """Exporta um LatencyHistogram com limites 'le' fixos (valores em segundos)"""
+        lines = self._family(name, 'histogram', help_text)
+        labels = dict(labels or {})
+        bounds = list(bounds)
+        cumulative = [0] * len(bounds)
+        for i, count in enumerate(histogram.counts):
+            if not count:
+                continue
+            value = bucket_value(i)
+            for b, bound in enumerate(bounds):
+                if value <= bound:
+                    cumulative[b] += count
+                    break
+        running = 0
+        for bound, count in zip(bounds, cumulative):
+            running += count
+            lines.append(f'{self.prefix}{name}_bucket{_format_labels({**labels, "le": _format_value(float(bound))})} {running}')
+        lines.append(f'{self.prefix}{name}_bucket{_format_labels({**labels, "le": "+Inf"})} {histogram.count}')
+        lines.append(f'{self.prefix}{name}_sum{_format_labels(labels)} {_format_value(float(histogram.total))}')
+        lines.append(f'{self.prefix}{name}_count{_format_labels(labels)} {histogram.count}')
+
+    def render(self) -> str:
+        out = []
+        for name, (kind, help_text, lines) in self._families.items():
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} {kind}')
+            out.extend(lines)
+        out.append('')
+        return '\n'.join(out)
+
+
+def collect_monitor(writer: MetricsWriter, monitor):
+    """Métricas do ConnectionMonitor"""
+    writer.counter('monitor_messages', 'Messages seen by the connection monitor', monitor.total_messages)
+    writer.counter('monitor_errors', 'Errors recorded by the connection monitor', monitor.total_errors)
+    writer.counter('monitor_connection_attempts', 'Upstream connection attempts', monitor.connection_attempts)
+    writer.counter('monitor_successful_connections', 'Successful upstream connections', monitor.successful_connections)
+    reconnects = monitor.rates.counters.get('reconnects')
+    writer.counter('monitor_reconnects', 'Upstream reconnects', reconnects.total if reconnects else 0)
+    for outcome, count in list(monitor.connect_attempt_outcomes.items()):
+        writer.counter('monitor_connect_attempts', 'Region attempts of the connect race by outcome', count,
+                       {'outcome': outcome})
+    for index, shard in sorted(monitor.shards.items()):
+        labels = {'shard': str(index)}
+        writer.gauge('monitor_shard_connected', 'Whether the upstream shard is connected', bool(shard.get('connected')), labels)
+        writer.gauge('monitor_shard_stalled', 'Whether the upstream shard stopped receiving ticks', bool(shard.get('stalled')), labels)
+        writer.gauge('monitor_shard_assets', 'Assets assigned to the upstream shard', shard.get('assets', 0), labels)
+        writer.counter('monitor_shard_ticks', 'Ticks received by the upstream shard', shard.get('ticks', 0), labels)
+        writer.counter('monitor_shard_disconnects', 'Disconnects of the upstream shard', shard.get('disconnects', 0), labels)
+    for message_type, count in list(monitor.message_stats.items()):
+        writer.counter('monitor_messages_by_type', 'Messages by type', count, {'type': message_type})
+    writer.gauge('monitor_connected', 'Whether the upstream client is connected',
+                 bool(monitor.client and monitor.client.is_connected))
+
+    if monitor.performance_snapshots:
+        latest = monitor.performance_snapshots[-1]
+        writer.gauge('process_memory_bytes', 'Resident memory at the last monitor snapshot',
+                     int(latest.memory_usage_mb * 1024 * 1024))
+        writer.gauge('process_cpu_percent', 'CPU usage at the last monitor snapshot', float(latest.cpu_percent))
+
+    for operation, recorder in list(monitor.latency.items()):
+        writer.histogram('latency_seconds', 'Latency of monitored operations', recorder.lifetime, {'op': operation})
+
+
+def collect_robot(writer: MetricsWriter, robot):
+    """Métricas do PocketOptionRobot"""
+    stats = robot.performance_stats
+    writer.gauge('robot_running', 'Whether the robot is monitoring', bool(robot.is_running))
+    writer.gauge('robot_uptime_seconds', 'Robot monitoring uptime', float(stats['uptime']))
+    writer.counter('robot_updates', 'Market updates stored', stats['total_updates'])
+    writer.counter('robot_errors', 'Robot errors', stats['errors'])
+    writer.gauge('robot_market_seq', 'Market sequence number', robot.market_seq)
+    writer.gauge('robot_assets', 'Assets with a current quote', len(robot.market_data))
+    writer.gauge('robot_fetch_cycle_seconds', 'Duration of the last fetch cycle', float(stats['last_cycle_duration']))
+
+    pipeline = robot.tick_pipeline.stats
+    for key in ('received', 'dropped', 'invalid', 'stored'):
+        writer.counter('ingest_ticks', 'Ticks through the ingest pipeline by outcome', pipeline[key], {'outcome': key})
+    for stage, depth in robot.tick_pipeline.queue_depths().items():
+        writer.gauge('ingest_queue_depth', 'Items waiting per ingest stage', depth, {'stage': stage})
+
+    for asset, count in robot.tick_history.total_counts().items():
+        if count:
+            writer.counter('robot_asset_ticks', 'Ticks stored per asset', count, {'asset': asset})
+
+    if robot.monitor:
+        collect_monitor(writer, robot.monitor)
+
+
+def collect_broadcast(writer: MetricsWriter, broadcaster, flow_control, flush_scheduler,
+                      emit_latency=None, emit_rate=None, tick_latency=None):
+    """Métricas do envio de ticks aos clientes"""
+    writer.gauge('broadcast_clients', 'Clients with a subscription', len(broadcaster.index))
+    writer.gauge('broadcast_subscription_groups', 'Distinct subscription sets', len(broadcaster.index.groups))
+    writer.gauge('broadcast_subscribed_symbols', 'Symbols with at least one subscriber',
+                 sum(1 for sids in list(broadcaster.index.subscribers.values()) if sids))
+
+    flow = flow_control.stats
+    writer.counter('broadcast_frames_sent', 'Frames sent to clients', flow['frames_sent'])
+    writer.counter('broadcast_frames_coalesced', 'Frames skipped because the client was behind', flow['frames_coalesced'])
+    writer.counter('broadcast_rate_limited', 'Frames deferred by the RTT-based client interval', flow['rate_limited'])
+    writer.counter('broadcast_clients_dropped', 'Clients disconnected for being too slow', flow['clients_dropped'])
+    writer.gauge('broadcast_clients_behind', 'Clients currently behind',
+                 sum(1 for state in list(flow_control.clients.values()) if state.behind_since is not None))
+
+    flush = flush_scheduler.stats
+    for reason, key in (('urgent', 'urgent_flushes'), ('heartbeat', 'heartbeats')):
+        writer.counter('broadcast_flush_reasons', 'Broadcast flushes by reason', flush[key], {'reason': reason})
+    writer.counter('broadcast_flushes', 'Broadcast cycles', flush['flushes'])
+    writer.counter('broadcast_updates', 'Market updates seen by the flush scheduler', flush['updates'])
+
+    if emit_rate is not None:
+        writer.counter('broadcast_emits', 'Tick frame emits (one per group of clients)', emit_rate.total)
+    if emit_latency is not None:
+        writer.histogram('broadcast_emit_seconds', 'Time spent in each tick frame emit', emit_latency.lifetime)
+    if tick_latency is not None:
+        writer.histogram('tick_ingest_to_emit_seconds', 'Age of each updated symbol when its frame is emitted',
+                         tick_latency.ingest_to_emit.lifetime)
+        writer.histogram('tick_ingest_to_client_seconds', 'Ingest to client receipt, from clients that echo the frame stamp',
+                         tick_latency.ingest_to_client.lifetime)
+        writer.counter('tick_acks', 'Frame stamps echoed by clients', tick_latency.stats['acks'])
+
+
+# Valores do barramento que são nível (podem descer), não contadores
+BUS_GAUGES = {
+    'connected': 'Whether the worker is connected to the market bus',
+    'subscribers': 'Workers connected to the market bus',
+}
+
+
+def collect_bus(writer: MetricsWriter, market_bus, role: str):
+    """Métricas do barramento de mercado (publicador ou assinante)"""
+    for key, value in market_bus.get_stats().items():
+        if not isinstance(value, (int, float)):
+            continue
+        if key in BUS_GAUGES:
+            writer.gauge('bus_' + key, BUS_GAUGES[key], value)
+        else:
+            writer.counter('bus_' + key, 'Market bus counter', value)
+    writer.gauge('bus_role', 'Market bus role of this process', 1, {'role': role})
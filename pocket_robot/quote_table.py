@@ -0,0 +1,317 @@
+"""
+Tabela de cotações em memória compartilhada
+Última cotação de cada ativo de constants.ACTIVES publicada em um bloco
+multiprocessing.shared_memory, lida por outros processos locais sem cópia
+e sem RPC
+
+Layout do bloco (little-endian, offsets em bytes):
+
+    Cabeçalho (64 bytes)  <4sHHIII4xdQ>
+        0   magic          b'PRQT'
+        4   versão         u16 (1)
+        6   tamanho da linha u16 (64)
+        8   linhas         u32
+        12  offset do diretório u32
+        16  offset das linhas   u32
+        20  pid do escritor     u32 (0 = desconhecido)
+        24  criado_em      f64 (epoch s)
+        32  atualizações   u64 (incrementado após cada escrita)
+
+    Diretório  linhas x 32 bytes  <I28s>  id do ativo, símbolo UTF-8 (preenchido com NUL)
+
+    Linhas     linhas x 64 bytes (alinhadas a 64)  <QIIddddb15x>
+        0   seq            u64 (ímpar durante a escrita)
+        8   id do ativo    u32
+        12  volume         u32
+        16  preço          f64
+        24  variação       f64
+        32  variação %     f64
+        40  timestamp      f64 (epoch s; 0 = ainda sem cotação)
+        48  tendência      i8  (1 = UP, -1 = DOWN, 0 = STABLE)
+
+A linha de um ativo é a sua posição em ACTIVES ordenado por id e não muda
+durante a vida do bloco; o diretório permite montar o mapa símbolo -> linha.
+
+Leitura (seqlock): ler seq; se ímpar, tentar de novo; copiar os campos;
+ler seq outra vez e aceitar a cópia somente se não mudou. Leitores em
+outras linguagens devem usar loads com semântica acquire para o seq.
+"""
+
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from constants import ACTIVES
+
+QUOTE_TABLE_MAGIC = b'PRQT'
+QUOTE_TABLE_VERSION = 1
+DEFAULT_TABLE_NAME = 'pocket_robot_quotes'
+
+HEADER_STRUCT = struct.Struct('<4sHHIII4xdQ')
+HEADER_SIZE = 64
+UPDATES_OFFSET = 32
+UPDATES_STRUCT = struct.Struct('<Q')
+# O pid ocupa o preenchimento do cabeçalho: leitores antigos o ignoram
+PID_OFFSET = 20
+PID_STRUCT = struct.Struct('<I')
+DIRECTORY_ENTRY_STRUCT = struct.Struct('<I28s')
+ROW_STRUCT = struct.Struct('<QIIddddb15x')
+ROW_SIZE = ROW_STRUCT.size
+SEQ_STRUCT = struct.Struct('<Q')
+# Campos da linha após o seq
+FIELDS_STRUCT = struct.Struct('<IIddddb')
+
+TREND_CODES = {'UP': 1, 'DOWN': -1, 'STABLE': 0}
+TREND_NAMES = {code: name for name, code in TREND_CODES.items()}
+
+# Tentativas de leitura antes de desistir de uma linha em escrita contínua
+MAX_READ_RETRIES = 10000
+
+
+class Quote(NamedTuple):
+    asset: str
+    price: float
+    change: float
+    change_percent: float
+    volume: int
+    timestamp: float
+    trend: str
+
+
+def _align(value: int, alignment: int = 64) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+def table_size(n_rows: int) -> int:
+    directory_end = HEADER_SIZE + n_rows * DIRECTORY_ENTRY_STRUCT.size
+    return _align(directory_end) + n_rows * ROW_SIZE
+
+
+# Blocos criados por escritores deste processo (o registro no
+# resource_tracker pertence ao escritor)
+_created_here = set()
+
+
+def _writer_alive(pid: int) -> bool:
+    """Se o processo escritor ainda existe (na dúvida, considera vivo)"""
+    if not pid or os.name == 'nt':
+        # Sem pid não dá para confirmar; no Windows o bloco some junto com o
+        # último handle, então um bloco existente tem dono vivo
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # PermissionError: existe, mas é de outro usuário
+        return True
+    return True
+
+
+def _reclaim_stale(name: str):
+    """Remove o bloco de um escritor que morreu sem removê-lo.
+
+    Só remove quando o cabeçalho confirma que é uma tabela de cotações e
+    que o pid gravado não existe mais; caso contrário levanta
+    FileExistsError (outro robô em execução usa o mesmo nome).
+    """
+    existing = shared_memory.SharedMemory(name=name)
+    try:
+        magic = HEADER_STRUCT.unpack_from(existing.buf, 0)[0] if existing.size >= HEADER_SIZE else b''
+        pid = PID_STRUCT.unpack_from(existing.buf, PID_OFFSET)[0] if magic == QUOTE_TABLE_MAGIC else 0
+        in_use = magic != QUOTE_TABLE_MAGIC or name in _created_here or _writer_alive(pid)
+    finally:
+        existing.close()
+    if in_use:
+        _untrack(existing)
+        raise FileExistsError(f"tabela de cotações '{name}' em uso (pid do escritor: {pid or 'desconhecido'})")
+    existing.unlink()
+
+
+def _untrack(shm: shared_memory.SharedMemory):
+    """Impede que o resource_tracker remova o bloco quando um leitor termina"""
+    if shm.name in _created_here:
+        return
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+class QuoteTableWriter:
+    """Escritor único da tabela (o processo do robô)"""
+
+    def __init__(self, name: str = DEFAULT_TABLE_NAME, symbols: Optional[Dict[str, int]] = None):
+        assets = sorted((symbols if symbols is not None else ACTIVES).items(), key=lambda item: item[1])
+        self.symbols = [symbol for symbol, _ in assets]
+        self.asset_ids = [asset_id for _, asset_id in assets]
+        self.row_of: Dict[str, int] = {symbol: row for row, symbol in enumerate(self.symbols)}
+
+        n_rows = len(assets)
+        self.directory_offset = HEADER_SIZE
+        self.rows_offset = _align(HEADER_SIZE + n_rows * DIRECTORY_ENTRY_STRUCT.size)
+
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=table_size(n_rows))
+        except FileExistsError:
+            # Bloco de uma execução anterior que não foi removido
+            _reclaim_stale(name)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=table_size(n_rows))
+        self.name = self.shm.name
+        _created_here.add(self.name)
+        self._buf = self.shm.buf
+        self._seqs = [0] * n_rows
+        self._updates = 0
+
+        for row, (symbol, asset_id) in enumerate(assets):
+            DIRECTORY_ENTRY_STRUCT.pack_into(
+                self._buf, self.directory_offset + row * DIRECTORY_ENTRY_STRUCT.size,
+                asset_id, symbol.encode('utf-8')[:28],
+            )
+            ROW_STRUCT.pack_into(self._buf, self.rows_offset + row * ROW_SIZE, 0, asset_id, 0, 0.0, 0.0, 0.0, 0.0, 0)
+        # Cabeçalho por último: leitores só aceitam o bloco com magic válido
+        HEADER_STRUCT.pack_into(
+            self._buf, 0, QUOTE_TABLE_MAGIC, QUOTE_TABLE_VERSION, ROW_SIZE, n_rows,
+            self.directory_offset, self.rows_offset, time.time(), 0,
+        )
+        # Depois do cabeçalho (que zera o preenchimento); pid 0 conta como vivo
+        PID_STRUCT.pack_into(self._buf, PID_OFFSET, os.getpid())
+
+    def update(self, asset: str, price: float, change: float, change_percent: float,
+               volume: int, timestamp: float, trend: str = 'STABLE') -> bool:
+        """Publica a cotação de um ativo (retorna False se o ativo não tem linha)"""
+        row = self.row_of.get(asset)
+        if row is None:
+            return False
+        offset = self.rows_offset + row * ROW_SIZE
+        seq = self._seqs[row] + 1
+        SEQ_STRUCT.pack_into(self._buf, offset, seq)
+        FIELDS_STRUCT.pack_into(
+            self._buf, offset + SEQ_STRUCT.size,
+            self.asset_ids[row],
+            min(max(int(volume), 0), 0xFFFFFFFF), price, change, change_percent, timestamp,
+            TREND_CODES.get(trend, 0),
+        )
+        seq += 1
+        SEQ_STRUCT.pack_into(self._buf, offset, seq)
+        self._seqs[row] = seq
+        self._updates += 1
+        UPDATES_STRUCT.pack_into(self._buf, UPDATES_OFFSET, self._updates)
+        return True
+
+    def update_market_data(self, market_data) -> bool:
+        """Publica um MarketData"""
+        return self.update(
+            market_data.asset, market_data.current_price, market_data.change,
+            market_data.change_percent, market_data.volume,
+            market_data.timestamp.timestamp(), market_data.trend,
+        )
+
+    def close(self):
+        """Libera e remove o bloco"""
+        self._buf = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        _created_here.discard(self.name)
+
+
+class QuoteTableReader:
+    """Leitor da tabela em outro processo (não cria nem remove o bloco)"""
+
+    def __init__(self, name: str = DEFAULT_TABLE_NAME):
+        self.shm = shared_memory.SharedMemory(name=name)
+        _untrack(self.shm)
+        self._buf = self.shm.buf
+
+        magic, version, row_size, n_rows, directory_offset, rows_offset, created_at, _ = \
+            HEADER_STRUCT.unpack_from(self._buf, 0)
+        if magic != QUOTE_TABLE_MAGIC:
+            self.close()
+            raise ValueError("bloco não é uma tabela de cotações")
+        if version != QUOTE_TABLE_VERSION or row_size != ROW_SIZE:
+            self.close()
+            raise ValueError(f"versão de tabela não suportada: {version}/{row_size}")
+
+        self.n_rows = n_rows
+        self.rows_offset = rows_offset
+        self.created_at = created_at
+        self.symbols = []
+        for row in range(n_rows):
+            _, raw = DIRECTORY_ENTRY_STRUCT.unpack_from(self._buf, directory_offset + row * DIRECTORY_ENTRY_STRUCT.size)
+            self.symbols.append(raw.rstrip(b'\0').decode('utf-8'))
+        self.row_of: Dict[str, int] = {symbol: row for row, symbol in enumerate(self.symbols)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def updates(self) -> int:
+        """Total de escritas; permite detectar mudanças sem ler as linhas"""
+        return UPDATES_STRUCT.unpack_from(self._buf, UPDATES_OFFSET)[0]
+
+    def read_row(self, row: int) -> Optional[Quote]:
+        """Cópia consistente de uma linha (None se ainda não houve cotação)"""
+        offset = self.rows_offset + row * ROW_SIZE
+        buf = self._buf
+        for _ in range(MAX_READ_RETRIES):
+            seq = SEQ_STRUCT.unpack_from(buf, offset)[0]
+            if seq & 1:
+                # Escrita em andamento: cede a CPU para o escritor terminar
+                time.sleep(0)
+                continue
+            _, volume, price, change, change_percent, timestamp, trend = \
+                FIELDS_STRUCT.unpack_from(buf, offset + SEQ_STRUCT.size)
+            if SEQ_STRUCT.unpack_from(buf, offset)[0] != seq:
+                time.sleep(0)
+                continue
+            if seq == 0:
+                return None
+            return Quote(self.symbols[row], price, change, change_percent, volume, timestamp,
+                         TREND_NAMES.get(trend, 'STABLE'))
+        raise TimeoutError(f"linha {row} em escrita contínua")
+
+    def read(self, asset: str) -> Optional[Quote]:
+        row = self.row_of.get(asset)
+        return self.read_row(row) if row is not None else None
+
+    def snapshot(self, assets: Optional[Iterable[str]] = None) -> Dict[str, Quote]:
+        """Cotações consistentes dos ativos pedidos (todos por padrão)"""
+        rows = range(self.n_rows) if assets is None else [self.row_of[a] for a in assets if a in self.row_of]
+        quotes = {}
+        for row in rows:
+            quote = self.read_row(row)
+            if quote is not None:
+                quotes[quote.asset] = quote
+        return quotes
+
+    def to_numpy(self):
+        """Linhas como array estruturado NumPy sobre o bloco (sem cópia).
+
+        A view não usa o seqlock: serve para varreduras rápidas; use
+        ``read_row`` quando uma linha precisa ser consistente.
+        """
+        import numpy as np
+        dtype = np.dtype({
+            'names': ['seq', 'asset_id', 'volume', 'price', 'change', 'change_percent', 'timestamp', 'trend'],
+            'formats': ['<u8', '<u4', '<u4', '<f8', '<f8', '<f8', '<f8', 'i1'],
+            'offsets': [0, 8, 12, 16, 24, 32, 40, 48],
+            'itemsize': ROW_SIZE,
+        })
+        return np.frombuffer(self._buf, dtype=dtype, count=self.n_rows, offset=self.rows_offset)
+
+    def close(self):
+        self._buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Ainda existem views exportadas (to_numpy); o bloco é liberado com elas
+            pass
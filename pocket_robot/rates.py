@@ -0,0 +1,126 @@
+"""
+Contadores de taxa em janelas deslizantes
+Buckets de 1 segundo em um anel; as somas de cada janela são mantidas
+incrementalmente quando um segundo se completa, então ``add`` é O(1) e a
+leitura não percorre o anel. Também mantém taxas EWMA por constante de tempo
+"""
+
+import math
+import time
+from typing import Any, Dict, Iterable, Optional
+
+# Janelas (rótulo, segundos) e constantes de tempo das EWMA (rótulo, segundos)
+DEFAULT_WINDOWS = (('1s', 1), ('10s', 10), ('1m', 60), ('5m', 300))
+DEFAULT_EWMA = (('10s', 10.0), ('1m', 60.0))
+
+
+class RateCounter:
+    """Eventos por segundo nas janelas configuradas.
+
+    As janelas consideram apenas segundos completos: ``rate_10s`` é a soma
+    dos 10 últimos segundos fechados dividida por 10.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, ewma=DEFAULT_EWMA, clock=time.monotonic):
+        self.windows = [(label, int(seconds)) for label, seconds in windows]
+        self.ewma_alphas = [(label, 1.0 - math.exp(-1.0 / tau)) for label, tau in ewma]
+        self.clock = clock
+
+        self.size = max(seconds for _, seconds in self.windows) + 1
+        self.buckets = [0] * self.size
+        self.sums = [0] * len(self.windows)
+        self.ewma = [0.0] * len(self.ewma_alphas)
+        self.total = 0
+        self.second = int(clock())
+
+    def _projected(self, second: int):
+        """Somas e EWMA como ficam ao avançar até ``second``, sem alterar o estado.
+
+        As leituras (``rate``/``snapshot``) usam só isto: a API as chama de
+        outra thread enquanto ``add`` roda no loop, e avançar o anel nas duas
+        pontas ao mesmo tempo fechava o mesmo segundo duas vezes.
+        """
+        current = self.second
+        buckets = list(self.buckets)
+        sums = list(self.sums)
+        ewma = list(self.ewma)
+        if second <= current:
+            return sums, ewma
+
+        def bucket(t):
+            # Segundos depois do corrente ainda não receberam eventos
+            return buckets[t % self.size] if t <= current else 0
+
+        gap = second - current
+        if gap >= self.size:
+            # Parado por mais que a maior janela: tudo expirou
+            count = bucket(current)
+            decay = gap - 1
+            ewma = [(rate + alpha * (count - rate)) * (1.0 - alpha) ** decay
+                    for rate, (_, alpha) in zip(ewma, self.ewma_alphas)]
+            return [0] * len(self.windows), ewma
+        for t in range(current, second):
+            count = bucket(t)
+            for i, (_, seconds) in enumerate(self.windows):
+                sums[i] += count - bucket(t - seconds)
+            for i, (_, alpha) in enumerate(self.ewma_alphas):
+                ewma[i] += alpha * (count - ewma[i])
+        return sums, ewma
+
+    def _advance(self, now: float):
+        second = int(now)
+        if second <= self.second:
+            return
+        self.sums, self.ewma = self._projected(second)
+        if second - self.second >= self.size:
+            self.buckets = [0] * self.size
+        else:
+            for t in range(self.second + 1, second + 1):
+                self.buckets[t % self.size] = 0
+        self.second = second
+
+    def add(self, n: int = 1):
+        now = self.clock()
+        if int(now) != self.second:
+            self._advance(now)
+        self.buckets[self.second % self.size] += n
+        self.total += n
+
+    def rate(self, label: str) -> float:
+        sums, _ = self._projected(int(self.clock()))
+        for i, (name, seconds) in enumerate(self.windows):
+            if name == label:
+                return sums[i] / seconds
+        raise KeyError(label)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """total, rate_<janela> e ewma_<tau> (eventos por segundo)"""
+        sums, ewma = self._projected(int(self.clock()))
+        summary: Dict[str, Any] = {'total': self.total}
+        for (label, seconds), value in zip(self.windows, sums):
+            summary[f'rate_{label}'] = round(value / seconds, 3)
+        for (label, _), value in zip(self.ewma_alphas, ewma):
+            summary[f'ewma_{label}'] = round(value, 3)
+        return summary
+
+
+class RateCounters:
+    """Conjunto de RateCounter por nome (criados no primeiro uso)"""
+
+    def __init__(self, names: Optional[Iterable[str]] = None):
+        self.counters: Dict[str, RateCounter] = {}
+        for name in names or ():
+            self.counters[name] = RateCounter()
+
+    def add(self, name: str, n: int = 1):
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = RateCounter()
+        counter.add(n)
+
+    def rate(self, name: str, label: str) -> float:
+        counter = self.counters.get(name)
+        return counter.rate(label) if counter else 0.0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: counter.snapshot() for name, counter in self.counters.items()}
@@ -0,0 +1,215 @@
+"""
+Ranking de regiões por latência, persistido entre execuções
+Um prober mede periodicamente o RTT (connect TCP) e o handshake (TCP + TLS)
+de cada endpoint de constants.REGION, mantém médias exponenciais (EWMA) e
+salva o ranking em um arquivo JSON pequeno. Na partida seguinte a corrida
+de conexão começa pela região mais rápida e saudável
+
+Arquivo (POCKET_REGION_CACHE, padrão ~/.cache/pocket_robot/regions.json):
+
+    {"version": 1, "updated_at": <epoch>, "regions": {
+        "<região>": {"url", "rtt", "handshake", "failures", "probes", "last_ok"}, ...}}
+
+Tempos em segundos; 'failures' são falhas consecutivas (região com
+MAX_FAILURES ou mais fica no fim do ranking até voltar a responder)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import ssl
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from constants import REGION
+
+logger = logging.getLogger(__name__)
+
+RANKING_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join('~', '.cache', 'pocket_robot', 'regions.json')
+# Peso da nova amostra nas médias
+EWMA_ALPHA = 0.3
+# Falhas consecutivas a partir das quais a região é considerada fora do ar
+MAX_FAILURES = 3
+# Entradas do cache sem resposta há mais que isso são ignoradas na carga (s)
+STALE_AFTER = 7 * 86400
+
+
+def region_cache_path() -> str:
+    return os.path.expanduser(os.environ.get('POCKET_REGION_CACHE', DEFAULT_CACHE_PATH))
+
+
+def region_of(url: str) -> str:
+    """Nome da região de uma url de constants.REGION (a própria url se não estiver lá)"""
+    for name, region_url in REGION.REGIONS.items():
+        if region_url == url:
+            return name
+    return url
+
+
+def _ewma(previous: Optional[float], sample: float, alpha: float = EWMA_ALPHA) -> float:
+    return sample if previous is None else previous + alpha * (sample - previous)
+
+
+class RegionRanking:
+    """EWMA de RTT e handshake por região e a ordem de tentativa derivada delas"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.regions: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'RegionRanking':
+        """Carrega o cache (arquivo ausente ou inválido = ranking vazio)"""
+        ranking = cls(path or region_cache_path())
+        try:
+            with open(ranking.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == RANKING_VERSION:
+                cutoff = time.time() - STALE_AFTER
+                ranking.regions = {
+                    name: entry for name, entry in data.get('regions', {}).items()
+                    if (entry.get('last_ok') or 0) >= cutoff
+                }
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Cache de regiões ignorado ({ranking.path}): {e}")
+        return ranking
+
+    def save(self):
+        """Grava o cache de forma atômica (arquivo temporário + rename)"""
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': RANKING_VERSION, 'updated_at': time.time(), 'regions': self.regions}, f, indent=1)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except Exception as e:
+            logger.warning(f"Falha ao gravar cache de regiões ({self.path}): {e}")
+
+    def _entry(self, url: str) -> Dict[str, Any]:
+        name = region_of(url)
+        entry = self.regions.get(name)
+        if entry is None:
+            entry = self.regions[name] = {'url': url, 'rtt': None, 'handshake': None,
+                                          'failures': 0, 'probes': 0, 'last_ok': None}
+        entry['url'] = url
+        return entry
+
+    def record(self, url: str, ok: bool, rtt: Optional[float] = None, handshake: Optional[float] = None):
+        """Resultado de uma medição (prober ou tentativa de conexão)"""
+        entry = self._entry(url)
+        entry['probes'] += 1
+        if ok:
+            entry['failures'] = 0
+            entry['last_ok'] = time.time()
+            if rtt is not None:
+                entry['rtt'] = _ewma(entry['rtt'], rtt)
+            if handshake is not None:
+                entry['handshake'] = _ewma(entry['handshake'], handshake)
+        else:
+            entry['failures'] += 1
+        self.dirty = True
+
+    def is_healthy(self, url: str) -> bool:
+        entry = self.regions.get(region_of(url))
+        return entry is None or entry['failures'] < MAX_FAILURES
+
+    def score(self, url: str) -> Optional[float]:
+        """Custo estimado da região (s): handshake, ou RTT quando só ele é conhecido"""
+        entry = self.regions.get(region_of(url))
+        if entry is None:
+            return None
+        return entry['handshake'] if entry['handshake'] is not None else entry['rtt']
+
+    def ranked(self, urls: Iterable[str]) -> List[str]:
+        """Ordem de tentativa: saudáveis medidas (mais rápidas primeiro), não
+        medidas (em ordem aleatória) e por fim as fora do ar"""
+        measured: List[Tuple[float, str]] = []
+        unknown: List[str] = []
+        down: List[Tuple[int, str]] = []
+        for url in urls:
+            score = self.score(url)
+            if not self.is_healthy(url):
+                down.append((self.regions[region_of(url)]['failures'], url))
+            elif score is None:
+                unknown.append(url)
+            else:
+                measured.append((score, url))
+        random.shuffle(unknown)
+        return [url for _, url in sorted(measured)] + unknown + [url for _, url in sorted(down)]
+
+    def should_switch(self, current: str, candidates: Iterable[str], ratio: float,
+                      min_gain: float) -> Optional[str]:
+        """Região para a qual vale migrar a conexão atual, ou None.
+
+        Migra quando a região atual está fora do ar ou quando a melhor
+        alternativa saudável é ``ratio`` vezes mais rápida e ganha pelo menos
+        ``min_gain`` segundos.
+        """
+        ranked = [url for url in self.ranked(candidates) if url != current]
+        if not ranked or not self.is_healthy(ranked[0]):
+            return None
+        best = ranked[0]
+        if not self.is_healthy(current):
+            return best
+        current_score, best_score = self.score(current), self.score(best)
+        if current_score is None or best_score is None:
+            return None
+        if current_score > best_score * ratio and current_score - best_score >= min_gain:
+            return best
+        return None
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Ranking atual em ms (para estatísticas)"""
+        result = {}
+        for name, entry in self.regions.items():
+            result[name] = {
+                'rtt_ms': round(entry['rtt'] * 1000, 2) if entry['rtt'] is not None else None,
+                'handshake_ms': round(entry['handshake'] * 1000, 2) if entry['handshake'] is not None else None,
+                'failures': entry['failures'],
+                'probes': entry['probes'],
+            }
+        return result
+
+
+async def probe_region(url: str, timeout: float) -> Tuple[bool, Optional[float], Optional[float]]:
+    """(ok, rtt, handshake) de um endpoint: connect TCP simples e connect TCP + TLS"""
+    parsed = urlparse(url)
+    host = parsed.hostname
+    secure = parsed.scheme in ('wss', 'https')
+    port = parsed.port or (443 if secure else 80)
+    try:
+        start = time.monotonic()
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        rtt = time.monotonic() - start
+        writer.close()
+
+        handshake = rtt
+        if secure:
+            start = time.monotonic()
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=ssl.create_default_context(), server_hostname=host), timeout,
+            )
+            handshake = time.monotonic() - start
+            writer.close()
+        return True, rtt, handshake
+    except (asyncio.TimeoutError, OSError) as e:
+        logger.debug(f"Sonda de {region_of(url)} falhou: {e}")
+        return False, None, None
+
+
+async def probe_all(ranking: RegionRanking, urls: Iterable[str], timeout: float):
+    """Sonda todas as urls em paralelo e atualiza o ranking"""
+    urls = list(urls)
+    results = await asyncio.gather(*(probe_region(url, timeout) for url in urls))
+    for url, (ok, rtt, handshake) in zip(urls, results):
+        ranking.record(url, ok, rtt=rtt, handshake=handshake)
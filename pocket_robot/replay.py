@@ -0,0 +1,181 @@
+"""
+Replay acelerado de ticks gravados no journal
+Cliente com a mesma interface dos clientes Pocket Option que emite
+eventos 'tick' a partir dos segmentos de tick_journal
+"""
+
+import asyncio
+import os
+import time
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from tick_journal import TickJournalReader, list_segments
+
+logger = logging.getLogger(__name__)
+
+# Ticks emitidos por evento quando o replay está atrasado ou em velocidade máxima
+REPLAY_BATCH_SIZE = 256
+
+
+def parse_speed(value: Optional[str]) -> float:
+    """Converte '1', '10', '1x' ou 'max' em fator de velocidade (0 = sem espera)"""
+    if not value:
+        return 1.0
+    value = value.strip().lower()
+    if value in ('max', 'inf', '0', '0x'):
+        return 0.0
+    speed = float(value[:-1] if value.endswith('x') else value)
+    if speed < 0:
+        raise ValueError("velocidade de replay não pode ser negativa")
+    return speed
+
+
+class ReplayPocketOptionClient:
+    """Cliente que reproduz ticks gravados.
+
+    Com ``speed`` > 0 o intervalo original entre ticks é preservado
+    (dividido pelo fator); com ``speed`` = 0 os ticks são emitidos o mais
+    rápido possível, em lotes, devolvendo o controle ao event loop entre
+    eles para que o pipeline de ingestão acompanhe.
+    """
+    supports_tick_stream = True
+
+    def __init__(self, ssid, is_demo=True, path: str = '', speed: float = 1.0, loop_replay: bool = False, **kwargs):
+        self.ssid = ssid
+        self.is_demo = is_demo
+        self.is_connected = False
+        self.event_callbacks = defaultdict(list)
+
+        self.path = path
+        self.speed = speed
+        self.loop_replay = loop_replay
+        self._task: Optional[asyncio.Task] = None
+
+        self.replay_stats = {
+            'ticks': 0,
+            'batches': 0,
+            'elapsed': 0.0,
+            'ticks_per_second': 0.0,
+            'max_lag': 0.0,
+            'finished': False,
+        }
+
+    def segments(self) -> List[str]:
+        if os.path.isdir(self.path):
+            return list_segments(self.path)
+        return [self.path] if os.path.isfile(self.path) else []
+
+    async def connect(self):
+        """Inicia a reprodução (falha se não houver dados gravados)"""
+        if not self.segments():
+            logger.error(f"Nenhum segmento de ticks encontrado em {self.path}")
+            return False
+        self.is_connected = True
+        self._task = asyncio.create_task(self._replay_loop())
+        await self._emit_event('connected', {'ssid': self.ssid, 'replay': self.path})
+        return True
+
+    async def disconnect(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.is_connected = False
+
+    async def get_balance(self):
+        if self.is_connected:
+            return {"balance": 10000.0, "currency": "USD"}
+        return None
+
+    async def send_message(self, message):
+        return self.is_connected
+
+    def add_event_callback(self, event_type, callback):
+        self.event_callbacks[event_type].append(callback)
+
+    def get_replay_stats(self) -> Dict[str, Any]:
+        return dict(self.replay_stats)
+
+    def _iter_ticks(self) -> Iterator[Tuple[str, float, float, int]]:
+        for path in self.segments():
+            with TickJournalReader(path) as reader:
+                yield from reader.iter_ticks()
+
+    async def _replay_loop(self):
+        # Só começa quando há quem consuma os ticks (o robô registra o
+        # callback depois de conectar); nada gravado é perdido
+        while not self.event_callbacks.get('tick'):
+            await asyncio.sleep(0.01)
+
+        start_wall = time.perf_counter()
+        try:
+            while True:
+                await self._replay_once(start_wall)
+                if not self.loop_replay:
+                    break
+        finally:
+            self._update_rate(start_wall)
+            self.replay_stats['finished'] = True
+
+        stats = self.replay_stats
+        logger.info(
+            f"Replay concluído: {stats['ticks']} ticks em {stats['elapsed']:.2f}s "
+            f"({stats['ticks_per_second']:.0f} ticks/s, atraso máximo {stats['max_lag'] * 1000:.1f}ms)"
+        )
+        await self._emit_event('replay_finished', self.get_replay_stats())
+
+    async def _replay_once(self, start_wall: float):
+        first_ts: Optional[float] = None
+        pass_start = time.perf_counter()
+        batch: List[list] = []
+
+        for symbol, timestamp, price, volume in self._iter_ticks():
+            if self.speed > 0:
+                if first_ts is None:
+                    first_ts = timestamp
+                due = pass_start + (timestamp - first_ts) / self.speed
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    # Envia o que já venceu antes de esperar pelo próximo tick
+                    if batch:
+                        await self._emit_batch(batch, start_wall)
+                        batch = []
+                    await asyncio.sleep(wait)
+                elif -wait > self.replay_stats['max_lag']:
+                    self.replay_stats['max_lag'] = -wait
+
+            batch.append([symbol, timestamp, price, volume])
+            if len(batch) >= REPLAY_BATCH_SIZE:
+                await self._emit_batch(batch, start_wall)
+                batch = []
+                # Cede o event loop para os consumidores
+                await asyncio.sleep(0)
+
+        if batch:
+            await self._emit_batch(batch, start_wall)
+
+    async def _emit_batch(self, batch: List[list], start_wall: float):
+        await self._emit_event('tick', batch)
+        self.replay_stats['ticks'] += len(batch)
+        self.replay_stats['batches'] += 1
+        self._update_rate(start_wall)
+
+    def _update_rate(self, start_wall: float):
+        elapsed = time.perf_counter() - start_wall
+        self.replay_stats['elapsed'] = elapsed
+        self.replay_stats['ticks_per_second'] = self.replay_stats['ticks'] / elapsed if elapsed > 0 else 0.0
+
+    async def _emit_event(self, event_type, data):
+        if event_type in self.event_callbacks:
+            for handler in self.event_callbacks[event_type]:
+                try:
+                    if asyncio.iscoroutinefunction(handler):
+                        await handler(data)
+                    else:
+                        handler(data)
+                except Exception:
+                    pass
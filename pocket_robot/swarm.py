@@ -0,0 +1,414 @@
+"""
+Gerador de carga: enxame de clientes Socket.IO contra a webapi local
+Abre milhares de clientes concorrentes contra ``webapi.app:asgi_app``, cada
+um assinando um conjunto aleatório de símbolos, e sobe a quantidade de
+clientes em degraus. Em cada degrau mede tempo de conexão, jitter entre
+chegadas, perda de frames, latência envio -> recebimento e CPU do
+servidor, produzindo a curva vazão x quantidade de clientes
+
+    python -m pocket_robot.swarm --clients 100 500 1000 2000 --step 20
+    python -m pocket_robot.swarm --url http://127.0.0.1:8000 --server-pid 1234 --output curva.json
+
+Sem --url, o servidor é iniciado em um subprocesso uvicorn (e encerrado no
+fim). Requer aiohttp (cliente assíncrono do python-socketio).
+
+Definições:
+- jitter: variação do tempo de trânsito entre frames consecutivos do mesmo
+  cliente, |(chegada_i - chegada_i-1) - (carimbo_i - carimbo_i-1)| (RFC 3550);
+  não depende de relógios sincronizados
+- latência envio -> recebimento: relógio monotônico local - carimbo do frame;
+  só vale com o servidor na mesma máquina (mesmo relógio monotônico)
+- perda: 1 - frames recebidos / frames enviados pelo servidor no degrau
+  (contadores de /api/perf; supõe que o enxame é o único cliente)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from latency import LatencyHistogram
+
+DEFAULT_CLIENT_STEPS = (10, 100, 500, 1000, 2000)
+# Segundos medidos por degrau (após todos os clientes do degrau conectarem)
+DEFAULT_STEP_DURATION = 15.0
+# Conexões abertas em paralelo durante a subida
+DEFAULT_CONNECT_CONCURRENCY = 100
+DEFAULT_SYMBOLS_PER_CLIENT = 20
+CONNECT_TIMEOUT = 10.0
+SERVER_START_TIMEOUT = 30.0
+# Latência p99 (ms) acima da qual o degrau é considerado degradado
+DEFAULT_LATENCY_SLO_MS = 250.0
+DEFAULT_MAX_LOSS = 0.01
+# Intervalo entre ecos 'tick_ack' de cada cliente (s)
+ACK_INTERVAL = 1.0
+
+STAMP_MASK = 0xFFFFFFFF
+# Diferenças de carimbo acima disto (ms) indicam relógios distintos ou reinício do servidor
+MAX_STAMP_DELTA_MS = 120000
+
+
+class SwarmStats:
+    """Métricas agregadas de todos os clientes no degrau corrente"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.bytes = 0
+        self.intervals = LatencyHistogram()
+        self.jitter = LatencyHistogram()
+        self.latency = LatencyHistogram()
+        self.started = time.monotonic()
+
+
+class SwarmClient:
+    """Um cliente do enxame e o estado de chegada dos seus frames"""
+
+    __slots__ = ('index', 'stats', 'measure_latency', 'ack', 'sio', 'symbols', 'encoding',
+                 'connect_time', 'last_arrival', 'last_stamp', 'last_ack', 'errors')
+
+    def __init__(self, index: int, stats: SwarmStats, symbols: List[str], encoding: Optional[str],
+                 measure_latency: bool, ack: bool):
+        import socketio
+
+        self.index = index
+        self.stats = stats
+        self.symbols = symbols
+        self.encoding = encoding
+        self.measure_latency = measure_latency
+        self.ack = ack
+        self.connect_time: Optional[float] = None
+        self.last_arrival: Optional[float] = None
+        self.last_stamp: Optional[int] = None
+        self.last_ack = 0.0
+        self.errors = 0
+        self.sio = socketio.AsyncClient(reconnection=False, logger=False, engineio_logger=False)
+        self.sio.on('tick', self._on_frame)
+        self.sio.on('tick_bin', self._on_frame)
+
+    async def connect(self, url: str) -> bool:
+        start = time.monotonic()
+        try:
+            await self.sio.connect(url, transports=['websocket'], socketio_path='socket.io',
+                                   wait_timeout=CONNECT_TIMEOUT)
+            data = {'symbols': self.symbols}
+            if self.encoding:
+                data['encoding'] = self.encoding
+            await self.sio.call('subscribe', data, timeout=CONNECT_TIMEOUT)
+        except Exception:
+            self.errors += 1
+            return False
+        self.connect_time = time.monotonic() - start
+        return True
+
+    async def _on_frame(self, payload=None, stamp=None):
+        now = time.monotonic()
+        stats = self.stats
+        stats.frames += 1
+        if isinstance(payload, (bytes, bytearray)):
+            stats.bytes += len(payload)
+
+        if isinstance(stamp, int):
+            if self.measure_latency:
+                delta_ms = (int(now * 1000) - stamp) & STAMP_MASK
+                if delta_ms < MAX_STAMP_DELTA_MS:
+                    stats.latency.record(delta_ms / 1000.0)
+            if self.last_arrival is not None and self.last_stamp is not None:
+                sent_gap_ms = (stamp - self.last_stamp) & STAMP_MASK
+                if sent_gap_ms < MAX_STAMP_DELTA_MS:
+                    stats.jitter.record(abs((now - self.last_arrival) - sent_gap_ms / 1000.0))
+            self.last_stamp = stamp
+            if self.ack and now - self.last_ack >= ACK_INTERVAL:
+                self.last_ack = now
+                try:
+                    await self.sio.emit('tick_ack', {'t': stamp})
+                except Exception:
+                    self.errors += 1
+        if self.last_arrival is not None:
+            stats.intervals.record(now - self.last_arrival)
+        self.last_arrival = now
+
+    async def disconnect(self):
+        try:
+            await self.sio.disconnect()
+        except Exception:
+            pass
+
+
+def _ms(histogram: LatencyHistogram) -> Dict[str, float]:
+    snapshot = histogram.snapshot()
+    return {key: round(snapshot[key] * 1000, 2) for key in ('p50', 'p90', 'p99', 'max')}
+
+
+class Swarm:
+    """Sobe os degraus de clientes e mede cada um"""
+
+    def __init__(self, url: str, symbols_per_client: int = DEFAULT_SYMBOLS_PER_CLIENT,
+                 encoding: Optional[str] = None, connect_concurrency: int = DEFAULT_CONNECT_CONCURRENCY,
+                 server_pid: Optional[int] = None, ack: bool = True, seed: int = 1):
+        self.url = url.rstrip('/')
+        self.symbols_per_client = symbols_per_client
+        self.encoding = encoding
+        self.connect_concurrency = connect_concurrency
+        self.ack = ack
+        self.rng = random.Random(seed)
+        self.stats = SwarmStats()
+        self.clients: List[SwarmClient] = []
+        self.failed_connects = 0
+        self.assets: List[str] = []
+        self.session = None
+        # O carimbo usa o relógio monotônico do servidor: só comparável na mesma máquina
+        self.measure_latency = urlparse(self.url).hostname in ('127.0.0.1', 'localhost', '::1')
+
+        self.server_process = None
+        self.own_process = None
+        try:
+            import psutil
+            self.server_process = psutil.Process(server_pid) if server_pid else None
+            self.own_process = psutil.Process(os.getpid())
+        except Exception:
+            pass
+
+    async def __aenter__(self):
+        import aiohttp
+        self.session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.gather(*(client.disconnect() for client in self.clients))
+        self.clients = []
+        await self.session.close()
+
+    async def _get(self, path: str) -> Any:
+        async with self.session.get(self.url + path) as response:
+            return await response.json()
+
+    async def prepare(self):
+        """Inicia o robô (se parado) e carrega a lista de símbolos"""
+        async with self.session.post(self.url + '/api/start') as response:
+            await response.read()
+        self.assets = list((await self._get('/api/assets')).keys())
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while (await self._get('/api/perf')).get('status') == 'not_running':
+            if time.monotonic() > deadline:
+                raise RuntimeError('robô não iniciou')
+            await asyncio.sleep(0.5)
+
+    def _random_symbols(self) -> List[str]:
+        return self.rng.sample(self.assets, min(self.symbols_per_client, len(self.assets)))
+
+    async def grow(self, target: int) -> LatencyHistogram:
+        """Abre clientes até ``target`` e devolve o histograma dos tempos de conexão"""
+        connect_times = LatencyHistogram()
+        semaphore = asyncio.Semaphore(self.connect_concurrency)
+
+        async def open_one(index: int):
+            client = SwarmClient(index, self.stats, self._random_symbols(), self.encoding,
+                                 self.measure_latency, self.ack)
+            async with semaphore:
+                ok = await client.connect(self.url)
+            if ok:
+                connect_times.record(client.connect_time)
+                self.clients.append(client)
+            else:
+                self.failed_connects += 1
+                await client.disconnect()
+
+        start = len(self.clients) + self.failed_connects
+        await asyncio.gather(*(open_one(i) for i in range(start, start + target - len(self.clients))))
+        return connect_times
+
+    def _cpu_start(self):
+        for process in (self.server_process, self.own_process):
+            if process is not None:
+                process.cpu_percent(None)
+
+    def _cpu(self, process) -> Optional[float]:
+        if process is None:
+            return None
+        try:
+            return round(process.cpu_percent(None), 1)
+        except Exception:
+            return None
+
+    async def run_step(self, n_clients: int, duration: float) -> Dict[str, Any]:
+        connect_started = time.monotonic()
+        failed_before = self.failed_connects
+        connect_times = await self.grow(n_clients)
+        ramp_seconds = time.monotonic() - connect_started
+
+        before = (await self._get('/api/perf')).get('broadcast', {})
+        self.stats.reset()
+        self._cpu_start()
+        await asyncio.sleep(duration)
+        cpu_server = self._cpu(self.server_process)
+        cpu_swarm = self._cpu(self.own_process)
+        summary = await self._get('/api/perf')
+        after = summary.get('broadcast', {})
+        elapsed = time.monotonic() - self.stats.started
+
+        stats = self.stats
+        sent = after.get('frames_sent', 0) - before.get('frames_sent', 0)
+        step = {
+            'clients': len(self.clients),
+            'failed_connects': self.failed_connects - failed_before,
+            'ramp_seconds': round(ramp_seconds, 2),
+            'connect_ms': _ms(connect_times),
+            'frames_received': stats.frames,
+            'frames_sent': sent,
+            'frames_per_s': round(stats.frames / elapsed, 1),
+            'loss': round(max(0.0, 1.0 - stats.frames / sent), 4) if sent else None,
+            'coalesced': after.get('frames_coalesced', 0) - before.get('frames_coalesced', 0),
+            'dropped_by_server': after.get('clients_dropped', 0) - before.get('clients_dropped', 0),
+            'interarrival_ms': _ms(stats.intervals),
+            'jitter_ms': _ms(stats.jitter),
+            'emit_to_receive_ms': _ms(stats.latency) if stats.latency.count else None,
+            'server_ingest_to_client_ms': (summary.get('tick_latency_ms') or {}).get('ingest_to_client', {}).get('1m'),
+            'server_cpu_percent': cpu_server,
+            'swarm_cpu_percent': cpu_swarm,
+        }
+        if self.server_process is not None:
+            try:
+                step['server_rss_mb'] = round(self.server_process.memory_info().rss / 1024 / 1024, 1)
+            except Exception:
+                pass
+        return step
+
+
+def degraded(step: Dict[str, Any], latency_slo_ms: float, max_loss: float) -> bool:
+    latency = step.get('emit_to_receive_ms') or step.get('server_ingest_to_client_ms') or {}
+    if latency.get('p99', 0) > latency_slo_ms:
+        return True
+    return (step.get('loss') or 0) > max_loss or step.get('dropped_by_server', 0) > 0
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """Inicia a webapi em um subprocesso uvicorn"""
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'webapi.app:asgi_app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=ROOT,
+    )
+
+
+async def wait_for_server(url: str, timeout: float = SERVER_START_TIMEOUT):
+    import aiohttp
+
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url + '/api/assets') as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'servidor não respondeu em {url}')
+            await asyncio.sleep(0.3)
+
+
+async def run_swarm(url: str, steps: List[int], duration: float, latency_slo_ms: float = DEFAULT_LATENCY_SLO_MS,
+                    max_loss: float = DEFAULT_MAX_LOSS, stop_on_degradation: bool = False, **options) -> Dict[str, Any]:
+    curve = []
+    capacity = 0
+    async with Swarm(url, **options) as swarm:
+        await swarm.prepare()
+        for n_clients in sorted(steps):
+            step = await swarm.run_step(n_clients, duration)
+            step['degraded'] = degraded(step, latency_slo_ms, max_loss)
+            curve.append(step)
+            latency = step['emit_to_receive_ms'] or {}
+            print(f"{step['clients']:>6} clientes  {step['frames_per_s']:>10} frames/s  "
+                  f"perda={step['loss']}  conexão p99={step['connect_ms']['p99']}ms  "
+                  f"latência p99={latency.get('p99')}ms  jitter p99={step['jitter_ms']['p99']}ms  "
+                  f"cpu servidor={step['server_cpu_percent']}%  cpu enxame={step['swarm_cpu_percent']}%"
+                  + ('  DEGRADADO' if step['degraded'] else ''))
+            if not step['degraded']:
+                capacity = step['clients']
+            elif stop_on_degradation:
+                break
+    return {
+        'url': url,
+        'created_at': time.time(),
+        'step_duration': duration,
+        'latency_slo_ms': latency_slo_ms,
+        'max_loss': max_loss,
+        'capacity': capacity,
+        'curve': curve,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m pocket_robot.swarm', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='servidor já em execução (padrão: inicia um uvicorn local)')
+    parser.add_argument('--port', type=int, default=8765, help='porta do servidor iniciado pelo enxame')
+    parser.add_argument('--server-pid', type=int, help='pid do servidor (CPU e memória) quando --url é usado')
+    parser.add_argument('--clients', type=int, nargs='+', default=list(DEFAULT_CLIENT_STEPS), help='degraus de clientes')
+    parser.add_argument('--step', type=float, default=DEFAULT_STEP_DURATION, help='segundos medidos por degrau')
+    parser.add_argument('--symbols', type=int, default=DEFAULT_SYMBOLS_PER_CLIENT, help='símbolos por cliente')
+    parser.add_argument('--encoding', choices=('json', 'binary', 'msgpack'), help='encoding negociado na assinatura')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONNECT_CONCURRENCY, help='conexões abertas em paralelo')
+    parser.add_argument('--no-ack', action='store_true', help='não ecoa os carimbos em tick_ack')
+    parser.add_argument('--latency-slo', type=float, default=DEFAULT_LATENCY_SLO_MS, help='p99 (ms) que marca degradação')
+    parser.add_argument('--max-loss', type=float, default=DEFAULT_MAX_LOSS, help='perda que marca degradação')
+    parser.add_argument('--stop-on-degradation', action='store_true', help='para no primeiro degrau degradado')
+    parser.add_argument('--output', metavar='ARQUIVO', help='salva a curva em JSON')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    try:
+        import aiohttp  # noqa: F401
+        import socketio  # noqa: F401
+    except ImportError as e:
+        print(f'dependência ausente ({e.name}): pip install aiohttp python-socketio', file=sys.stderr)
+        return 2
+
+    server = None
+    url = args.url
+    server_pid = args.server_pid
+    if not url:
+        server = spawn_server(args.port)
+        url = f'http://127.0.0.1:{args.port}'
+        server_pid = server.pid
+
+    try:
+        if server is not None:
+            asyncio.run(wait_for_server(url))
+        result = asyncio.run(run_swarm(
+            url, args.clients, args.step, args.latency_slo, args.max_loss, args.stop_on_degradation,
+            symbols_per_client=args.symbols, encoding=args.encoding, connect_concurrency=args.concurrency,
+            server_pid=server_pid, ack=not args.no_ack, seed=args.seed,
+        ))
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    print(f"capacidade (último degrau sem degradação): {result['capacity']} clientes")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f'curva salva em {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
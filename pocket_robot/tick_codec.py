@@ -0,0 +1,132 @@
+"""
+Codificação binária compacta dos ticks enviados aos clientes
+Alternativa negociada ao JSON: ids inteiros de constants.ACTIVES e
+preços em ponto fixo
+
+Formato de um frame (little-endian):
+
+    Cabeçalho  <BBHI>  versão (1), flags, quantidade de ticks, seq (market_seq mod 2^32)
+    Corpo      encoding 'binary':  n x <HBi> id do ativo, casas decimais, mantissa
+               encoding 'msgpack': array MessagePack de [id, casas decimais, mantissa]
+
+    preço = mantissa / 10 ** casas_decimais
+
+Flags: bit 0 = snapshot completo, bit 1 = corpo comprimido com zlib
+(usado em frames maiores que COMPRESS_THRESHOLD bytes).
+"""
+
+import math
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from constants import ACTIVES
+
+try:
+    import msgpack
+except ImportError:  # dependência opcional
+    msgpack = None
+
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<BBHI')
+BINARY_RECORD = struct.Struct('<HBi')
+
+FLAG_SNAPSHOT = 0x01
+FLAG_COMPRESSED = 0x02
+
+# Corpo a partir do qual o frame é comprimido
+COMPRESS_THRESHOLD = 1024
+
+ENCODING_JSON = 'json'
+ENCODING_BINARY = 'binary'
+ENCODING_MSGPACK = 'msgpack'
+
+# id do ativo -> símbolo (para decodificação)
+ASSET_SYMBOLS: Dict[int, str] = {asset_id: symbol for symbol, asset_id in ACTIVES.items()}
+
+_MAX_DECIMALS = 8
+
+
+def available_encodings() -> List[str]:
+    encodings = [ENCODING_JSON, ENCODING_BINARY]
+    if msgpack is not None:
+        encodings.append(ENCODING_MSGPACK)
+    return encodings
+
+
+def negotiate_encoding(requested: Optional[str]) -> str:
+    """Retorna o encoding pedido se suportado; JSON caso contrário"""
+    if requested in available_encodings():
+        return requested
+    return ENCODING_JSON
+
+
+def to_fixed_point(price: float) -> Tuple[int, int]:
+    """Converte o preço em (casas decimais, mantissa int32) com ~9 dígitos significativos"""
+    if price <= 0 or not math.isfinite(price):
+        return 0, 0
+    decimals = max(0, min(_MAX_DECIMALS, 8 - int(math.floor(math.log10(price)))))
+    mantissa = round(price * 10 ** decimals)
+    # Arredondamento pode passar do limite de int32 (ex.: 99.9999999 -> 100)
+    while mantissa > 2147483647 and decimals > 0:
+        decimals -= 1
+        mantissa = round(price * 10 ** decimals)
+    return decimals, min(mantissa, 2147483647)
+
+
+def encode_fragment(symbol: str, price: float, encoding: str) -> Optional[bytes]:
+    """Codifica um tick isolado (retorna None se o ativo não tem id)"""
+    asset_id = ACTIVES.get(symbol)
+    if asset_id is None:
+        return None
+    decimals, mantissa = to_fixed_point(price)
+    if encoding == ENCODING_MSGPACK:
+        return msgpack.packb([asset_id, decimals, mantissa])
+    return BINARY_RECORD.pack(asset_id, decimals, mantissa)
+
+
+def _msgpack_array_header(n: int) -> bytes:
+    if n < 16:
+        return bytes([0x90 | n])
+    if n < 0x10000:
+        return b'\xdc' + struct.pack('>H', n)
+    return b'\xdd' + struct.pack('>I', n)
+
+
+def encode_frame(fragments: List[bytes], encoding: str, seq: int = 0, snapshot: bool = False) -> bytes:
+    """Monta um frame a partir de fragmentos já codificados (sem recodificar os ticks)"""
+    body = b''.join(fragments)
+    if encoding == ENCODING_MSGPACK:
+        body = _msgpack_array_header(len(fragments)) + body
+
+    flags = FLAG_SNAPSHOT if snapshot else 0
+    if len(body) > COMPRESS_THRESHOLD:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_COMPRESSED
+
+    return FRAME_HEADER.pack(FRAME_VERSION, flags, len(fragments), seq & 0xFFFFFFFF) + body
+
+
+def decode_frame(frame: bytes, encoding: str = ENCODING_BINARY) -> Dict:
+    """Decodifica um frame binário em {'seq', 'snapshot', 'ticks': [{'symbol', 'price'}]}"""
+    version, flags, count, seq = FRAME_HEADER.unpack_from(frame, 0)
+    if version != FRAME_VERSION:
+        raise ValueError(f"versão de frame não suportada: {version}")
+    body = frame[FRAME_HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+
+    if encoding == ENCODING_MSGPACK:
+        records = msgpack.unpackb(body)
+    else:
+        records = BINARY_RECORD.iter_unpack(body)
+
+    ticks = []
+    for asset_id, decimals, mantissa in records:
+        ticks.append({
+            'symbol': ASSET_SYMBOLS.get(asset_id, str(asset_id)),
+            'price': mantissa / 10 ** decimals,
+        })
+    if len(ticks) != count:
+        raise ValueError("quantidade de ticks não confere com o cabeçalho")
+    return {'seq': seq, 'snapshot': bool(flags & FLAG_SNAPSHOT), 'ticks': ticks}
@@ -0,0 +1,339 @@
+"""
+Journal binário de ticks (append-only, um segmento por dia UTC)
+Registros de tamanho fixo, leitura via mmap e recuperação de cauda
+truncada na abertura (segmentos ilegíveis são renomeados para *.corrupt)
+
+Layout de um segmento (little-endian):
+
+    Cabeçalho fixo  <4sHHdII>  magic b'PRTJ', versão, tamanho do registro,
+                               criado_em (epoch s), tamanho total do
+                               cabeçalho, quantidade de símbolos
+    Tabela          n x (<IH> id do ativo, tamanho do nome; nome UTF-8)
+    Registros       <dIdI>     timestamp (epoch s), id do ativo, preço, volume
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from constants import ACTIVES
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MAGIC = b'PRTJ'
+JOURNAL_VERSION = 1
+
+HEADER_STRUCT = struct.Struct('<4sHHdII')
+SYMBOL_ENTRY_STRUCT = struct.Struct('<IH')
+RECORD_STRUCT = struct.Struct('<dIdI')
+RECORD_SIZE = RECORD_STRUCT.size
+
+# Intervalo entre gravações em disco e tamanho que antecipa a gravação
+DEFAULT_FLUSH_INTERVAL = 0.25
+DEFAULT_FLUSH_BYTES = 256 * 1024
+# Limite de bytes pendentes antes de descartar ticks (disco não acompanha)
+MAX_PENDING_BYTES = 64 * 1024 * 1024
+
+SECONDS_PER_DAY = 86400
+
+
+def segment_name(day: int) -> str:
+    """Nome do segmento para o dia (dias desde a epoch, UTC)"""
+    return time.strftime('ticks-%Y%m%d.bin', time.gmtime(day * SECONDS_PER_DAY))
+
+
+def list_segments(directory: str) -> List[str]:
+    """Segmentos existentes no diretório, em ordem cronológica"""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(n for n in os.listdir(directory) if n.startswith('ticks-') and n.endswith('.bin'))
+    return [os.path.join(directory, n) for n in names]
+
+
+def build_header(symbols: Dict[int, str], created_at: Optional[float] = None) -> bytes:
+    """Monta o cabeçalho com o dicionário de símbolos (id -> nome)"""
+    table = bytearray()
+    for asset_id, name in sorted(symbols.items()):
+        encoded = name.encode('utf-8')
+        table += SYMBOL_ENTRY_STRUCT.pack(asset_id, len(encoded))
+        table += encoded
+    header_size = HEADER_STRUCT.size + len(table)
+    fixed = HEADER_STRUCT.pack(
+        JOURNAL_MAGIC, JOURNAL_VERSION, RECORD_SIZE,
+        created_at if created_at is not None else time.time(),
+        header_size, len(symbols),
+    )
+    return fixed + bytes(table)
+
+
+def parse_header(buffer) -> Tuple[int, Dict[int, str], float]:
+    """Lê o cabeçalho e retorna (tamanho do cabeçalho, símbolos, criado_em)"""
+    if len(buffer) < HEADER_STRUCT.size:
+        raise ValueError("cabeçalho incompleto")
+    magic, version, record_size, created_at, header_size, n_symbols = HEADER_STRUCT.unpack_from(buffer, 0)
+    if magic != JOURNAL_MAGIC:
+        raise ValueError("arquivo não é um journal de ticks")
+    if version != JOURNAL_VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"versão de journal não suportada: {version}/{record_size}")
+    if len(buffer) < header_size:
+        raise ValueError("cabeçalho incompleto")
+
+    symbols = {}
+    offset = HEADER_STRUCT.size
+    for _ in range(n_symbols):
+        asset_id, length = SYMBOL_ENTRY_STRUCT.unpack_from(buffer, offset)
+        offset += SYMBOL_ENTRY_STRUCT.size
+        symbols[asset_id] = bytes(buffer[offset:offset + length]).decode('utf-8')
+        offset += length
+    return header_size, symbols, created_at
+
+
+def quarantine_segment(path: str) -> str:
+    """Renomeia um segmento ilegível para fora do padrão ticks-*.bin"""
+    target = f'{path}.{int(time.time())}.corrupt'
+    os.replace(path, target)
+    return target
+
+
+def recover_segment(path: str) -> int:
+    """Remove um registro parcial no fim do segmento; retorna os bytes descartados.
+
+    Um cabeçalho incompleto (falha durante a criação) invalida o arquivo,
+    que é removido para ser recriado.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(min(size, 1024 * 1024))
+    if size < HEADER_STRUCT.size or (
+        head[:4] == JOURNAL_MAGIC and size < HEADER_STRUCT.unpack_from(head, 0)[4]
+    ):
+        os.remove(path)
+        logger.warning(f"Journal {os.path.basename(path)}: cabeçalho incompleto, segmento removido")
+        return size
+
+    header_size, _, _ = parse_header(head)
+    extra = (size - header_size) % RECORD_SIZE
+    if extra:
+        with open(path, 'r+b') as f:
+            f.truncate(size - extra)
+            f.flush()
+            os.fsync(f.fileno())
+        logger.warning(f"Journal {os.path.basename(path)}: {extra} bytes de registro parcial descartados")
+    return extra
+
+
+class TickJournal:
+    """Escritor do journal de ticks.
+
+    ``append`` apenas empacota o registro em um buffer em memória; a
+    gravação em disco acontece em uma thread dedicada, disparada pelo
+    intervalo de flush ou quando o buffer passa de ``flush_bytes``. Assim
+    o event loop nunca espera por I/O de disco.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        flush_bytes: int = DEFAULT_FLUSH_BYTES,
+        symbols: Optional[Dict[str, int]] = None,
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.asset_ids: Dict[str, int] = dict(symbols if symbols is not None else ACTIVES)
+        self._header = build_header({asset_id: name for name, asset_id in self.asset_ids.items()})
+
+        # Buffers pendentes por dia, na ordem de chegada
+        self._pending: List[Tuple[int, bytearray]] = []
+        self._pending_bytes = 0
+        self._current_day: Optional[int] = None
+        self._current_buffer: Optional[bytearray] = None
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tick-journal')
+        self._files: Dict[int, object] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.is_running = False
+
+        self.stats = {'records': 0, 'dropped': 0, 'bytes_written': 0, 'flushes': 0, 'recovered_bytes': 0,
+                      'quarantined': 0}
+
+        os.makedirs(directory, exist_ok=True)
+        for path in list_segments(directory):
+            try:
+                self.stats['recovered_bytes'] += recover_segment(path)
+            except (ValueError, struct.error, UnicodeDecodeError) as e:
+                # Arquivo estranho ou corrompido: não pode impedir o robô de subir
+                # nem receber registros do dia
+                target = quarantine_segment(path)
+                self.stats['quarantined'] += 1
+                logger.warning(f"Journal {os.path.basename(path)} ilegível ({e}): movido para "
+                               f"{os.path.basename(target)}")
+
+    def append(self, asset: str, price: float, volume: int, timestamp: float) -> bool:
+        """Registra um tick (não bloqueia; retorna False se descartado)"""
+        asset_id = self.asset_ids.get(asset)
+        if asset_id is None:
+            return False
+        if self._pending_bytes >= MAX_PENDING_BYTES:
+            self.stats['dropped'] += 1
+            return False
+
+        day = int(timestamp // SECONDS_PER_DAY)
+        if day != self._current_day:
+            self._current_day = day
+            self._current_buffer = bytearray()
+            self._pending.append((day, self._current_buffer))
+
+        # Volume é u32 no registro (como na tabela de cotações)
+        self._current_buffer += RECORD_STRUCT.pack(timestamp, asset_id, price, min(max(int(volume), 0), 0xFFFFFFFF))
+        self._pending_bytes += RECORD_SIZE
+        self.stats['records'] += 1
+
+        if self._pending_bytes >= self.flush_bytes and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def start(self):
+        """Inicia a tarefa de flush periódico"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._wakeup = asyncio.Event()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def flush(self):
+        """Grava em disco tudo o que está pendente"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._pending_bytes = 0
+        self._current_day = None
+        self._current_buffer = None
+
+        loop = asyncio.get_running_loop()
+        written = await loop.run_in_executor(self._executor, self._write_pending, pending)
+        self.stats['bytes_written'] += written
+        self.stats['flushes'] += 1
+
+    async def close(self):
+        """Grava o que falta, sincroniza e fecha os segmentos"""
+        self.is_running = False
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_files)
+        self._executor.shutdown(wait=True)
+
+    async def _flush_loop(self):
+        while self.is_running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Erro gravando journal de ticks: {e}")
+
+    # Métodos abaixo rodam na thread do journal
+    def _write_pending(self, pending: List[Tuple[int, bytearray]]) -> int:
+        written = 0
+        for day, data in pending:
+            f = self._segment_file(day)
+            f.write(data)
+            written += len(data)
+        for f in self._files.values():
+            f.flush()
+        return written
+
+    def _segment_file(self, day: int):
+        f = self._files.get(day)
+        if f is not None:
+            return f
+
+        # Mantém aberto apenas o segmento mais recente
+        self._close_files()
+        path = os.path.join(self.directory, segment_name(day))
+        is_new = not os.path.exists(path)
+        f = open(path, 'ab')
+        if is_new:
+            f.write(self._header)
+            f.flush()
+        self._files[day] = f
+        return f
+
+    def _close_files(self):
+        for f in self._files.values():
+            try:
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+        self._files.clear()
+
+
+class TickJournalReader:
+    """Leitura de um segmento via mmap (sem cópia dos registros)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        buffer = self._mmap if self._mmap is not None else b''
+        self.header_size, self.symbols, self.created_at = parse_header(buffer)
+
+        # Ignora um eventual registro parcial no fim (escrita em andamento)
+        self.record_count = (size - self.header_size) // RECORD_SIZE
+
+    def __len__(self) -> int:
+        return self.record_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def records(self) -> memoryview:
+        """View dos bytes dos registros completos"""
+        end = self.header_size + self.record_count * RECORD_SIZE
+        return memoryview(self._mmap)[self.header_size:end]
+
+    def iter_records(self) -> Iterator[Tuple[float, int, float, int]]:
+        """Itera (timestamp, id do ativo, preço, volume)"""
+        return RECORD_STRUCT.iter_unpack(self.records())
+
+    def iter_ticks(self) -> Iterator[Tuple[str, float, float, int]]:
+        """Itera (ativo, timestamp, preço, volume) usando a tabela do cabeçalho"""
+        symbols = self.symbols
+        for timestamp, asset_id, price, volume in self.iter_records():
+            yield symbols.get(asset_id, str(asset_id)), timestamp, price, volume
+
+    def to_numpy(self):
+        """Registros como array estruturado NumPy sobre o mmap (sem cópia)"""
+        import numpy as np
+        dtype = np.dtype([('timestamp', '<f8'), ('asset_id', '<u4'), ('price', '<f8'), ('volume', '<u4')])
+        return np.frombuffer(self.records(), dtype=dtype)
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Ainda existem views exportadas; o mmap é liberado com elas
+                pass
+        self._file.close()
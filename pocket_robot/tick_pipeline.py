@@ -0,0 +1,262 @@
+"""
+Pipeline de ingestão de ticks (push)
+Recebe eventos 'tick' do cliente Socket.IO e os processa em estágios
+decode -> normalize -> store, cada um com sua fila limitada
+"""
+
+import asyncio
+import json
+import math
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from constants import ACTIVES
+
+logger = logging.getLogger(__name__)
+
+# Tamanho padrão de cada fila e do maior lote processado de uma vez
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MAX_BATCH = 512
+
+
+@dataclass
+class Tick:
+    """Tick normalizado"""
+    asset: str
+    price: float
+    timestamp: float
+    volume: int = 0
+    # time.monotonic() da chegada ao pipeline (0 = desconhecido)
+    received: float = 0.0
+    # Timestamp enviado pelo servidor (None quando o tick não trazia)
+    server_time: Optional[float] = None
+
+
+def decode_tick_payload(raw: Any) -> List[tuple]:
+    """Converte o payload bruto do servidor em tuplas (ativo, timestamp, preço, volume).
+
+    Formatos aceitos:
+    - bytes/str com JSON
+    - lista ``[ativo, timestamp, preço]`` ou lista delas
+    - dict ``{'symbol'|'asset', 'price', 'timestamp'|'time', 'volume'}`` ou lista deles
+    """
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode('utf-8')
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+
+    if isinstance(raw, dict):
+        return [_decode_dict(raw)]
+
+    if isinstance(raw, (list, tuple)):
+        if raw and not isinstance(raw[0], (list, tuple, dict)):
+            return [_decode_list(raw)]
+        decoded = []
+        for item in raw:
+            decoded.append(_decode_dict(item) if isinstance(item, dict) else _decode_list(item))
+        return decoded
+
+    raise ValueError(f"Formato de tick não suportado: {type(raw).__name__}")
+
+
+def _decode_dict(item: Dict[str, Any]) -> tuple:
+    asset = item.get('symbol') or item.get('asset')
+    timestamp = item.get('timestamp', item.get('time'))
+    return asset, timestamp, item.get('price'), item.get('volume', 0)
+
+
+def _decode_list(item) -> tuple:
+    asset, timestamp, price = item[0], item[1], item[2]
+    volume = item[3] if len(item) > 3 else 0
+    return asset, timestamp, price, volume
+
+
+def normalize_tick(decoded: tuple, known_assets=ACTIVES) -> Optional[Tick]:
+    """Valida e normaliza um tick decodificado (retorna None se inválido)"""
+    asset, timestamp, price, volume = decoded
+    # payload malformado pode trazer lista/dict (não hashável) no lugar do ativo
+    if not isinstance(asset, str) or asset not in known_assets:
+        return None
+
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(price) or price <= 0:
+        return None
+
+    try:
+        server_time = float(timestamp) if timestamp is not None else None
+    except (TypeError, ValueError):
+        server_time = None
+    # Servidor pode enviar timestamp em milissegundos
+    if server_time is not None and server_time > 1e11:
+        server_time /= 1000.0
+    timestamp = server_time if server_time is not None else time.time()
+
+    try:
+        volume = int(volume or 0)
+    except (TypeError, ValueError):
+        volume = 0
+
+    return Tick(asset=asset, price=price, timestamp=timestamp, volume=volume, server_time=server_time)
+
+
+class TickIngestPipeline:
+    """Pipeline assíncrono decode -> normalize -> store.
+
+    ``submit`` pode ser registrado diretamente como callback do evento
+    'tick' do cliente. Cada estágio consome em lote tudo o que já está na
+    sua fila, de modo que ticks que chegam na mesma volta do event loop
+    são processados e gravados juntos.
+
+    Com ``lossless`` os estágios esperam espaço na fila seguinte em vez de
+    descartar o item mais antigo (use ``submit_wait`` na entrada): é o modo
+    do replay, em que a vazão medida deve ser a que o pipeline grava.
+    """
+
+    STAGES = ("decode", "normalize", "store")
+
+    def __init__(
+        self,
+        sink: Callable[[List[Tick]], Any],
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        known_assets: Iterable[str] = ACTIVES,
+        lossless: bool = False,
+    ):
+        self.sink = sink
+        self.lossless = lossless
+        self.max_batch = max_batch
+        self.known_assets = known_assets if isinstance(known_assets, (dict, set, frozenset)) else set(known_assets)
+
+        self.queues: Dict[str, asyncio.Queue] = {
+            stage: asyncio.Queue(maxsize=queue_size) for stage in self.STAGES
+        }
+        self._tasks: List[asyncio.Task] = []
+        self.is_running = False
+
+        self.stats = {
+            'received': 0,
+            'dropped': 0,
+            'invalid': 0,
+            'stored': 0,
+            'batches': 0,
+            'errors': 0,
+            'max_batch_size': 0,
+        }
+
+    def submit(self, raw: Any) -> bool:
+        """Enfileira um payload bruto sem bloquear (descarta o mais antigo se cheio)"""
+        self.stats['received'] += 1
+        return self._put_latest(self.queues['decode'], (time.monotonic(), raw))
+
+    async def submit_wait(self, raw: Any):
+        """Enfileira um payload bruto esperando espaço (contrapressão no produtor)"""
+        self.stats['received'] += 1
+        await self.queues['decode'].put((time.monotonic(), raw))
+
+    def _put_latest(self, q: asyncio.Queue, item: Any) -> bool:
+        try:
+            q.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            # Preço antigo vale menos que o novo: descarta o mais antigo
+            try:
+                q.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.stats['dropped'] += 1
+            q.put_nowait(item)
+            return False
+
+    async def start(self):
+        """Inicia os workers de cada estágio"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._tasks = [
+            asyncio.create_task(self._decode_worker()),
+            asyncio.create_task(self._normalize_worker()),
+            asyncio.create_task(self._store_worker()),
+        ]
+
+    async def stop(self):
+        """Para os workers (itens ainda nas filas são descartados)"""
+        self.is_running = False
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Profundidade atual da fila de entrada de cada estágio"""
+        return {stage: q.qsize() for stage, q in self.queues.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['queue_depths'] = self.queue_depths()
+        return stats
+
+    async def _next_batch(self, q: asyncio.Queue) -> List[Any]:
+        """Aguarda um item e drena o que mais já estiver disponível"""
+        batch = [await q.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(q.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _decode_worker(self):
+        out = self.queues['normalize']
+        while self.is_running:
+            for received, raw in await self._next_batch(self.queues['decode']):
+                try:
+                    for decoded in decode_tick_payload(raw):
+                        if self.lossless:
+                            await out.put((received, decoded))
+                        else:
+                            self._put_latest(out, (received, decoded))
+                except Exception as e:
+                    self.stats['invalid'] += 1
+                    logger.debug(f"Tick descartado na decodificação: {e}")
+
+    async def _normalize_worker(self):
+        out = self.queues['store']
+        while self.is_running:
+            for received, decoded in await self._next_batch(self.queues['normalize']):
+                try:
+                    tick = normalize_tick(decoded, self.known_assets)
+                except Exception as e:
+                    # um tick ruim não pode derrubar o worker (e com ele a ingestão)
+                    logger.debug(f"Tick descartado na normalização: {e}")
+                    tick = None
+                if tick is None:
+                    self.stats['invalid'] += 1
+                    continue
+                tick.received = received
+                if self.lossless:
+                    await out.put(tick)
+                else:
+                    self._put_latest(out, tick)
+
+    async def _store_worker(self):
+        while self.is_running:
+            batch = await self._next_batch(self.queues['store'])
+            try:
+                result = self.sink(batch)
+                if asyncio.iscoroutine(result):
+                    await result
+                self.stats['stored'] += len(batch)
+                self.stats['batches'] += 1
+                self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(batch))
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Erro gravando lote de ticks: {e}")
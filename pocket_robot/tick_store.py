@@ -0,0 +1,138 @@
+"""
+Histórico colunar de ticks por ativo
+Buffers circulares pré-alocados em NumPy (preço, volume e timestamp)
+para todos os ativos de constants.ACTIVES
+"""
+
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from constants import ACTIVES
+
+# Capacidade padrão (ticks mantidos por ativo)
+DEFAULT_TICK_CAPACITY = 1024
+
+
+class TickWindow(NamedTuple):
+    """Janela de ticks (views somente-leitura sobre o buffer)"""
+    prices: np.ndarray
+    volumes: np.ndarray
+    timestamps: np.ndarray
+
+
+class TickHistoryStore:
+    """Armazena o histórico recente de ticks de cada ativo em arrays fixos.
+
+    Cada ativo ocupa uma linha de tamanho ``2 * capacity`` e cada tick é
+    gravado duas vezes (posição ``head`` e ``head + capacity``). Assim,
+    qualquer janela com até ``capacity`` ticks é contígua e pode ser
+    retornada como view, sem cópia, mesmo quando o buffer deu a volta.
+    """
+
+    def __init__(self, symbols: Optional[Iterable[str]] = None, capacity: int = DEFAULT_TICK_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("capacity deve ser positivo")
+
+        self.symbols = list(symbols) if symbols is not None else list(ACTIVES.keys())
+        self.capacity = capacity
+        self.asset_index: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        n_assets = len(self.symbols)
+        self._prices = np.zeros((n_assets, 2 * capacity), dtype=np.float64)
+        self._volumes = np.zeros((n_assets, 2 * capacity), dtype=np.int64)
+        self._timestamps = np.zeros((n_assets, 2 * capacity), dtype=np.float64)
+
+        # Próxima posição de escrita e total de ticks gravados por ativo
+        self._heads = np.zeros(n_assets, dtype=np.int64)
+        self._counts = np.zeros(n_assets, dtype=np.int64)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.asset_index
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def index_of(self, symbol: str) -> int:
+        """Retorna o índice estável do ativo no store"""
+        try:
+            return self.asset_index[symbol]
+        except KeyError:
+            raise KeyError(f"Ativo não registrado no histórico: {symbol}") from None
+
+    def append(self, symbol: str, price: float, volume: int, timestamp: float):
+        """Adiciona um tick ao histórico do ativo em O(1)"""
+        self.append_index(self.index_of(symbol), price, volume, timestamp)
+
+    def append_index(self, idx: int, price: float, volume: int, timestamp: float):
+        """Adiciona um tick usando diretamente o índice do ativo"""
+        head = int(self._heads[idx])
+        mirror = head + self.capacity
+
+        self._prices[idx, head] = self._prices[idx, mirror] = price
+        self._volumes[idx, head] = self._volumes[idx, mirror] = volume
+        self._timestamps[idx, head] = self._timestamps[idx, mirror] = timestamp
+
+        self._heads[idx] = (head + 1) % self.capacity
+        self._counts[idx] += 1
+
+    def count(self, symbol: str) -> int:
+        """Quantidade de ticks disponíveis (limitada pela capacidade)"""
+        return int(min(self._counts[self.index_of(symbol)], self.capacity))
+
+    def total_ticks(self, symbol: str) -> int:
+        """Total de ticks já recebidos pelo ativo (inclui os sobrescritos)"""
+        return int(self._counts[self.index_of(symbol)])
+
+    def total_counts(self) -> Dict[str, int]:
+        """Total de ticks recebidos por ativo (uma leitura do array de contadores)"""
+        return dict(zip(self.symbols, self._counts.tolist()))
+
+    def window(self, symbol: str, n: Optional[int] = None) -> TickWindow:
+        """Retorna os últimos ``n`` ticks do ativo, do mais antigo ao mais recente.
+
+        Os arrays retornados são views sobre o buffer interno e ficam
+        inválidos assim que mais ``capacity - n`` ticks forem gravados.
+        """
+        idx = self.index_of(symbol)
+        available = int(min(self._counts[idx], self.capacity))
+        n = available if n is None else max(0, min(int(n), available))
+
+        end = int(self._heads[idx]) + self.capacity
+        start = end - n
+        return TickWindow(
+            prices=self._readonly(self._prices[idx, start:end]),
+            volumes=self._readonly(self._volumes[idx, start:end]),
+            timestamps=self._readonly(self._timestamps[idx, start:end]),
+        )
+
+    def latest(self, symbol: str) -> Optional[tuple]:
+        """Retorna (preço, volume, timestamp) do tick mais recente"""
+        idx = self.index_of(symbol)
+        if self._counts[idx] == 0:
+            return None
+        pos = int(self._heads[idx]) + self.capacity - 1
+        return (
+            float(self._prices[idx, pos]),
+            int(self._volumes[idx, pos]),
+            float(self._timestamps[idx, pos]),
+        )
+
+    def clear(self, symbol: Optional[str] = None):
+        """Descarta o histórico de um ativo (ou de todos)"""
+        if symbol is None:
+            self._heads[:] = 0
+            self._counts[:] = 0
+            return
+        idx = self.index_of(symbol)
+        self._heads[idx] = 0
+        self._counts[idx] = 0
+
+    def memory_usage_bytes(self) -> int:
+        """Memória ocupada pelos buffers pré-alocados"""
+        return self._prices.nbytes + self._volumes.nbytes + self._timestamps.nbytes
+
+    @staticmethod
+    def _readonly(view: np.ndarray) -> np.ndarray:
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,151 @@
+"""
+Spans de rastreamento em um buffer circular em memória
+Exportados no formato Chrome trace-event (abre em chrome://tracing ou no
+Perfetto). Desabilitado, ``span`` devolve um context manager compartilhado
+que não faz nada
+
+Habilitado com POCKET_TRACE=1; capacidade em POCKET_TRACE_CAPACITY
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+DEFAULT_CAPACITY = 65536
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str, cat: str, args: Optional[Dict[str, Any]]):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns(), self.cat, self.args)
+        return None
+
+
+def _current_thread() -> tuple:
+    """(tid, nome) da task asyncio corrente, ou da thread fora do event loop"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return id(task), task.get_name()
+    thread = threading.current_thread()
+    return thread.ident, thread.name
+
+
+class Tracer:
+    """Buffer circular de spans (nome, categoria, início, duração, task).
+
+    Cada task asyncio aparece como uma "thread" no visualizador, para que
+    spans concorrentes (ex.: buscas por ativo) não se sobreponham.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, enabled: bool = False):
+        self.enabled = enabled
+        self.events: deque = deque(maxlen=capacity)
+        self.recorded = 0
+        self._origin_ns = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    @property
+    def capacity(self) -> int:
+        return self.events.maxlen
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def clear(self):
+        self.events.clear()
+        self.recorded = 0
+
+    def span(self, name: str, cat: str = 'app', args: Optional[Dict[str, Any]] = None):
+        """Context manager que registra a duração do bloco.
+
+        Em caminhos quentes monte ``args`` só com o tracer ligado
+        (``args if tracer.enabled else None``): o dicionário é criado antes
+        da chamada mesmo quando o span é descartado.
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, cat, args)
+
+    def record(self, name: str, start_ns: int, end_ns: int, cat: str = 'app',
+               args: Optional[Dict[str, Any]] = None):
+        """Registra um span já medido (perf_counter_ns)"""
+        if not self.enabled:
+            return
+        tid, thread_name = _current_thread()
+        self.events.append((name, cat, start_ns, end_ns - start_ns, tid, thread_name, args))
+        self.recorded += 1
+
+    def export(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Spans mais recentes no formato Chrome trace-event (JSON object format)"""
+        events = list(self.events)
+        if limit is not None and limit < len(events):
+            events = events[-limit:]
+
+        trace = []
+        thread_names: Dict[int, str] = {}
+        for name, cat, start_ns, dur_ns, tid, thread_name, args in events:
+            event = {
+                'name': name,
+                'cat': cat,
+                'ph': 'X',
+                'ts': (start_ns - self._origin_ns) / 1000.0,
+                'dur': dur_ns / 1000.0,
+                'pid': self._pid,
+                'tid': tid,
+            }
+            if args:
+                event['args'] = args
+            trace.append(event)
+            thread_names[tid] = thread_name
+
+        for tid, thread_name in thread_names.items():
+            trace.append({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+                          'args': {'name': thread_name}})
+
+        return {
+            'traceEvents': trace,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'enabled': self.enabled,
+                'capacity': self.capacity,
+                'recorded': self.recorded,
+                'overwritten': max(0, self.recorded - len(self.events)),
+            },
+        }
+
+
+# Tracer do processo
+tracer = Tracer(
+    capacity=int(os.environ.get('POCKET_TRACE_CAPACITY', DEFAULT_CAPACITY)),
+    enabled=os.environ.get('POCKET_TRACE', '').lower() in ('1', 'true', 'yes'),
+)
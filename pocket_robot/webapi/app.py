@@ -1,9 +1,11 @@
 import os
 import sys
+import time
 import asyncio
-from fastapi import FastAPI, HTTPException
+import logging
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 import socketio
 
 # Permit imports dos módulos do pacote pocket_robot
@@ -12,12 +14,32 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from connection_monitor import ConnectionMonitor
+from broadcast import ClientFlowControl, FlushScheduler, TickBroadcaster, TickLatencyTracker
+from market_bus import MarketBusPublisher, MarketBusSubscriber
+from latency import LatencyRecorder, round_snapshot
+from rates import RateCounter
+import metrics
+from tracing import tracer
+import tick_codec
 import constants
 
+logger = logging.getLogger(__name__)
+
 POCKET_SSID = os.environ.get('POCKET_SSID') or os.environ.get('POCKET_SSID_OVERRIDE') or constants.CONFIGURED_SSID
 
-# Socket.IO server
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+# Deployment mode (POCKET_BUS_MODE):
+#   ''       single process: the robot runs inside this app
+#   'ingest' same, and the robot also publishes on the local market bus
+#   'worker' no robot here; market state comes from the bus (run N of these
+#            with uvicorn --workers N next to one ingest process)
+BUS_MODE = os.environ.get('POCKET_BUS_MODE', '').lower()
+
+# Socket.IO server; with several workers the client manager is shared through
+# a Redis-protocol server (POCKET_SIO_MANAGER_URL) so emit/disconnect reach
+# clients connected to any worker
+SIO_MANAGER_URL = os.environ.get('POCKET_SIO_MANAGER_URL')
+client_manager = socketio.AsyncRedisManager(SIO_MANAGER_URL) if SIO_MANAGER_URL else None
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', client_manager=client_manager)
 app = FastAPI()
 
 # Mount frontend static files
@@ -37,8 +59,27 @@ def root_index():
 # Global robot, subscriptions and background task
 robot = None
 market_broadcaster_task = None
-# subscriptions: sid -> set(symbols)
-subscriptions = {}
+# market bus endpoint of this process (publisher in 'ingest', subscriber in 'worker')
+market_bus = None
+# subscriptions (sid -> symbols, symbol -> sids) and per-client delta state;
+# a cada N frames o cliente recebe todos os seus símbolos (ressincronização)
+broadcaster = TickBroadcaster(snapshot_interval=float(os.environ.get('POCKET_SNAPSHOT_INTERVAL', '30')))
+# per-client backpressure and RTT-adaptive rate
+flow_control = ClientFlowControl()
+# push cadence: at most one flush per POCKET_FLUSH_INTERVAL_MS, earlier on a
+# relative move >= POCKET_URGENT_MOVE, heartbeat every second
+flush_scheduler = FlushScheduler(
+    flush_interval=float(os.environ.get('POCKET_FLUSH_INTERVAL_MS', '100')) / 1000.0,
+    urgent_move=float(os.environ.get('POCKET_URGENT_MOVE', '0.002')),
+)
+# perf event cadence (seconds)
+PERF_INTERVAL = 1.0
+# time spent in each sio.emit of a tick frame
+emit_latency = LatencyRecorder()
+# tick frames emitted (one per group of clients)
+emit_rate = RateCounter()
+# ingest -> emit and ingest -> client latency (clients echo the frame stamp on 'tick_ack')
+tick_latency = TickLatencyTracker()
 
 # admin token for secure config actions
 ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', None)
@@ -46,8 +87,17 @@ ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', None)
 
 @app.on_event('startup')
 async def startup_event():
-    # nothing special yet
-    pass
+    global robot, market_bus, market_broadcaster_task
+    if BUS_MODE != 'worker':
+        return
+    # local mirror of the ingest robot: never connects upstream, only keeps
+    # market_data/versions/candles for the broadcaster and the HTTP API (the
+    # journal and the quote table are only opened by start_monitoring)
+    robot = __import__('main').PocketOptionRobot()
+    robot.add_update_listener(flush_scheduler.notify)
+    market_bus = MarketBusSubscriber(robot)
+    market_bus.start()
+    market_broadcaster_task = asyncio.get_event_loop().create_task(broadcaster_loop())
 
 
 @app.get('/api/assets')
@@ -57,7 +107,9 @@ def get_assets():
 
 @app.post('/api/start')
 async def api_start():
-    global robot, market_broadcaster_task
+    global robot, market_broadcaster_task, market_bus
+    if BUS_MODE == 'worker':
+        return {'status': 'managed_by_ingest'}
     if robot and robot.is_running:
         return {'status': 'already_running'}
 
@@ -66,8 +118,14 @@ async def api_start():
     # use env SSID
     if POCKET_SSID:
         robot.ssid = POCKET_SSID
+    robot.add_update_listener(flush_scheduler.notify)
 
     loop = asyncio.get_event_loop()
+    if BUS_MODE == 'ingest':
+        if market_bus:
+            await market_bus.close()
+        market_bus = MarketBusPublisher(robot)
+        await market_bus.start()
     loop.create_task(robot.start_monitoring())
 
     # start broadcaster
@@ -80,6 +138,8 @@ async def api_start():
 @app.post('/api/stop')
 async def api_stop():
     global robot
+    if BUS_MODE == 'worker':
+        return {'status': 'managed_by_ingest'}
     if not robot:
         return {'status': 'not_running'}
     await robot.stop_monitoring()
@@ -106,11 +166,114 @@ async def api_config(body: dict, x_admin_token: str = None):
     raise HTTPException(status_code=400, detail='pocket_ssid required')
 
 
+def perf_summary():
+    if BUS_MODE == 'worker':
+        # robot counters live in the ingest process
+        summary = dict(market_bus.remote_summary)
+        summary['worker_pid'] = os.getpid()
+    else:
+        summary = robot.get_performance_summary()
+    if market_bus:
+        summary['bus'] = market_bus.get_stats()
+    summary['latency_ms'] = dict(summary.get('latency_ms') or {})
+    summary['latency_ms']['broadcast_emit'] = round_snapshot(emit_latency.snapshot())
+    summary['rates'] = dict(summary.get('rates') or {})
+    summary['rates']['emits'] = emit_rate.snapshot()
+    summary['tick_latency_ms'] = tick_latency.get_summary()
+    summary['broadcast'] = flow_control.get_stats()
+    summary['flush'] = flush_scheduler.get_stats()
+    return summary
+
+
 @app.get('/api/perf')
 def api_perf():
     if not robot:
         return {'status': 'not_running'}
-    return JSONResponse(robot.get_performance_summary())
+    return JSONResponse(perf_summary())
+
+
+@app.get('/api/perf/latency')
+def api_perf_latency():
+    """End-to-end tick latency totals plus per-symbol and per-client percentiles (ms)"""
+    return JSONResponse({**tick_latency.get_summary(), **tick_latency.get_breakdown()})
+
+
+@app.get('/metrics')
+def api_metrics():
+    """Prometheus text exposition; reads existing counters only, works with the robot stopped"""
+    writer = metrics.MetricsWriter()
+    if robot:
+        metrics.collect_robot(writer, robot)
+    else:
+        writer.gauge('robot_running', 'Whether the robot is monitoring', False)
+    metrics.collect_broadcast(writer, broadcaster, flow_control, flush_scheduler, emit_latency, emit_rate,
+                              tick_latency)
+    if market_bus:
+        metrics.collect_bus(writer, market_bus, BUS_MODE)
+    return Response(writer.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get('/api/trace')
+def api_trace(limit: int = None):
+    """Recent spans as Chrome trace-event JSON (load in chrome://tracing or Perfetto)"""
+    return JSONResponse(tracer.export(limit))
+
+
+@app.post('/api/trace')
+async def api_trace_control(body: dict, x_admin_token: str = None):
+    """Turn tracing on/off or clear the buffer: { enabled: bool, clear: bool }. Requires ADMIN_TOKEN if set."""
+    if ADMIN_TOKEN:
+        token = body.get('admin_token') or x_admin_token
+        if token != ADMIN_TOKEN:
+            raise HTTPException(status_code=403, detail='invalid admin token')
+    if body.get('clear'):
+        tracer.clear()
+    if 'enabled' in body:
+        tracer.enable(bool(body['enabled']))
+    return {'enabled': tracer.enabled, 'capacity': tracer.capacity, 'recorded': tracer.recorded}
+
+
+@app.get('/api/candles')
+def api_candles(symbol: str, timeframe: str = '1m', limit: int = 500,
+                start: float = Query(None, alias='from'), end: float = Query(None, alias='to')):
+    """Candles históricos de um ativo (timestamps em segundos, resposta em streaming)"""
+    if symbol not in constants.ACTIVES:
+        raise HTTPException(status_code=404, detail='unknown symbol')
+    if timeframe not in constants.TIMEFRAMES:
+        raise HTTPException(status_code=400, detail='invalid timeframe')
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail='limit must be positive')
+    if not robot:
+        return {'status': 'not_running'}
+
+    # inclui o candle ainda em formação quando ele está dentro do intervalo
+    tail = robot.candles.current(symbol, timeframe)
+    if tail is not None:
+        tail_time = tail.time.timestamp()
+        if (start is not None and tail_time < start) or (end is not None and tail_time > end):
+            tail = None
+
+    return StreamingResponse(
+        robot.candle_store.stream_json(symbol, timeframe, start, end, limit, tail=tail),
+        media_type='application/json'
+    )
+
+
+@app.get('/api/snapshot')
+def api_snapshot(symbols: str = '', encoding: str = tick_codec.ENCODING_JSON):
+    """Latest prices for comma-separated symbols (all when empty), as JSON or a tick_codec frame"""
+    if not robot:
+        return {'status': 'not_running'}
+    wanted = [s for s in symbols.split(',') if s] or list(robot.market_data.keys())
+    encoding = tick_codec.negotiate_encoding(encoding)
+
+    ticks = [(s, robot.market_data[s].current_price) for s in wanted if s in robot.market_data]
+    if encoding == tick_codec.ENCODING_JSON:
+        return JSONResponse([{'symbol': s, 'price': price} for s, price in ticks])
+
+    fragments = [tick_codec.encode_fragment(s, price, encoding) for s, price in ticks]
+    frame = tick_codec.encode_frame([f for f in fragments if f], encoding, robot.market_seq, snapshot=True)
+    return Response(frame, media_type='application/octet-stream', headers={'X-Tick-Encoding': encoding})
 
 
 @sio.event
@@ -120,57 +283,125 @@ async def connect(sid, environ, auth):
 
 @sio.event
 async def disconnect(sid):
-    pass
+    broadcaster.remove_client(sid)
+    flow_control.remove_client(sid)
+    tick_latency.remove_client(sid)
 
 
 @sio.event
-async def ping_check(sid):
+async def ping_check(sid, data=None):
+    """Client may report its last measured round trip: { rtt: <ms> }"""
+    if isinstance(data, dict) and isinstance(data.get('rtt'), (int, float)) and data['rtt'] > 0:
+        flow_control.record_rtt(sid, data['rtt'] / 1000.0)
     await sio.emit('pong', {}, to=sid)
+    return {}
+
+
+@sio.event
+async def tick_ack(sid, data=None):
+    """Optional echo of the stamp sent with each tick frame: { t: <stamp> }"""
+    if isinstance(data, dict) and isinstance(data.get('t'), int):
+        tick_latency.on_ack(sid, data['t'], time.monotonic())
+
+
+def client_backlog(sid):
+    """Packets still queued in the Engine.IO socket of the client"""
+    try:
+        eio_sid = sio.manager.eio_sid_from_sid(sid, '/')
+        socket = sio.eio.sockets.get(eio_sid) if eio_sid else None
+        return socket.queue.qsize() if socket else 0
+    except Exception:
+        return 0
 
 
 @sio.event
 async def subscribe(sid, data):
-    """Client sends list of symbols to subscribe to: { symbols: [...] }"""
+    """Client sends list of symbols to subscribe to: { symbols: [...], encoding: 'json'|'binary'|'msgpack' }
+
+    At most 200 symbols are kept. Binary encodings are delivered on 'tick_bin'
+    (see tick_codec); unsupported encodings fall back to JSON on 'tick'.
+    """
     try:
         syms = data.get('symbols') if isinstance(data, dict) else data
-        if not syms:
-            subscriptions.pop(sid, None)
-            return
-        subscriptions[sid] = set(syms)
+        encoding = data.get('encoding') if isinstance(data, dict) else None
+        accepted = broadcaster.subscribe(sid, syms or [], encoding)
+        return {'accepted': len(accepted), 'encoding': broadcaster.encoding_of(sid)}
     except Exception:
-        subscriptions.pop(sid, None)
+        broadcaster.unsubscribe(sid)
+        return {'accepted': 0, 'encoding': tick_codec.ENCODING_JSON}
 
 
 @sio.event
 async def unsubscribe(sid, data):
-    subscriptions.pop(sid, None)
+    broadcaster.unsubscribe(sid)
+
+
+@sio.event
+async def resync(sid, data=None):
+    """Client asks for a full snapshot on the next frame"""
+    broadcaster.request_resync(sid)
 
 
 async def broadcaster_loop():
     global robot
+    last_perf = 0.0
     try:
         while True:
+            await flush_scheduler.wait()
             if robot and robot.market_data:
-                # For each connected client, emit only subscribed symbols
-                for sid, syms in list(subscriptions.items()):
+                cycle_start = time.perf_counter_ns()
+                now = time.monotonic()
+                slow_clients = []
+
+                def eligible(sid):
+                    # skipped clients get the coalesced latest values next frame
+                    decision = flow_control.check(sid, client_backlog(sid), now)
+                    if decision == 'drop':
+                        slow_clients.append(sid)
+                    return decision == 'send'
+
+                # One frame per group of clients with the same subscription
+                # and version; each frame is encoded once for the whole group.
+                # Emit only enqueues on each client's socket, so a slow client
+                # does not delay the others. Fan-out is local (ignore_queue):
+                # every worker gets the ticks from the bus and serves only its
+                # own clients, nothing goes through the shared manager.
+                with tracer.span('build_frames', 'broadcast'):
+                    frames = broadcaster.build_frames(robot, eligible)
+                for frame in frames:
+                    event, payload, sids = frame.event, frame.payload, frame.sids
                     try:
-                        payload = []
-                        # limit to existing symbols
-                        for symbol in list(syms)[:200]:
-                            md = robot.market_data.get(symbol)
-                            if md:
-                                payload.append({'symbol': symbol, 'price': md.current_price})
-                        await sio.emit('tick', payload, to=sid)
-                    except Exception:
-                        pass
+                        # second argument: compact send stamp, echoed back on 'tick_ack'
+                        stamp = tick_latency.on_emit(frame, robot.ingest_times, time.monotonic())
+                        emit_start = time.perf_counter_ns()
+                        await sio.emit(event, (payload, stamp), to=sids, ignore_queue=True)
+                        emit_end = time.perf_counter_ns()
+                        emit_latency.record((emit_end - emit_start) / 1e9)
+                        emit_rate.add()
+                        if tracer.enabled:
+                            tracer.record('emit', emit_start, emit_end, 'broadcast', {'event': event, 'clients': len(sids)})
+                        for sid in sids:
+                            flow_control.mark_sent(sid, now)
+                    except Exception as e:
+                        logger.debug(f"Falha ao enviar frame para {len(sids)} clientes: {e}")
+                        # versions already advanced in build_frames: resync these clients
+                        broadcaster.send_failed(sids)
+
+                for sid in slow_clients:
+                    logger.warning(f"Cliente {sid} desconectado: não acompanha o envio de ticks")
+                    await sio.disconnect(sid, ignore_queue=True)
 
                 # Broadcast performance once to all
-                await sio.emit('perf', robot.get_performance_summary())
+                if now - last_perf >= PERF_INTERVAL:
+                    last_perf = now
+                    with tracer.span('perf_emit', 'broadcast'):
+                        await sio.emit('perf', perf_summary(), ignore_queue=True)
+                tracer.record('broadcast_cycle', cycle_start, time.perf_counter_ns(), 'broadcast')
             else:
                 # if no robot, send empty ticks to subscribed clients
-                for sid in list(subscriptions.keys()):
-                    await sio.emit('tick', [], to=sid)
-            await asyncio.sleep(1)
+                sids = broadcaster.index.client_ids()
+                if sids:
+                    await sio.emit('tick', [], to=sids, ignore_queue=True)
     except asyncio.CancelledError:
         return
 